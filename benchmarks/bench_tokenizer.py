@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the ASCII PTRAC event parsers in lines per second
+
+Usage:
+python benchmarks/bench_tokenizer.py [--copies N]
+
+The histories of tests/data_files/ptrac are repeated N times with
+renumbered nps into a temporary file, which is parsed with the line by line
+parser, the block tokenizer and the history object parser.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from mcnpy.ptrac.reader import PtracReader, parse_ptrac_lines
+
+TEST_FILE = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                         'data_files', 'ptrac')
+N_HEADER_LINES = 9
+
+
+def make_ptrac(filename, copies):
+    """ Write the test file with its histories repeated copies times
+
+    Returns
+    -------
+    n_lines : int
+        Number of event section lines written
+    """
+    with open(TEST_FILE) as f:
+        lines = f.read().splitlines()
+    header, events = lines[:N_HEADER_LINES], lines[N_HEADER_LINES:]
+    n_nps = PtracReader(TEST_FILE).event_format.n_nps
+
+    nps = 0
+    with open(filename, 'w') as f:
+        f.write('\n'.join(header) + '\n')
+        for i in xrange(copies):
+            block = []
+            for j, line in enumerate(events):
+                is_nps = '.' not in line and len(line.split()) == n_nps and \
+                    j + 1 < len(events) and '.' not in events[j+1]
+                if is_nps:
+                    nps += 1
+                    line = '%11d' % nps + line[11:]
+                block.append(line)
+            f.write('\n'.join(block) + '\n')
+
+    return copies * len(events)
+
+
+def time_parser(filename, parse):
+    ptrac = PtracReader(filename)
+    start = time.time()
+    parse(ptrac)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--copies', type=int, default=500,
+                        help='repetitions of the test file histories')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'ptrac')
+        n_lines = make_ptrac(filename, args.copies)
+
+        parsers = [
+            ('line parser', lambda p: parse_ptrac_lines(
+                p._open_events(), p.event_format)),
+            ('block tokenizer', lambda p: p.to_arrays()),
+            ('history objects', lambda p: sum(1 for h in p.parse_event())),
+        ]
+        print '%d event lines, %.1f MB' % (n_lines,
+                                           os.path.getsize(filename) / 1e6)
+        for name, parse in parsers:
+            elapsed = time_parser(filename, parse)
+            print '%-16s %8.3f s %12.0f lines/s' % (name, elapsed,
+                                                    n_lines / elapsed)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
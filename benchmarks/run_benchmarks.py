@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the PTRAC and ACE readers on synthetic files
+
+Usage:
+python benchmarks/run_benchmarks.py [--histories N] [--tables N]
+    [--energies N] [--mix sur=0.45,col=0.45,bnk=0.1] [--template ptrac]
+    [--output results.json] [--compare baseline.json]
+
+Synthetic files are generated in a temporary directory, see synthetic.py.
+The event mix and the file name of the template giving the event format are
+recorded with the PTRAC results, so only runs of the same files are compared.
+Every benchmark runs in a new interpreter, so its peak resident set size
+is not inflated by the others, and the fastest of --repeat runs is kept. The
+results are written as JSON with the versions of the environment, and
+--compare reports benchmarks slower than a previous result file, exiting
+with status 1 if any is slower by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import synthetic
+from mcnpy.ace import binary, open_xsdir
+from mcnpy.ace.reader import open_table
+from mcnpy.ptrac.reader import PtracReader, parse_ptrac_events
+
+
+def bench_ptrac_open(files):
+    start = time.time()
+    PtracReader(files['ptrac'])
+    return {'seconds': time.time() - start}
+
+
+def bench_ptrac_events(files):
+    """ History objects from parse_ptrac_events """
+    start = time.time()
+    ptrac = PtracReader(files['ptrac'])
+    histories = parse_ptrac_events(ptrac._open_events(), ptrac.event_format)
+    n_events = len(next(histories).events)
+    first = time.time() - start
+    n_histories = 1
+    for history in histories:
+        n_histories += 1
+        n_events += len(history.events)
+
+    return {'seconds': time.time() - start, 'first_history_seconds': first,
+            'histories': n_histories, 'events': n_events}
+
+
+def bench_ptrac_parse_event(files):
+    """ Filtered history objects from PtracReader.parse_event """
+    start = time.time()
+    histories = PtracReader(files['ptrac']).parse_event(
+        event_types=['col'], skip_empty=True)
+    n_events = len(next(histories).events)
+    first = time.time() - start
+    n_events += sum(len(history.events) for history in histories)
+
+    return {'seconds': time.time() - start, 'first_history_seconds': first,
+            'events': n_events}
+
+
+def bench_ptrac_columnar(files):
+    start = time.time()
+    arrays = PtracReader(files['ptrac']).to_arrays()
+    return {'seconds': time.time() - start, 'histories': len(arrays['nps']),
+            'events': int(arrays['nps']['n_events'].sum())}
+
+
+def bench_ace_read(files):
+    """ Eager parse of every ASCII table """
+    library = open_xsdir(files['xsdir'], persist=False)
+    start = time.time()
+    n_values = 0
+    for zaid in files['zaids']:
+        entry = library[zaid]
+        table = open_table(library.table_path(entry), lazy=False,
+                           offset=library.table_offset(entry))
+        n_values += len(table.xss)
+
+    return {'seconds': time.time() - start, 'values': n_values}
+
+
+def bench_ace_first_table(files):
+    """ Time to the first cross section of a lazily opened table """
+    start = time.time()
+    library = open_xsdir(files['xsdir'], persist=False)
+    library.open_table(files['zaids'][-1]).total.sum()
+    return {'seconds': time.time() - start}
+
+
+def bench_ace_npy(files):
+    """ Memory-mapped NumPy tables converted from the ASCII library """
+    start = time.time()
+    library = open_xsdir(files['npy_xsdir'], persist=False)
+    n_values = 0
+    for zaid in files['zaids']:
+        n_values += len(library.open_table(zaid).xss)
+
+    return {'seconds': time.time() - start, 'values': n_values}
+
+
+# name, function, files, whether the whole file is read
+BENCHMARKS = [
+    ('ptrac_open', bench_ptrac_open, 'ptrac', False),
+    ('ptrac_events', bench_ptrac_events, 'ptrac', True),
+    ('ptrac_parse_event_col', bench_ptrac_parse_event, 'ptrac', True),
+    ('ptrac_columnar', bench_ptrac_columnar, 'ptrac', True),
+    ('ace_read', bench_ace_read, 'ace', True),
+    ('ace_first_table', bench_ace_first_table, 'ace', False),
+    ('ace_npy', bench_ace_npy, 'ace', False),
+]
+
+
+def run_isolated(name, files):
+    """ Run a benchmark in a new interpreter
+
+    Returns
+    -------
+    result : dict
+        Metrics of the benchmark with the peak RSS of the interpreter
+    """
+    output = subprocess.check_output([sys.executable, __file__, '--child',
+                                      name, json.dumps(files)])
+    return json.loads(output)
+
+
+def run_child(name, files):
+    functions = dict((b[0], b[1]) for b in BENCHMARKS)
+    result = functions[name](files)
+    # kilobytes on Linux
+    result['peak_rss_mb'] = \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    print json.dumps(result)
+
+
+def throughput(result, size):
+    """ Add rates per second of the counted items and of the file size """
+    seconds = max(result['seconds'], 1e-9)
+    for key in ('histories', 'events', 'values'):
+        if key in result:
+            result[key + '_per_second'] = result[key] / seconds
+    if size is not None:
+        result['mb_per_second'] = size / 1e6 / seconds
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'date': datetime.now().isoformat(), 'commit': commit,
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform()}
+
+
+def event_mix(text):
+    """ Event mix of a 'sur=0.45,col=0.45,bnk=0.1' argument """
+    try:
+        mix = dict((kind, float(value)) for kind, value in
+                   (pair.split('=') for pair in text.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected kind=frequency pairs, such as sur=0.45,col=0.45,bnk=0.1')
+    unknown = set(mix) - set(synthetic.DEFAULT_MIX)
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            'unknown event kinds %s' % ', '.join(sorted(unknown)))
+    return mix
+
+
+def make_files(directory, args):
+    files = {'ptrac': os.path.join(directory, 'ptrac')}
+    synthetic.write_ptrac(files['ptrac'], args.histories,
+                          args.events_per_track, args.mix, args.template,
+                          seed=args.seed)
+    files['xsdir'], files['zaids'] = synthetic.write_ace_library(
+        directory, args.tables, args.energies, args.reactions,
+        seed=args.seed)
+
+    npy_dir = os.path.join(directory, 'npy')
+    os.mkdir(npy_dir)
+    files['npy_xsdir'] = binary.convert_xsdir(files['xsdir'], npy_dir)
+    return files
+
+
+def compare(results, baseline_file, threshold):
+    """ Print the time ratio to a baseline, return the regressed names """
+    with open(baseline_file, 'r') as f:
+        baseline = dict((r['name'], r) for r in json.load(f)['results'])
+
+    regressions = []
+    for result in results:
+        old = baseline.get(result['name'])
+        if old is None or old['params'] != result['params']:
+            continue
+        ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        print '%-24s %6.2fx baseline' % (result['name'], ratio)
+        if ratio > threshold:
+            regressions.append(result['name'])
+    return regressions
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        return run_child(sys.argv[2], json.loads(sys.argv[3]))
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--histories', type=int, default=20000)
+    parser.add_argument('--events-per-track', type=float, default=4.)
+    parser.add_argument('--mix', type=event_mix,
+                        default=dict(synthetic.DEFAULT_MIX),
+                        help="relative frequency of events, such as "
+                             "'sur=0.45,col=0.45,bnk=0.1'")
+    parser.add_argument('--template', default=synthetic.TEMPLATE,
+                        help='PTRAC file giving the header and event format')
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--energies', type=int, default=20000)
+    parser.add_argument('--reactions', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*',
+                        help='names of the benchmarks to run')
+    parser.add_argument('--output', help='JSON result file')
+    parser.add_argument('--compare', help='JSON result file to compare to')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='time ratio to the baseline of a regression')
+    args = parser.parse_args()
+
+    params = {
+        'ptrac': {'histories': args.histories,
+                  'events_per_track': args.events_per_track,
+                  'mix': args.mix,
+                  'template': os.path.basename(args.template),
+                  'seed': args.seed},
+        'ace': {'tables': args.tables, 'energies': args.energies,
+                'reactions': args.reactions, 'seed': args.seed},
+    }
+
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        files = make_files(tmp_dir, args)
+        sizes = {'ptrac': os.path.getsize(files['ptrac']),
+                 'ace': sum(os.path.getsize(os.path.join(tmp_dir, f))
+                            for f in os.listdir(tmp_dir)
+                            if f.endswith('.ace'))}
+
+        for name, function, kind, whole_file in BENCHMARKS:
+            if args.only and name not in args.only:
+                continue
+            runs = [run_isolated(name, files)
+                    for i in xrange(args.repeat)]
+            result = min(runs, key=lambda r: r['seconds'])
+            result['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+            result = throughput(result,
+                                sizes[kind] if whole_file else None)
+            result.update(name=name, params=params[kind])
+            results.append(result)
+            print >> sys.stderr, '%-24s %8.3f s %8.1f MB peak' % (
+                name, result['seconds'], result['peak_rss_mb'])
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    output = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    else:
+        print json.dumps(output, indent=2, sort_keys=True)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
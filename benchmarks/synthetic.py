@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic PTRAC files and ACE libraries of configurable size for benchmarks
+
+The PTRAC header and event format are copied from a template file, by
+default tests/data_files/ptrac, and the events are written in the layout of
+its PtracEventFormat. Each history is a source track followed by one track
+per banked secondary, which starts with its bank event, and every track
+ends in a termination event. A block of distinct histories is generated and
+repeated with renumbered nps lines, so large files are written at disk
+speed.
+
+ACE tables have a logarithmic energy grid and n_reactions reactions with
+increasing thresholds, and are written as one ASCII library with its xsdir.
+"""
+import os
+
+import numpy as np
+
+from mcnpy.ace import reader as ace_reader
+from mcnpy.ptrac.reader import PTRAC_VARIABLES, PtracReader
+
+TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'tests',
+                        'data_files', 'ptrac')
+EVENT_TYPES = {'src': 1000, 'bnk': 2000, 'sur': 3000, 'col': 4000,
+               'ter': 5000}
+DEFAULT_MIX = {'sur': 0.45, 'col': 0.45, 'bnk': 0.1}
+
+
+def _int_line(values):
+    return ' ' + ''.join('%10d' % v for v in values) + '\n'
+
+
+def _float_line(values):
+    return ' ' + ''.join('%13.5E' % v for v in values) + '\n'
+
+
+def _event_lines(event_format, kind, next_type, position, rng):
+    """ Integer and float line of one event """
+    ids = event_format.ids(kind)
+    n_int = getattr(event_format, 'n_%s_ev_int' % kind)
+    direction = rng.normal(size=3)
+    direction /= np.sqrt((direction ** 2).sum())
+    floats = {'xxx': position[0], 'yyy': position[1], 'zzz': position[2],
+              'uuu': direction[0], 'vvv': direction[1], 'www': direction[2],
+              'erg': rng.uniform(1e-3, 14.), 'wgt': 1.,
+              'tme': rng.uniform(0., 10.)}
+    ints = {'ncl': rng.randint(1, 20), 'mat': 1, 'nsf': rng.randint(1, 20),
+            'nxs': 92235, 'ntyn': rng.randint(1, 100),
+            'nter': rng.randint(1, 20), 'ipt': 1}
+
+    values = []
+    for id_ in ids:
+        name = PTRAC_VARIABLES[id_-1]
+        if name is None:
+            values.append(next_type)
+        elif len(values) < n_int:
+            values.append(ints.get(name, rng.randint(0, 50)))
+        else:
+            values.append(floats.get(name, rng.uniform(-1., 1.)))
+
+    return _int_line(values[:n_int]) + _float_line(values[n_int:])
+
+
+def history_events(n_tracks_events, mix, rng):
+    """ Event kinds of one history, see module notes
+
+    Parameters
+    ----------
+    n_tracks_events : float
+        Mean number of surface and collision events and banked
+        secondaries per track
+    mix : dict
+        Relative frequency of 'sur', 'col' and 'bnk' in a track
+    rng : RandomState
+
+    Returns
+    -------
+    kinds : list
+        Kind of every event in file order
+    """
+    names = sorted(mix)
+    p = np.array([mix[k] for k in names], dtype=np.float64)
+    p /= p.sum()
+
+    kinds = []
+    tracks = ['src']
+    while tracks:
+        kinds.append(tracks.pop(0))
+        for kind in rng.choice(names, rng.poisson(n_tracks_events), p=p):
+            # banked secondaries are written when their track starts
+            if kind == 'bnk':
+                tracks.append('bnk')
+            else:
+                kinds.append(kind)
+        kinds.append('ter')
+
+    return kinds
+
+
+def write_ptrac(filename, n_histories, events_per_track=4., mix=None,
+                template=TEMPLATE, block_size=1000, seed=0):
+    """ Write a synthetic ASCII PTRAC file
+
+    Parameters
+    ----------
+    filename : str
+    n_histories : int
+    events_per_track : float
+        Mean number of surface and collision events and banked
+        secondaries per track
+    mix : dict, optional
+        Relative frequency of 'sur' and 'col' events and of banked
+        secondaries ('bnk'), each of which is tracked after its parent
+    template : str
+        PTRAC file providing the header and event format
+    block_size : int
+        Distinct histories, repeated to reach n_histories
+    seed : int
+
+    Returns
+    -------
+    n_events : int
+        Number of events written
+    """
+    rng = np.random.RandomState(seed)
+    mix = mix or DEFAULT_MIX
+    template_reader = PtracReader(template)
+    event_format = template_reader.event_format
+    with open(template, 'r') as f:
+        header = f.read(template_reader.events_offset)
+
+    nps_position = event_format.id_nps.index(1)
+    blocks = []
+    for i in xrange(min(n_histories, block_size)):
+        kinds = history_events(events_per_track, mix, rng)
+        nps_values = [0] * event_format.n_nps
+        nps_values[event_format.id_nps.index(2)] = EVENT_TYPES[kinds[0]]
+        position = rng.uniform(-10., 10., 3)
+        lines = []
+        for kind, next_kind in zip(kinds, kinds[1:] + [None]):
+            next_type = 9000 if next_kind is None else EVENT_TYPES[next_kind]
+            position = position + rng.normal(scale=0.5, size=3)
+            lines.append(_event_lines(event_format, kind, next_type,
+                                      position, rng))
+        blocks.append((nps_values, ''.join(lines), len(kinds)))
+
+    n_events = 0
+    with open(filename, 'w') as f:
+        f.write(header)
+        for nps in xrange(1, n_histories + 1):
+            nps_values, lines, n = blocks[(nps - 1) % len(blocks)]
+            nps_values[nps_position] = nps
+            f.write(_int_line(nps_values))
+            f.write(lines)
+            n_events += n
+
+    return n_events
+
+
+def make_ace_table(zaid, n_energies, n_reactions=10, seed=0):
+    """ Synthetic continuous-energy AceTable
+
+    The XSS layout is ESZ, NU (polynomial), MTR, LQR, TYR, LSIG, SIG, the
+    reactions have MT 16 upwards with thresholds spread over the grid.
+    """
+    rng = np.random.RandomState(seed)
+    energy = np.logspace(-11, np.log10(20.), n_energies)
+    elastic = 10. + 1. / np.sqrt(energy)
+    absorption = 1. + 5. / np.sqrt(energy)
+
+    starts = np.sort(rng.randint(0, n_energies - 1, n_reactions))
+    reactions = [rng.uniform(0.1, 1.) * np.ones(n_energies - start)
+                 for start in starts]
+    total = elastic + absorption
+    for start, xs in zip(starts, reactions):
+        total[start:] += xs
+    heating = np.linspace(1., 2., n_energies)
+
+    sig = []
+    lsig = []
+    for start, xs in zip(starts, reactions):
+        lsig.append(1 + sum(len(s) for s in sig))
+        sig.append(np.concatenate(([start + 1, len(xs)], xs)))
+
+    mtr = 16 + np.arange(n_reactions)
+    blocks = [np.concatenate((energy, total, absorption, elastic, heating)),
+              np.array([1, 2, 2.4, 0.1]), mtr, np.zeros(n_reactions),
+              np.ones(n_reactions), np.array(lsig), np.concatenate(sig)]
+    xss = np.concatenate(blocks).astype(np.float64)
+
+    locators = np.cumsum([1] + [len(b) for b in blocks])
+    jxs = np.zeros(32, dtype=np.int64)
+    jxs[:7] = locators[:7]
+    jxs[21] = len(xss)
+    nxs = np.zeros(16, dtype=np.int64)
+    za = int(zaid.split('.')[0])
+    nxs[:5] = [len(xss), za, n_energies, n_reactions, 0]
+
+    header = ace_reader.header(fmtversion=None, szax=zaid, source=None,
+                               atwgtr='%.6f' % (za % 1000), temp='2.5301E-08',
+                               date='01/01/16', n='1',
+                               comments=['synthetic table%sm9999' %
+                                         (' ' * 55)])
+    return ace_reader.AceTable(header, np.zeros(16, dtype=np.int64),
+                               np.zeros(16), nxs, jxs, xss)
+
+
+def write_ace_library(directory, n_tables, n_energies, n_reactions=10,
+                      library='synthetic.ace', seed=0):
+    """ Write synthetic tables as one ASCII library with its xsdir
+
+    Returns
+    -------
+    xsdir_path : str
+    zaids : list
+    """
+    zaids = ['%d.80c' % (1000 * (z + 1) + 2 * z + 1)
+             for z in xrange(n_tables)]
+    lines = ['directory']
+    address = 1
+    with open(os.path.join(directory, library), 'w') as f:
+        for i, zaid in enumerate(zaids):
+            table = make_ace_table(zaid, n_energies, n_reactions, seed + i)
+            ace_reader.write_table(f, table)
+            lines.append('%s %s %s 0 1 %d %d 0 0 %s' %
+                         (zaid, table.header.atwgtr, library, address,
+                          table.nxs[0], table.header.temp))
+            address += 12 + (table.nxs[0] + 3) // 4
+
+    xsdir_path = os.path.join(directory, 'xsdir')
+    with open(xsdir_path, 'w') as f:
+        f.write('datapath=%s\n' % directory)
+        f.write('\n'.join(lines) + '\n')
+    return xsdir_path, zaids
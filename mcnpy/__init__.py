@@ -1 +1 @@
-from mcnp_wrapper import run_mcnp
\ No newline at end of file
+from mcnp_wrapper import run_mcnp, run_sweep
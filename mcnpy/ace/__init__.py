@@ -1 +1,2 @@
 from reader import *
+from xsdir import Xsdir, open_xsdir
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mappable NumPy layout of ACE tables and conversion of libraries
+
+Notes:
+A converted table is stored as two files sharing a base name, the XSS array
+as '<base>.npy' and the header, IZAW, NXS and JXS as '<base>.json'. Opening
+a table memory-maps the '.npy' file, so no values are parsed. xsdir entries
+of converted tables point at the '.npy' file with file type 3, a type only
+understood by mcnpy.
+"""
+import os
+import json
+
+import numpy as np
+
+from reader import AceTable, header, open_table
+from xsdir import open_xsdir, write_xsdir
+
+NPY_FILE_TYPE = 3
+
+
+def table_files(filename):
+    """ XSS and metadata filenames of a table, from either or the base """
+    base, extension = os.path.splitext(filename)
+    if extension not in ('.npy', '.json'):
+        base = filename
+    return base + '.npy', base + '.json'
+
+
+def write_npy_table(table, filename):
+    """ Write an AceTable in the NumPy layout
+
+    Parameters
+    ----------
+    table : AceTable
+    filename : str
+        Base name or '.npy' name of the table files
+
+    Returns
+    -------
+    xss_file : str
+        Name of the written '.npy' file
+    """
+    xss_file, meta_file = table_files(filename)
+    meta = {'header': table.header._asdict(),
+            'iz': table.iz.tolist(),
+            'aw': table.aw.tolist(),
+            'nxs': table.nxs.tolist(),
+            'jxs': table.jxs.tolist()}
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+    np.save(xss_file, np.ascontiguousarray(table.xss, dtype='<f8'))
+
+    return xss_file
+
+
+def open_npy_table(filename, mmap_mode='r'):
+    """ Open a table in the NumPy layout
+
+    Parameters
+    ----------
+    filename : str
+        Base name or '.npy' name of the table files
+    mmap_mode : str, optional
+        Memory map mode of XSS, None to read it into memory
+
+    Returns
+    -------
+    table : AceTable
+    """
+    xss_file, meta_file = table_files(filename)
+    with open(meta_file, 'r') as f:
+        meta = json.load(f)
+
+    fields = dict((str(k), v) for k, v in meta['header'].items())
+    for key, value in fields.items():
+        if isinstance(value, unicode):
+            fields[key] = str(value)
+    fields['comments'] = [str(c) for c in fields['comments']]
+
+    return AceTable(header(**fields), np.array(meta['iz'], dtype=np.int64),
+                    np.array(meta['aw']),
+                    np.array(meta['nxs'], dtype=np.int64),
+                    np.array(meta['jxs'], dtype=np.int64),
+                    np.load(xss_file, mmap_mode=mmap_mode))
+
+
+def convert_table(source, filename, address=1):
+    """ Convert a table of an ASCII library file into the NumPy layout
+
+    Parameters
+    ----------
+    source : str
+        ASCII (type 1) library file
+    filename : str
+        Base name or '.npy' name of the table files
+    address : int
+        Line number of the table in source
+
+    Returns
+    -------
+    xss_file : str
+    """
+    return write_npy_table(open_table(source, address, lazy=False), filename)
+
+
+def convert_xsdir(xsdir_filename, target_dir, zaids=None, name='xsdir'):
+    """ Convert the ASCII tables of an xsdir into a NumPy library
+
+    Every table is written into target_dir as '<zaid>.npy' and '<zaid>.json',
+    with an xsdir of the converted tables in the same directory. Tables that
+    are not type 1 are left out.
+
+    Parameters
+    ----------
+    xsdir_filename : str
+    target_dir : str
+    zaids : list, optional
+        Tables to convert, by default every type 1 table
+    name : str
+        Filename of the new xsdir in target_dir
+
+    Returns
+    -------
+    xsdir_path : str
+        Path of the new xsdir
+    """
+    library = open_xsdir(xsdir_filename, persist=False)
+    if zaids is None:
+        zaids = [e.zaid for e in library.entries if e.file_type == 1]
+    if not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+
+    entries = []
+    for zaid in zaids:
+        entry = library[zaid]
+        table = library.open_table(zaid, lazy=False)
+        write_npy_table(table, os.path.join(target_dir, zaid))
+        entries.append(entry._replace(filename=zaid + '.npy', access=None,
+                                      file_type=NPY_FILE_TYPE, address=1,
+                                      table_length=int(table.nxs[0]),
+                                      record_length=0, entries=0))
+
+    xsdir_path = os.path.join(target_dir, name)
+    with open(xsdir_path, 'w') as f:
+        write_xsdir(f, entries, library.awr, os.path.abspath(target_dir))
+
+    return xsdir_path
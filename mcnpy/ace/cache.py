@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+ACE table cache shared between processes through memory-mapped scratch files
+
+Notes:
+The first process needing a table parses it and writes its XSS array as an
+'.npy' scratch file, with the header, IZAW, NXS and JXS in a '.pkl' file
+next to it. Every process, including the first, then memory-maps the XSS
+file read-only, so the operating system keeps one copy of each table in the
+page cache however many workers use it. Placing the scratch directory on a
+RAM file system such as /dev/shm avoids disk I/O altogether.
+
+Tables are keyed by ZAID and temperature. Using a table updates the
+modification time of its scratch file, and the least recently used scratch
+files are removed once the directory exceeds its byte budget. Workers that
+still map a removed table keep their mapping valid. A scratch directory
+created by the cache is removed by close, or on leaving a with block, since
+files in /dev/shm hold memory until they are deleted.
+"""
+import os
+import shutil
+import tempfile
+import cPickle as pickle
+from collections import OrderedDict
+
+import numpy as np
+
+from reader import AceTable
+
+SHARED_MEMORY_DIR = '/dev/shm'
+
+
+class AceTableCache(object):
+    """ Memory-mapped ACE tables of an Xsdir shared between processes """
+
+    def __init__(self, xsdir, path=None, max_bytes=None):
+        """
+        Parameters
+        ----------
+        xsdir : Xsdir
+            Directory used to open missing tables
+        path : str, optional
+            Scratch directory shared by the processes, by default a new
+            directory in /dev/shm, or the temporary directory, removed by
+            close
+        max_bytes : int, optional
+            Budget of the scratch files, unlimited by default
+        """
+        if path is None:
+            shared = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) \
+                else None
+            path = tempfile.mkdtemp(prefix='ace_cache_', dir=shared)
+            self.owns_path = True
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.owns_path = False
+
+        self.xsdir = xsdir
+        self.path = path
+        self.max_bytes = max_bytes
+        self.tables = OrderedDict()
+        self.stats = dict(hits=0, attaches=0, misses=0, evictions=0)
+
+    def __getstate__(self):
+        # workers attach to the scratch files instead of copying tables
+        state = self.__dict__.copy()
+        state['tables'] = OrderedDict()
+        state['stats'] = dict(hits=0, attaches=0, misses=0, evictions=0)
+        # only the creating process removes the scratch directory
+        state['owns_path'] = False
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, zaid):
+        return os.path.exists(self._filename(zaid, '.npy'))
+
+    def __getitem__(self, zaid):
+        return self.get(zaid)
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  path: ' + self.path
+        printstr += '\n  tables: %d' % len(self._scratch_files())
+        printstr += '\n  bytes: %d' % self.nbytes
+        for key in ('hits', 'attaches', 'misses', 'evictions'):
+            printstr += '\n  %s: %d' % (key, self.stats[key])
+
+        return printstr
+
+    def _key(self, zaid):
+        entry = self.xsdir[zaid]
+        return '%s_%.6e' % (entry.zaid, entry.temperature)
+
+    def _filename(self, zaid, extension):
+        return os.path.join(self.path, self._key(zaid) + extension)
+
+    def _scratch_files(self):
+        return [os.path.join(self.path, f) for f in os.listdir(self.path)
+                if f.endswith('.npy')]
+
+    @property
+    def nbytes(self):
+        """ Bytes of the XSS scratch files """
+        return sum(os.path.getsize(f) for f in self._scratch_files())
+
+    def get(self, zaid):
+        """ Table of a ZAID, parsed only if no process has cached it yet
+
+        Parameters
+        ----------
+        zaid : str
+
+        Returns
+        -------
+        table : AceTable
+            With XSS memory-mapped read-only from the scratch file
+        """
+        xss_file = self._filename(zaid, '.npy')
+        if zaid in self.tables and os.path.exists(xss_file):
+            self.stats['hits'] += 1
+            self.tables[zaid] = self.tables.pop(zaid)
+            os.utime(xss_file, None)
+            return self.tables[zaid]
+
+        try:
+            table = self._attach(zaid)
+            self.stats['attaches'] += 1
+            os.utime(xss_file, None)
+        except (IOError, OSError, EOFError):
+            self._store(zaid, self.xsdir.open_table(zaid, lazy=False))
+            table = self._attach(zaid)
+            self.stats['misses'] += 1
+            self.evict()
+
+        self.tables[zaid] = table
+        return table
+
+    def _attach(self, zaid):
+        with open(self._filename(zaid, '.pkl'), 'rb') as f:
+            table_header, iz, aw, nxs, jxs = pickle.load(f)
+        xss = np.load(self._filename(zaid, '.npy'), mmap_mode='r')
+
+        return AceTable(table_header, iz, aw, nxs, jxs, xss)
+
+    def _store(self, zaid, table):
+        # write under unique names and rename, so other processes never
+        # see partial files
+        suffix = '.%d.tmp' % os.getpid()
+        meta_file = self._filename(zaid, '.pkl')
+        xss_file = self._filename(zaid, '.npy')
+        with open(meta_file + suffix, 'wb') as f:
+            pickle.dump((table.header, table.iz, table.aw, table.nxs,
+                         table.jxs), f, pickle.HIGHEST_PROTOCOL)
+        with open(xss_file + suffix, 'wb') as f:
+            np.save(f, table.xss)
+        os.rename(meta_file + suffix, meta_file)
+        os.rename(xss_file + suffix, xss_file)
+
+    def evict(self):
+        """ Remove least recently used scratch files over the byte budget
+
+        Returns
+        -------
+        n_evicted : int
+        """
+        if self.max_bytes is None:
+            return 0
+
+        files = []
+        for xss_file in self._scratch_files():
+            try:
+                stat = os.stat(xss_file)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, xss_file))
+        files.sort()
+
+        total = sum(size for mtime, size, xss_file in files)
+        n_evicted = 0
+        # the most recently used table is kept even if over the budget
+        for mtime, size, xss_file in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._remove(xss_file)
+            total -= size
+            n_evicted += 1
+
+        self.stats['evictions'] += n_evicted
+        return n_evicted
+
+    def _remove(self, xss_file):
+        for filename in (xss_file, xss_file[:-len('.npy')] + '.pkl'):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        for zaid in list(self.tables):
+            if self._filename(zaid, '.npy') == xss_file:
+                del self.tables[zaid]
+
+    def close(self):
+        """ Remove the scratch directory if it was created by the cache """
+        if self.owns_path:
+            self.clear()
+        else:
+            self.tables.clear()
+
+    def clear(self):
+        """ Remove the scratch directory and forget all tables """
+        self.tables.clear()
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
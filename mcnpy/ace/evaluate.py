@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized cross section evaluation on ACE energy grids
+
+Notes:
+Energies are located on the ESZ grid of a table with np.searchsorted, or
+with a HashedGrid which splits the logarithm of the energy range into equal
+buckets. Each bucket stores the grid index of its lower edge, so a lookup is
+a bucket computation followed by a few vectorized steps through the grid
+points of the bucket instead of a full binary search.
+
+Energies outside of the grid are evaluated at the nearest grid end.
+"""
+import numpy as np
+
+INTERPOLATIONS = ('lin-lin', 'log-log')
+
+
+def grid_index(grid, energies):
+    """ Interval of a grid holding each energy
+
+    Parameters
+    ----------
+    grid : ndarray
+        Increasing energies
+    energies : ndarray
+
+    Returns
+    -------
+    index : ndarray
+        i with grid[i] <= energy < grid[i+1], clipped to [0, len(grid) - 2]
+    """
+    index = np.searchsorted(grid, energies, side='right') - 1
+    return np.clip(index, 0, len(grid) - 2)
+
+
+def step_index(grid, index, energies):
+    """ Advance grid intervals at or below each energy to the holding one
+
+    Parameters
+    ----------
+    grid : ndarray
+        Increasing energies
+    index : ndarray
+        Grid intervals with grid[index] <= energies, updated in place
+    energies : ndarray
+
+    Returns
+    -------
+    index : ndarray
+        See grid_index
+    """
+    last = len(grid) - 2
+    active = np.flatnonzero(index < last)
+    while len(active):
+        step = grid[index[active] + 1] <= energies[active]
+        active = active[step]
+        index[active] += 1
+        active = active[index[active] < last]
+
+    return index
+
+
+class HashedGrid(object):
+    """ Logarithmic bucket hash of an energy grid for near O(1) lookups """
+
+    def __init__(self, grid, n_buckets=None):
+        """
+        Parameters
+        ----------
+        grid : ndarray
+            Increasing, positive energies
+        n_buckets : int, optional
+            Number of equal lethargy buckets between the grid ends, by
+            default one per grid point
+        """
+        self.grid = grid
+        self.n_buckets = n_buckets = n_buckets or len(grid)
+        self.log_min = np.log(grid[0])
+        self.width = (np.log(grid[-1]) - self.log_min) / n_buckets
+
+        edges = np.exp(self.log_min + self.width * np.arange(n_buckets + 1))
+        self.bucket_index = grid_index(grid, edges)
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  grid points: %d' % len(self.grid)
+        printstr += '\n  buckets: %d' % self.n_buckets
+        printstr += '\n  max points per bucket: %d' % \
+            np.diff(self.bucket_index).max()
+
+        return printstr
+
+    def index(self, energies):
+        """ Interval of the grid holding each energy, see grid_index """
+        energies = np.asarray(energies, dtype=np.float64)
+        grid = self.grid
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            buckets = (np.log(energies) - self.log_min) // self.width
+        buckets = np.clip(np.nan_to_num(buckets), 0, self.n_buckets - 1)
+        index = self.bucket_index[buckets.astype(np.int64)]
+
+        # rounding of the logarithm may select the next bucket
+        active = np.flatnonzero(index > 0)
+        while len(active):
+            active = active[grid[index[active]] > energies[active]]
+            index[active] -= 1
+            active = active[index[active] > 0]
+
+        return step_index(grid, index, energies)
+
+
+class XsEvaluator(object):
+    """ Batched evaluation of the cross sections of an AceTable """
+
+    def __init__(self, table, interpolation='lin-lin', hashed=False,
+                 n_buckets=None):
+        """
+        Parameters
+        ----------
+        table : AceTable
+        interpolation : str
+            'lin-lin' or 'log-log', log-log falls back to lin-lin on
+            intervals with zero cross sections
+        hashed : bool
+            Locate energies with a HashedGrid instead of a binary search
+        n_buckets : int, optional
+            Number of buckets of the HashedGrid
+        """
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError('interpolation must be one of %s' %
+                             ', '.join(INTERPOLATIONS))
+
+        self.table = table
+        self.energy = table.energy
+        self.interpolation = interpolation
+        self.hashed_grid = HashedGrid(self.energy, n_buckets) if hashed \
+            else None
+
+    def index(self, energies):
+        """ Interval of the energy grid holding each energy """
+        if self.hashed_grid is not None:
+            return self.hashed_grid.index(energies)
+        return grid_index(self.energy, energies)
+
+    def evaluate(self, energies, mt=1, index=None):
+        """ Cross section of one reaction at many energies
+
+        Parameters
+        ----------
+        energies : ndarray
+            Energies in MeV
+        mt : int
+            Reaction number
+        index : ndarray, optional
+            Result of self.index(energies), to share between reactions
+
+        Returns
+        -------
+        xs : ndarray
+            Cross sections in barns, zero below the threshold of the reaction
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        if index is None:
+            index = self.index(energies)
+        start, values = self.table.cross_section(mt)
+        return interpolate(self.energy, start, values, energies, index,
+                           self.interpolation)
+
+    def evaluate_many(self, energies, mts=None):
+        """ Cross sections of several reactions sharing one energy search
+
+        Parameters
+        ----------
+        energies : ndarray
+            Energies in MeV
+        mts : list, optional
+            Reaction numbers, by default all reactions of the table
+
+        Returns
+        -------
+        xs : dict
+            Cross section array by MT
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        index = self.index(energies)
+        if mts is None:
+            mts = self.table.reactions
+
+        return dict((mt, self.evaluate(energies, mt, index)) for mt in mts)
+
+    __call__ = evaluate
+
+
+def interpolate(grid, start, values, energies, index, interpolation='lin-lin'):
+    """ Interpolate a cross section defined from grid[start] upwards
+
+    Parameters
+    ----------
+    grid : ndarray
+        Energy grid
+    start : int
+        Grid index of values[0]
+    values : ndarray
+        Cross section on grid[start:start+len(values)]
+    energies : ndarray
+    index : ndarray
+        Grid interval of each energy, see grid_index
+    interpolation : str
+        'lin-lin' or 'log-log'
+
+    Returns
+    -------
+    xs : ndarray
+    """
+    xs = np.zeros(len(energies))
+    local = index - start
+    inside = np.flatnonzero((local >= 0) & (local < len(values) - 1))
+    if len(values) == 1:
+        xs[local == 0] = values[0]
+    if len(inside) == 0:
+        return xs
+
+    i = index[inside]
+    j = local[inside]
+    e = np.clip(energies[inside], grid[0], grid[-1])
+    e0, e1 = grid[i], grid[i + 1]
+    xs0, xs1 = values[j], values[j + 1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = (e - e0) / (e1 - e0)
+        result = xs0 + fraction * (xs1 - xs0)
+        if interpolation == 'log-log':
+            log_xs = xs0 * np.exp(np.log(xs1 / xs0) * np.log(e / e0) /
+                                  np.log(e1 / e0))
+            positive = (xs0 > 0) & (xs1 > 0) & (e0 > 0) & (e1 > e0)
+            result = np.where(positive, log_xs, result)
+    xs[inside] = np.where(e1 > e0, result, xs0)
+
+    return xs
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Materials of several nuclides evaluated on a unionized energy grid
+
+Notes:
+The unionized grid holds every energy point of the ACE tables of a
+material. For each nuclide an index map stores the interval of its own grid
+holding every union grid point, so an energy is searched once on the union
+grid and then looked up in all nuclides.
+
+The index maps take 4 bytes per nuclide and union grid point. In double
+indexing mode only every stride-th union point is mapped, and the nuclide
+intervals are found by stepping forward from the mapped point, which cuts
+the map memory by the stride.
+"""
+import numpy as np
+
+from evaluate import HashedGrid, grid_index, interpolate, step_index
+
+
+class Material(object):
+    """ Macroscopic cross sections of a mixture of ACE tables """
+
+    def __init__(self, tables, densities, interpolation='lin-lin',
+                 hashed=False, double_indexing=False, stride=None,
+                 memory_limit=None, batch_size=1 << 18):
+        """
+        Parameters
+        ----------
+        tables : list
+            AceTable of each nuclide
+        densities : list
+            Atom density of each nuclide in atoms per barn-cm
+        interpolation : str
+            'lin-lin' or 'log-log'
+        hashed : bool
+            Locate energies on the union grid with a HashedGrid
+        double_indexing : bool
+            Map only every stride-th union grid point
+        stride : int, optional
+            Union grid points per map entry in double indexing mode, by
+            default 8, doubled until the memory limit is met
+        memory_limit : int, optional
+            Maximum bytes of the union grid and index maps
+        batch_size : int
+            Energies evaluated at a time, bounding temporary arrays
+
+        Raises
+        ------
+        MemoryError
+            If the grid and maps do not fit in memory_limit
+        """
+        if len(tables) != len(densities):
+            raise ValueError('one density per table is required')
+
+        self.tables = list(tables)
+        self.densities = np.asarray(densities, dtype=np.float64)
+        self.interpolation = interpolation
+        self.batch_size = batch_size
+
+        self.grid = np.unique(np.concatenate([t.energy for t in tables]))
+
+        def required(stride):
+            n_points = -(-len(self.grid) // stride)
+            return self.grid.nbytes + 4 * len(tables) * n_points
+
+        self.stride = 1
+        if double_indexing:
+            self.stride = stride or 8
+            while stride is None and memory_limit is not None and \
+                    required(self.stride) > memory_limit and \
+                    self.stride < len(self.grid):
+                self.stride *= 2
+
+        if memory_limit is not None and required(self.stride) > memory_limit:
+            raise MemoryError('union grid of %d points exceeds the memory '
+                              'limit of %d bytes' %
+                              (len(self.grid), memory_limit))
+
+        points = self.grid[::self.stride]
+        self.index_map = np.empty((len(tables), len(points)), dtype=np.int32)
+        for i, table in enumerate(tables):
+            self.index_map[i] = grid_index(table.energy, points)
+
+        self.hashed_grid = HashedGrid(self.grid) if hashed else None
+
+    @classmethod
+    def from_xsdir(cls, xsdir, nuclides, **kwargs):
+        """ Material of tables opened through an Xsdir
+
+        Parameters
+        ----------
+        xsdir : Xsdir
+        nuclides : list
+            (zaid, atom density) pairs, or a dict of them
+        kwargs
+            See Material
+
+        Returns
+        -------
+        material : Material
+        """
+        if isinstance(nuclides, dict):
+            nuclides = sorted(nuclides.items())
+        zaids = [zaid for zaid, density in nuclides]
+        tables = [xsdir.open_table(zaid) for zaid in zaids]
+
+        return cls(tables, [density for zaid, density in nuclides], **kwargs)
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        for table, density in zip(self.tables, self.densities):
+            printstr += '\n  %s: %g' % (table.zaid, density)
+        printstr += '\n  union grid points: %d' % len(self.grid)
+        printstr += '\n  index map stride: %d' % self.stride
+        printstr += '\n  bytes: %d' % self.nbytes
+
+        return printstr
+
+    @property
+    def nbytes(self):
+        """ Memory of the union grid and index maps """
+        return self.grid.nbytes + self.index_map.nbytes
+
+    def index(self, energies):
+        """ Interval of the union grid holding each energy """
+        if self.hashed_grid is not None:
+            return self.hashed_grid.index(energies)
+        return grid_index(self.grid, energies)
+
+    def nuclide_index(self, i, union_index, energies):
+        """ Interval of the grid of nuclide i holding each energy
+
+        Parameters
+        ----------
+        i : int
+            Position of the nuclide
+        union_index : ndarray
+            Union grid intervals of the energies
+        energies : ndarray
+
+        Returns
+        -------
+        index : ndarray
+        """
+        index = self.index_map[i, union_index // self.stride].astype(np.int64)
+        if self.stride == 1:
+            return index
+        return step_index(self.tables[i].energy, index, energies)
+
+    def microscopic(self, energies, mt=1):
+        """ Microscopic cross section of every nuclide
+
+        Parameters
+        ----------
+        energies : ndarray
+            Energies in MeV
+        mt : int
+            Reaction number, nuclides without it give zero
+
+        Returns
+        -------
+        xs : ndarray
+            (nuclides, energies) array in barns
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        xs = np.zeros((len(self.tables), len(energies)))
+        for start in xrange(0, len(energies), self.batch_size):
+            batch = energies[start:start+self.batch_size]
+            union_index = self.index(batch)
+            for i, table in enumerate(self.tables):
+                try:
+                    first, values = table.cross_section(mt)
+                except KeyError:
+                    continue
+                index = self.nuclide_index(i, union_index, batch)
+                xs[i, start:start+len(batch)] = interpolate(
+                    table.energy, first, values, batch, index,
+                    self.interpolation)
+
+        return xs
+
+    def macroscopic(self, energies, mt=1):
+        """ Macroscopic cross section in 1/cm
+
+        Parameters
+        ----------
+        energies : ndarray
+            Energies in MeV
+        mt : int
+            Reaction number
+
+        Returns
+        -------
+        xs : ndarray
+        """
+        return self.macroscopic_many(energies, [mt])[mt]
+
+    def macroscopic_many(self, energies, mts=(1,)):
+        """ Macroscopic cross sections of several reactions in 1/cm
+
+        The union grid and nuclide intervals are searched once per batch
+        and shared between the reactions.
+
+        Parameters
+        ----------
+        energies : ndarray
+            Energies in MeV
+        mts : list
+            Reaction numbers
+
+        Returns
+        -------
+        xs : dict
+            Cross section array by MT
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        result = dict((mt, np.zeros(len(energies))) for mt in mts)
+        for start in xrange(0, len(energies), self.batch_size):
+            batch = energies[start:start+self.batch_size]
+            union_index = self.index(batch)
+            for i, table in enumerate(self.tables):
+                index = self.nuclide_index(i, union_index, batch)
+                for mt in mts:
+                    try:
+                        first, values = table.cross_section(mt)
+                    except KeyError:
+                        continue
+                    result[mt][start:start+len(batch)] += \
+                        self.densities[i] * interpolate(
+                            table.energy, first, values, batch, index,
+                            self.interpolation)
+
+        return result
@@ -1,9 +1,20 @@
 from collections import namedtuple
 from numpy import cumsum
+import numpy as np
 
 header = namedtuple('header', 'fmtversion szax source atwgtr temp date n comments')
 atwgtr_table = namedtuple('za', 'ratio')
 
+# names of the XSS blocks located by JXS(1) .. JXS(27) in continuous-energy
+# neutron tables, 'and' is the angular distribution block
+JXS_BLOCKS = ('esz', 'nu', 'mtr', 'lqr', 'tyr', 'lsig', 'sig', 'land', 'and',
+              'ldlw', 'dlw', 'gpd', 'mtrp', 'lsigp', 'sigp', 'landp', 'andp',
+              'ldlwp', 'dlwp', 'yp', 'fis', 'end', 'lunr', 'dnu', 'bdd',
+              'dnedl', 'dned')
+
+# reactions stored on the ESZ grid, total, absorption and elastic
+ESZ_REACTIONS = {1: 1, 101: 2, 2: 3}
+
 
 def extract_substrings(string, substring_lengths, strip=False):
     """
@@ -34,6 +45,10 @@ def extract_substrings(string, substring_lengths, strip=False):
     >>> ('333', '4444', '55555', '     1')
     """
 
+    remainder = len(substring_lengths) > 0 and substring_lengths[-1] == -1
+    if remainder:
+        substring_lengths = substring_lengths[:-1]
+
     positions = cumsum([0] + substring_lengths)
     substrings = []
 
@@ -44,8 +59,11 @@ def extract_substrings(string, substring_lengths, strip=False):
             substr = substr.strip()
         substrings.append(substr)
 
-    if positions[-1] < len(string):
-        substrings.append(string[positions[-1]:])
+    if remainder or positions[-1] < len(string):
+        substr = string[positions[-1]:]
+        if strip:
+            substr = substr.strip()
+        substrings.append(substr)
 
     return substrings
 
@@ -105,7 +123,8 @@ def ace_filename_to_szax(filename):
     Parameters
     ----------
     filename : str
-        Name of ACE file in 'SSSZZZAAA.dddCC' format
+        Name of ACE file in 'SSSZZZAAA.dddCC' format, or a ZAID such as
+        '92235.80c'
 
     Returns
     -------
@@ -118,8 +137,10 @@ def ace_filename_to_szax(filename):
     prefix, sep, suffix = filename.partition('.')
 
     s, z, a = string_to_sza(prefix)
-    dd = int(suffix[:3])
-    lib_id = suffix[3:]
+    # library numbers have two ('80c') or three ('710nc') digits
+    n_digits = len(suffix) - len(suffix.lstrip('0123456789'))
+    dd = int(suffix[:n_digits])
+    lib_id = suffix[n_digits:]
 
     return s, z, a, dd, lib_id
 
@@ -127,6 +148,10 @@ def ace_filename_to_szax(filename):
 def read_header(ace_file):
     """ Convert header of ace file into named tuple
 
+    Both the 2.0 header, starting with the format version, and the legacy
+    two line header are read. Legacy headers have no fmtversion and source,
+    their second line is kept as the only comment.
+
     Parameters
     ----------
     ace_file : file
@@ -138,9 +163,16 @@ def read_header(ace_file):
         Contains parsed header information
     """
     line = ace_file.readline()
-    fmtversion, szax, source = extract_substrings(line, [10, 24, 24], strip=True)
+    if line.split()[0].count('.') != 2:
+        szax, atwgtr, temp, date = extract_substrings(line, [10, 12, 12, -1],
+                                                      strip=True)
+        comments = [ace_file.readline().strip()]
+        return header(fmtversion=None, szax=szax, source=None,
+                      atwgtr=atwgtr, temp=temp, date=date, n='1',
+                      comments=comments)
 
-    sza_to_string()
+    fmtversion, szax, source = extract_substrings(line, [10, 24, 24],
+                                                  strip=True)[:3]
 
     line = ace_file.readline()
     atwgtr, temp, date, n = extract_substrings(line, [11, 11, 8, -1], strip=True)
@@ -151,4 +183,399 @@ def read_header(ace_file):
 
     return header(fmtversion=fmtversion, szax=szax, source=source, 
                   atwgtr=atwgtr, temp=temp, date=date, n=n, 
-                  comments=comments)
\ No newline at end of file
+                  comments=comments)
+
+
+def _read_text(ace_file, n_lines):
+    return ''.join([ace_file.readline() for i in xrange(n_lines)])
+
+
+def _read_values(ace_file, n_lines):
+    """ Parse the numbers of the next n_lines lines into a float64 array """
+    return np.fromstring(_read_text(ace_file, n_lines), sep=' ')
+
+
+def read_arrays(ace_file):
+    """ Parse the IZAW pairs and the NXS and JXS arrays following the header
+
+    Parameters
+    ----------
+    ace_file : file
+        Positioned after the header
+
+    Returns
+    -------
+    iz : ndarray
+        16 ZA identifiers of the IZAW pairs
+    aw : ndarray
+        16 atomic weight ratios of the IZAW pairs
+    nxs : ndarray
+        16 NXS values, nxs[0] is NXS(1)
+    jxs : ndarray
+        32 JXS locators, jxs[0] is JXS(1)
+    """
+    izaw = _read_values(ace_file, 4)
+    nxs = _read_values(ace_file, 2)
+    jxs = _read_values(ace_file, 4)
+    if len(izaw) != 32 or len(nxs) != 16 or len(jxs) != 32:
+        raise IOError('malformed IZAW, NXS or JXS array')
+
+    return (izaw[0::2].astype(np.int64), izaw[1::2], nxs.astype(np.int64),
+            jxs.astype(np.int64))
+
+
+def read_xss(ace_file, length):
+    """ Parse the XSS array, four values per line, in one bulk conversion
+
+    Parameters
+    ----------
+    ace_file : file
+        Positioned at the first XSS line
+    length : int
+        Number of XSS values, NXS(1)
+
+    Returns
+    -------
+    xss : ndarray
+        float64 array of the values
+    """
+    n_lines = (length + 3) // 4
+    # read the lines as one block, ACE lines are 80 characters wide
+    text = ace_file.read(n_lines * 81) + ace_file.readline()
+    newlines = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) ==
+                              ord('\n'))
+    if len(newlines) >= n_lines:
+        text = text[:newlines[n_lines-1] + 1]
+    else:
+        text += _read_text(ace_file, n_lines - len(newlines))
+    xss = np.fromstring(text, sep=' ')
+    if len(xss) != length:
+        raise IOError('expected %d XSS values, found %d' % (length, len(xss)))
+
+    return xss
+
+
+class TextXss(object):
+    """ Deferred read of the XSS array of a table in an ASCII ACE file """
+
+    def __init__(self, filename, offset, length, stats=None):
+        self.filename = filename
+        self.offset = offset
+        self.length = length
+        self.stats = stats
+
+    def __call__(self):
+        with open(self.filename, 'r') as ace_file:
+            ace_file.seek(self.offset)
+            return _read_xss_counted(ace_file, self.length, self.stats)
+
+
+def _read_xss_counted(ace_file, length, stats):
+    """ read_xss, counting the read and its time into stats if given """
+    from mcnpy.stats import CountingFile
+
+    if stats is None:
+        return read_xss(ace_file, length)
+
+    counting_file = CountingFile(ace_file, stats)
+    with stats.phase('xss'):
+        xss = read_xss(counting_file, length)
+    counting_file.sync()
+    stats.count('values', len(xss))
+    stats.report()
+    return xss
+
+
+class AceTable(object):
+    """ ACE table with its XSS array loaded on first use
+
+    NXS and JXS are kept as 0-based arrays, nxs[0] is NXS(1). JXS locators
+    are 1-based positions in XSS as in the ACE format. Blocks are returned as
+    views of XSS, named as in continuous-energy neutron tables.
+    """
+
+    def __init__(self, header, iz, aw, nxs, jxs, xss=None, xss_loader=None):
+        """
+        Parameters
+        ----------
+        header : namedtuple
+            See read_header
+        iz, aw, nxs, jxs : ndarray
+            See read_arrays
+        xss : ndarray, optional
+            XSS array, or None to call xss_loader on first use
+        xss_loader : callable, optional
+            Returns the XSS array
+        """
+        self.header = header
+        self.iz = iz
+        self.aw = aw
+        self.nxs = nxs
+        self.jxs = jxs
+        self._xss = xss
+        self._xss_loader = xss_loader
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  zaid: ' + self.zaid
+        printstr += '\n  atomic weight ratio: %g' % self.awr
+        printstr += '\n  temperature: %g MeV' % self.temperature
+        printstr += '\n  xss length: %d' % self.nxs[0]
+        printstr += '\n  energies: %d' % self.nxs[2]
+        printstr += '\n  reactions: %d' % self.nxs[3]
+
+        return printstr
+
+    @property
+    def zaid(self):
+        return self.header.szax
+
+    @property
+    def awr(self):
+        return float(self.header.atwgtr)
+
+    @property
+    def temperature(self):
+        return float(self.header.temp)
+
+    @property
+    def is_loaded(self):
+        return self._xss is not None
+
+    @property
+    def xss(self):
+        if self._xss is None:
+            self._xss = self._xss_loader()
+        return self._xss
+
+    def block(self, name):
+        """ XSS words of a named block up to the start of the next block
+
+        Parameters
+        ----------
+        name : str
+            One of JXS_BLOCKS
+
+        Returns
+        -------
+        block : ndarray or None
+            View of XSS, None if the table has no such block
+        """
+        start = self.jxs[JXS_BLOCKS.index(name)]
+        if start <= 0:
+            return None
+
+        later = self.jxs[self.jxs > start]
+        end = later.min() if len(later) else self.nxs[0] + 1
+        return self.xss[start-1:end-1]
+
+    def _esz(self, i):
+        n_energies = self.nxs[2]
+        start = self.jxs[0] - 1 + i * n_energies
+        return self.xss[start:start+n_energies]
+
+    @property
+    def energy(self):
+        """ ESZ energy grid in MeV """
+        return self._esz(0)
+
+    @property
+    def total(self):
+        return self._esz(1)
+
+    @property
+    def absorption(self):
+        return self._esz(2)
+
+    @property
+    def elastic(self):
+        return self._esz(3)
+
+    @property
+    def heating(self):
+        """ Average heating numbers in MeV per collision """
+        return self._esz(4)
+
+    @property
+    def mtr(self):
+        """ MT numbers of the reactions other than elastic """
+        start = self.jxs[2] - 1
+        return self.xss[start:start+self.nxs[3]].astype(np.int64)
+
+    @property
+    def lsig(self):
+        """ Locators of the reaction cross sections relative to JXS(7) """
+        start = self.jxs[5] - 1
+        return self.xss[start:start+self.nxs[3]].astype(np.int64)
+
+    @property
+    def nu(self):
+        """ NU block of fission neutron multiplicities, None if absent """
+        return self.block('nu')
+
+    @property
+    def reactions(self):
+        """ MT numbers of all reactions with cross sections """
+        return sorted(ESZ_REACTIONS) + sorted(self.mtr.tolist())
+
+    def cross_section(self, mt):
+        """ Cross section of a reaction on its part of the energy grid
+
+        Parameters
+        ----------
+        mt : int
+            Reaction number, 1, 2 and 101 come from the ESZ block
+
+        Returns
+        -------
+        start : int
+            Index of the first energy of the reaction in the energy grid
+        xs : ndarray
+            View of the cross section values in barns
+
+        Raises
+        ------
+        KeyError
+            If the table has no such reaction
+        """
+        if mt in ESZ_REACTIONS:
+            return 0, self._esz(ESZ_REACTIONS[mt])
+
+        positions = np.flatnonzero(self.mtr == mt)
+        if len(positions) == 0:
+            raise KeyError('MT %d is not in table %s' % (mt, self.zaid))
+
+        location = self.jxs[6] + self.lsig[positions[0]] - 1
+        start = int(self.xss[location-1])
+        n_energies = int(self.xss[location])
+        return start - 1, self.xss[location+1:location+1+n_energies]
+
+
+def read_table(ace_file, filename=None, stats=None):
+    """ Read an ACE table from an opened ASCII (type 1) file
+
+    Parameters
+    ----------
+    ace_file : file
+        Positioned at the first header line of the table
+    filename : str, optional
+        Name of the opened file, if given the XSS array is read on first use
+        instead of now
+    stats : mcnpy.stats.ParseStats, optional
+        Counts the bytes, lines, tables and XSS values read and times the
+        header, arrays and xss phases
+
+    Returns
+    -------
+    table : AceTable
+    """
+    from mcnpy.stats import CountingFile, phase
+
+    array_file = ace_file if stats is None else CountingFile(ace_file, stats)
+    with phase(stats, 'header'):
+        table_header = read_header(array_file)
+    with phase(stats, 'arrays'):
+        iz, aw, nxs, jxs = read_arrays(array_file)
+    if stats is not None:
+        array_file.sync()
+        stats.count('tables')
+
+    if filename is not None:
+        loader = TextXss(filename, ace_file.tell(), nxs[0], stats)
+        return AceTable(table_header, iz, aw, nxs, jxs, xss_loader=loader)
+
+    xss = _read_xss_counted(ace_file, nxs[0], stats)
+    return AceTable(table_header, iz, aw, nxs, jxs, xss)
+
+
+def line_offset(ace_file, address, block_size=1 << 20):
+    """ Byte offset of a line, counting newlines block by block
+
+    Parameters
+    ----------
+    ace_file : file
+        Positioned at the start of the file
+    address : int
+        Line number, 1 is the first line
+
+    Returns
+    -------
+    offset : int
+    """
+    offset = 0
+    remaining = address - 1
+    while remaining > 0:
+        block = ace_file.read(block_size)
+        if not block:
+            raise IOError('file has fewer than %d lines' % address)
+        n_lines = block.count('\n')
+        if n_lines >= remaining:
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) ==
+                                      ord('\n'))
+            return offset + newlines[remaining-1] + 1
+        remaining -= n_lines
+        offset += len(block)
+
+    return offset
+
+
+def open_table(filename, address=1, lazy=True, offset=None, stats=None):
+    """ Open an ACE table of an ASCII (type 1) library file
+
+    Parameters
+    ----------
+    filename : str
+    address : int
+        Line number of the first header line, as in xsdir
+    lazy : bool
+        Read the XSS array on first use
+    offset : int, optional
+        Byte offset of the first header line, replaces address
+    stats : mcnpy.stats.ParseStats, optional
+        See read_table
+
+    Returns
+    -------
+    table : AceTable
+    """
+    with open(filename, 'r') as ace_file:
+        if offset is None:
+            offset = line_offset(ace_file, address)
+        ace_file.seek(offset)
+        return read_table(ace_file, filename if lazy else None, stats)
+
+
+def write_table(ace_file, table):
+    """ Write an AceTable in the ASCII (type 1) format
+
+    Parameters
+    ----------
+    ace_file : file
+    table : AceTable
+    """
+    h = table.header
+    if h.fmtversion is None:
+        ace_file.write('%10s%12s %11s %-10s\n' % (h.szax, h.atwgtr, h.temp,
+                                                  h.date))
+        ace_file.write('%s\n' % h.comments[0])
+    else:
+        ace_file.write('%-10s %-23s %-24s\n' % (h.fmtversion, h.szax,
+                                               h.source))
+        ace_file.write('%-11s%-11s%-8s%6d\n' % (h.atwgtr, h.temp, h.date,
+                                                len(h.comments)))
+        for comment in h.comments:
+            ace_file.write('%s\n' % comment)
+
+    izaw = np.empty(32, dtype=object)
+    izaw[0::2] = table.iz
+    izaw[1::2] = table.aw
+    for i in xrange(4):
+        ace_file.write(('%7d%11.6f' * 4 + '\n') % tuple(izaw[8*i:8*i+8]))
+    for values in (table.nxs, table.jxs):
+        for i in xrange(0, len(values), 8):
+            ace_file.write(('%9d' * 8 + '\n') % tuple(values[i:i+8]))
+
+    xss = table.xss
+    for i in xrange(0, len(xss), 4):
+        line = xss[i:i+4]
+        ace_file.write(('%20.11E' * len(line) + '\n') % tuple(line))
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Parser and index of MCNP xsdir cross-section directories
+
+Notes:
+An xsdir file may start with a 'datapath' line and an 'atomic weight ratios'
+section of ZA and AWR pairs, followed by the 'directory' of tables. Files
+without the section headings are read as a bare directory. Every directory
+entry is one line, or several lines joined by a trailing '+':
+
+    zaid awr filename access file_type address table_length
+        [record_length entries temperature [ptable]]
+
+For type 1 (ASCII) tables the address is the line number of the table in
+its library file, NumPy tables written by binary.py have file type 3. The
+parsed directory can be persisted next to the xsdir file as
+'<filename>.pkl', together with the byte offsets of the opened tables, and
+is reloaded while the xsdir file is unchanged. Directories opened with
+persist are saved again whenever the offset of another table is resolved.
+"""
+import os
+import cPickle as pickle
+from collections import namedtuple
+
+import numpy as np
+
+from mcnpy.utils import source_signature
+from reader import ace_filename_to_szax, line_offset, open_table
+
+xsdir_entry = namedtuple('xsdir_entry', 'zaid awr filename access file_type '
+                         'address table_length record_length entries '
+                         'temperature ptable')
+
+
+def index_filename(filename):
+    """ Default filename of the persisted index of an xsdir file """
+    return filename + '.pkl'
+
+
+def parse_entry(tokens):
+    """ Convert the fields of one directory entry into an xsdir_entry
+
+    Raises
+    ------
+    ValueError
+        If the entry has fewer than the seven required fields
+    """
+    if len(tokens) < 7:
+        raise ValueError('incomplete xsdir entry %s' % ' '.join(tokens))
+
+    optional = tokens[7:10] + [None] * (10 - max(len(tokens), 7))
+    return xsdir_entry(zaid=tokens[0], awr=float(tokens[1]),
+                       filename=tokens[2],
+                       access=None if tokens[3] == '0' else tokens[3],
+                       file_type=int(tokens[4]), address=int(tokens[5]),
+                       table_length=int(tokens[6]),
+                       record_length=int(optional[0] or 0),
+                       entries=int(optional[1] or 0),
+                       temperature=float(optional[2] or 0.),
+                       ptable='ptable' in tokens[10:])
+
+
+def read_xsdir(xsdir_file):
+    """ Parse the sections of an opened xsdir file
+
+    Parameters
+    ----------
+    xsdir_file : file
+
+    Returns
+    -------
+    datapath : str or None
+    awr : dict
+        Atomic weight ratio by ZA
+    entries : list
+        xsdir_entry of every table in file order
+    """
+    datapath = None
+    awr = {}
+    entries = []
+    section = 'directory'
+    tokens = []
+
+    for line in iter(xsdir_file.readline, ''):
+        stripped = line.strip()
+        lower = stripped.lower()
+        if not stripped:
+            continue
+        if lower.startswith('datapath'):
+            datapath = stripped.replace('=', ' ', 1).split()[1]
+            continue
+        if lower.startswith('atomic weight ratios'):
+            section = 'awr'
+            continue
+        if lower == 'directory':
+            section = 'directory'
+            continue
+
+        if section == 'awr':
+            values = stripped.split()
+            for za, ratio in zip(values[0::2], values[1::2]):
+                awr[int(za)] = float(ratio)
+            continue
+
+        tokens += stripped.split()
+        if tokens[-1] == '+':
+            tokens.pop()
+            continue
+        entries.append(parse_entry(tokens))
+        tokens = []
+
+    return datapath, awr, entries
+
+
+def write_xsdir(xsdir_file, entries, awr=None, datapath=None):
+    """ Write directory entries, with the optional sections, as an xsdir
+
+    Parameters
+    ----------
+    xsdir_file : file
+    entries : list
+        xsdir_entry of every table
+    awr : dict, optional
+        Atomic weight ratio by ZA
+    datapath : str, optional
+    """
+    if datapath is not None:
+        xsdir_file.write('datapath=%s\n' % datapath)
+    if awr:
+        xsdir_file.write('atomic weight ratios\n')
+        pairs = sorted(awr.items())
+        for i in xrange(0, len(pairs), 4):
+            xsdir_file.write(''.join('%7d %11.6f ' % pair
+                                     for pair in pairs[i:i+4]).rstrip())
+            xsdir_file.write('\n')
+        xsdir_file.write('directory\n')
+
+    for e in entries:
+        xsdir_file.write('%s %.6f %s %s %d %d %d %d %d %.6E%s\n' % (
+            e.zaid, e.awr, e.filename, e.access or '0', e.file_type,
+            e.address, e.table_length, e.record_length, e.entries,
+            e.temperature, ' ptable' if e.ptable else ''))
+
+
+class Xsdir(object):
+    """ Tables of an xsdir file indexed by ZAID and by (Z, A, temperature) """
+
+    def __init__(self, entries, awr=None, datapath=None, path=''):
+        """
+        Parameters
+        ----------
+        entries : list
+            xsdir_entry of every table
+        awr : dict, optional
+            Atomic weight ratio by ZA
+        datapath : str, optional
+            Directory of the library files
+        path : str
+            Directory of the xsdir file, used if there is no datapath
+        """
+        self.entries = entries
+        self.awr = awr or {}
+        self.datapath = datapath
+        self.path = path
+        self.offsets = {}
+        # (index file, xsdir file) the directory is persisted to
+        self.persist_to = None
+
+        self.by_zaid = {}
+        self.by_zat = {}
+        self._by_za = {}
+        for entry in entries:
+            # the first entry of a zaid is the one MCNP uses
+            self.by_zaid.setdefault(entry.zaid, entry)
+            try:
+                s, z, a, dd, lib_id = ace_filename_to_szax(entry.zaid)
+            except ValueError:
+                # S(a,b) tables such as 'lwtr.20t' are only found by name
+                continue
+            self.by_zat.setdefault((z, a, entry.temperature), []).append(entry)
+            self._by_za.setdefault((z, a), []).append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, zaid):
+        return zaid in self.by_zaid
+
+    def __getitem__(self, zaid):
+        return self.by_zaid[zaid]
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  tables: %d' % len(self)
+        printstr += '\n  nuclides: %d' % len(self._by_za)
+        printstr += '\n  datapath: %s' % self.datapath
+
+        return printstr
+
+    def find(self, z, a, temperature=None, lib_id=None):
+        """ Table of a nuclide closest to a temperature
+
+        Parameters
+        ----------
+        z : int
+            Atomic number
+        a : int
+            Mass number, metastable states keep the ZAID encoding
+        temperature : float, optional
+            Temperature in MeV, by default the first table found
+        lib_id : str, optional
+            Data class such as 'c' or 'nc'
+
+        Returns
+        -------
+        entry : xsdir_entry
+
+        Raises
+        ------
+        KeyError
+            If the xsdir has no matching table
+        """
+        candidates = [e for e in self._by_za.get((z, a), [])
+                      if lib_id is None or
+                      ace_filename_to_szax(e.zaid)[4] == lib_id]
+        if not candidates:
+            raise KeyError('no table for Z=%d A=%d' % (z, a))
+
+        if temperature is None:
+            return candidates[0]
+        return min(candidates, key=lambda e: abs(e.temperature - temperature))
+
+    def table_path(self, entry):
+        """ Filename of the library file holding a table """
+        base = self.datapath if self.datapath is not None else self.path
+        return os.path.join(base, entry.access or '', entry.filename)
+
+    def table_offset(self, entry):
+        """ Byte offset of a type 1 table in its library file, memoized """
+        if entry.zaid not in self.offsets:
+            with open(self.table_path(entry), 'r') as ace_file:
+                self.offsets[entry.zaid] = line_offset(ace_file,
+                                                       entry.address)
+            if self.persist_to is not None:
+                self._try_save()
+        return self.offsets[entry.zaid]
+
+    def _try_save(self):
+        try:
+            self.save(*self.persist_to)
+        except (IOError, OSError):
+            # read-only data directories
+            pass
+
+    def open_table(self, zaid, lazy=True, stats=None):
+        """ Open a table by ZAID
+
+        Parameters
+        ----------
+        zaid : str
+            Such as '92235.80c'
+        lazy : bool
+            Read the XSS array on first use, NumPy tables are always
+            memory-mapped
+        stats : mcnpy.stats.ParseStats, optional
+            Instruments the read of ASCII tables, see read_table
+
+        Returns
+        -------
+        table : AceTable
+
+        Raises
+        ------
+        KeyError
+            If the xsdir has no such table
+        ValueError
+            If the table is neither a type 1 (ASCII) nor a NumPy table
+        """
+        from binary import NPY_FILE_TYPE, open_npy_table
+
+        entry = self[zaid]
+        if entry.file_type == NPY_FILE_TYPE:
+            return open_npy_table(self.table_path(entry))
+        if entry.file_type != 1:
+            raise ValueError('unsupported file type %d of %s' %
+                             (entry.file_type, zaid))
+
+        return open_table(self.table_path(entry), lazy=lazy,
+                          offset=self.table_offset(entry), stats=stats)
+
+    def save(self, filename, source):
+        """ Persist the directory with the signature of its xsdir file
+
+        Parameters
+        ----------
+        filename : str
+            Index file
+        source : str
+            Filename of the indexed xsdir file
+        """
+        state = {'signature': source_signature(source),
+                 'entries': [tuple(e) for e in self.entries],
+                 'awr': self.awr,
+                 'datapath': self.datapath,
+                 'path': self.path,
+                 'offsets': self.offsets}
+        with open(filename, 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename, source):
+        """ Load a persisted directory, None if missing or out of date """
+        if not os.path.exists(filename):
+            return None
+
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+        if not np.array_equal(state['signature'], source_signature(source)):
+            return None
+
+        xsdir = cls([xsdir_entry(*e) for e in state['entries']],
+                    state['awr'], state['datapath'], state['path'])
+        xsdir.offsets = state['offsets']
+        return xsdir
+
+
+def open_xsdir(filename, persist=True):
+    """ Parse an xsdir file, or load its persisted index
+
+    Parameters
+    ----------
+    filename : str
+    persist : bool
+        Use and write the index file next to the xsdir file, updating it
+        with the offset of every table opened
+
+    Returns
+    -------
+    xsdir : Xsdir
+    """
+    if persist:
+        xsdir = Xsdir.load(index_filename(filename), filename)
+        if xsdir is not None:
+            xsdir.persist_to = (index_filename(filename), filename)
+            return xsdir
+
+    with open(filename, 'r') as xsdir_file:
+        datapath, awr, entries = read_xsdir(xsdir_file)
+    xsdir = Xsdir(entries, awr, datapath, os.path.dirname(filename))
+
+    if persist:
+        xsdir.persist_to = (index_filename(filename), filename)
+        xsdir._try_save()
+    return xsdir
@@ -5,18 +5,64 @@ Created on Wed Feb 25 11:29:31 2015
 @author: Aaron
 """
 
+import os
+import re
+import json
+import time
+import hashlib
+import itertools
 import subprocess
 import tempfile
 import shutil
+import threading
+from collections import namedtuple
 from contextlib import contextmanager
 
+ERROR_MESSAGES = ('bad trouble', 'fatal error')
+STDOUT_FILE = 'mcnp.stdout'
+# ' dump no.    2 on file runtpe     nps =       20000    coll = ...'
+DUMP_LINE = re.compile(r'dump no\.\s*(\d+).*?nps\s*=\s*(\d+)')
+
+sweep_result = namedtuple('sweep_result', 'params status output_dir attempts '
+                          'returncode')
+
+
+# restart and source files are not kept in the result cache
+UNCACHED_FILES = ('runtpe', 'srctp')
+
 
 def clean_directory(clean_dir):
     shutil.rmtree(clean_dir)
 
 
+def copy_directory(source_dir, prefix='tmp', root=None):
+    """ Copy a directory to a new temporary directory
+
+    Returns
+    -------
+    output_dir : str or None
+        Path of the copy, None if the source could not be copied
+    """
+    output_dir = tempfile.mkdtemp(prefix=prefix, dir=root)
+    os.rmdir(output_dir)
+    try:
+        shutil.copytree(source_dir, output_dir)
+    except (IOError, OSError, shutil.Error):
+        if os.path.exists(output_dir):
+            clean_directory(output_dir)
+        return None
+
+    return output_dir
+
+
+def has_errors(stdout):
+    """ Check MCNP stdout for error messages, MCNP exits with 0 regardless """
+    return any(message in stdout for message in ERROR_MESSAGES)
+
+
 @contextmanager
-def run_mcnp(card, params=None, cores=1, clean=True):
+def run_mcnp(card, params=None, cores=1, clean=True, executable='mcnp6',
+             cache=None, data_files=()):
     """ Python interface for running MCNP programs.
 
     Parameters
@@ -29,6 +75,14 @@ def run_mcnp(card, params=None, cores=1, clean=True):
         Number of CPU cores for MCNP to run on
     clean : bool
         Clean the temporary output directory
+    executable : str
+        MCNP executable
+    cache : McnpResultCache, optional
+        Cache of the outputs of successful runs, a cached run is not run
+        again and a copy of its cache entry is returned instead
+    data_files : list
+        Files read by MCNP, such as xsdir or source files, whose contents
+        are part of the cache key
 
     Returns
     -------
@@ -39,33 +93,539 @@ def run_mcnp(card, params=None, cores=1, clean=True):
     """
     if params:
         card = card.format(**params)
-    
-    args = ['tasks', cores]
-    
-    # create temp folder
-    output_dir = tempfile.mkdtemp()
-    with open(output_dir + '\\input.i', 'w') as f:
-        f.write(card)
-    
-    args += ['i=input.i']
-
-    # mcnp doesn't use errorcodes or stderr, so Popen doesnt add features
-    # stick with simpler check_output and parse stdout
-    args = [str(i) for i in args]
-    mcnp = subprocess.check_output(['mcnp6'] + args, shell=True,
-                                   cwd=output_dir)
-    
-    # check for errors in stdout
-    if 'bad trouble' in mcnp or 'fatal error' in mcnp:
-        print 'Error in MCNP outout'
-        print mcnp
-        status = False
-    else:
-        status = True
-    
+
+    output_dir = None
+    if cache is not None:
+        key = cache.key(card, data_files, executable)
+        cached_dir = cache.get(key)
+        if cached_dir is not None:
+            # the entry may be replaced or evicted while the caller reads it
+            output_dir = copy_directory(cached_dir)
+            status = True
+
+    if output_dir is None:
+        args = ['tasks', cores]
+
+        # create temp folder
+        output_dir = tempfile.mkdtemp()
+        with open(os.path.join(output_dir, 'input.i'), 'w') as f:
+            f.write(card)
+
+        args += ['i=input.i']
+
+        # mcnp doesn't use errorcodes or stderr, so errors are found in the
+        # stdout returned by check_output, see McnpProcess to stream it
+        args = [str(i) for i in args]
+        mcnp = subprocess.check_output([executable] + args, cwd=output_dir)
+
+        # check for errors in stdout
+        if has_errors(mcnp):
+            print 'Error in MCNP outout'
+            print mcnp
+            status = False
+        else:
+            status = True
+
+        if status and cache is not None:
+            cache.store(key, output_dir)
+
     try:
         yield status, output_dir
     finally:
         if clean:
             print output_dir
-            clean_directory(output_dir)
\ No newline at end of file
+            clean_directory(output_dir)
+
+
+class McnpResultCache(object):
+    """ Content-addressed store of the output directories of MCNP runs
+
+    A run is keyed by a hash of its rendered input card, its executable and
+    the contents of the data files it reads. The number of tasks does not
+    change the results of MCNP, so it is not part of the key. Each entry is
+    a copy of the output directory without restart files. Using an entry
+    refreshes its modification time, and least recently used entries are
+    removed once the cache exceeds its byte budget.
+    """
+
+    def __init__(self, path, max_bytes=None):
+        """
+        Parameters
+        ----------
+        path : str
+            Cache directory, created if missing
+        max_bytes : int, optional
+            Budget of the cached files, unlimited by default
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = dict(hits=0, misses=0, evictions=0)
+        self._file_hashes = {}
+
+    def __contains__(self, key):
+        return os.path.isdir(self._entry(key))
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  path: ' + self.path
+        printstr += '\n  entries: %d' % len(self.keys())
+        printstr += '\n  bytes: %d' % self.nbytes
+        for key in ('hits', 'misses', 'evictions'):
+            printstr += '\n  %s: %d' % (key, self.stats[key])
+
+        return printstr
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def _file_hash(self, filename):
+        stat = os.stat(filename)
+        signature = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+        if signature not in self._file_hashes:
+            digest = hashlib.sha1()
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), ''):
+                    digest.update(block)
+            self._file_hashes[signature] = digest.hexdigest()
+        return self._file_hashes[signature]
+
+    def key(self, card, data_files=(), executable='mcnp6'):
+        """ Cache key of a run
+
+        Parameters
+        ----------
+        card : str
+            Rendered MCNP input card
+        data_files : list
+            Files read by the run, hashed by content
+        executable : str
+            MCNP executable, only its name is used
+
+        Returns
+        -------
+        key : str
+            Hex digest
+        """
+        digest = hashlib.sha1()
+        digest.update(os.path.basename(executable) + '\0')
+        digest.update(card + '\0')
+        for filename in sorted(data_files):
+            digest.update(self._file_hash(filename) + '\0')
+        return digest.hexdigest()
+
+    def keys(self):
+        """ Keys of all cached runs """
+        return [k for k in os.listdir(self.path)
+                if os.path.isdir(self._entry(k)) and not k.endswith('.tmp')]
+
+    @property
+    def nbytes(self):
+        """ Bytes of all cached files """
+        total = 0
+        for key in self.keys():
+            for root, dirs, files in os.walk(self._entry(key)):
+                total += sum(os.path.getsize(os.path.join(root, f))
+                             for f in files)
+        return total
+
+    def get(self, key):
+        """ Cached output directory of a run, None if not cached """
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        os.utime(entry, None)
+        return entry
+
+    def store(self, key, output_dir):
+        """ Copy the output directory of a successful run into the cache
+
+        Parameters
+        ----------
+        key : str
+            See key
+        output_dir : str
+
+        Returns
+        -------
+        entry : str
+            Cache directory of the run
+        """
+        entry = self._entry(key)
+        tmp_entry = '%s.%d.tmp' % (entry, os.getpid())
+        if os.path.exists(tmp_entry):
+            shutil.rmtree(tmp_entry)
+        shutil.copytree(output_dir, tmp_entry,
+                        ignore=shutil.ignore_patterns(*UNCACHED_FILES))
+        with open(os.path.join(tmp_entry, 'cache.json'), 'w') as f:
+            json.dump({'key': key, 'stored': time.time(),
+                       'source': os.path.abspath(output_dir)}, f)
+
+        self.invalidate(key)
+        os.rename(tmp_entry, entry)
+        self.evict(keep=key)
+        return entry
+
+    def invalidate(self, key):
+        """ Remove a cached run
+
+        Returns
+        -------
+        removed : bool
+            False if the run was not cached
+        """
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            return False
+        shutil.rmtree(entry)
+        return True
+
+    def evict(self, keep=None):
+        """ Remove least recently used runs while over the byte budget
+
+        Parameters
+        ----------
+        keep : str, optional
+            Key that is never removed
+
+        Returns
+        -------
+        n_evicted : int
+        """
+        if self.max_bytes is None:
+            return 0
+
+        entries = []
+        for key in self.keys():
+            size = 0
+            for root, dirs, files in os.walk(self._entry(key)):
+                size += sum(os.path.getsize(os.path.join(root, f))
+                            for f in files)
+            entries.append((os.stat(self._entry(key)).st_mtime, size, key))
+        entries.sort()
+
+        total = sum(size for mtime, size, key in entries)
+        n_evicted = 0
+        for mtime, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.invalidate(key)
+            total -= size
+            n_evicted += 1
+
+        self.stats['evictions'] += n_evicted
+        return n_evicted
+
+    def clear(self):
+        """ Remove all cached runs """
+        for key in self.keys():
+            self.invalidate(key)
+
+
+def parameter_grid(grid):
+    """ Expand a parameter grid into the parameters of every run
+
+    Parameters
+    ----------
+    grid : dict or list
+        Values of each parameter, combined as a cartesian product in sorted
+        parameter order, or a list of parameter dicts used as they are
+
+    Returns
+    -------
+    params : list
+        dict of parameters of each run
+    """
+    if not isinstance(grid, dict):
+        return [dict(p) for p in grid]
+
+    names = sorted(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[n] for n in names])]
+
+
+class McnpProcess(object):
+    """ MCNP run with its stdout streamed line by line
+
+    A reader thread writes stdout to STDOUT_FILE in the output directory as
+    it arrives, tracks the progress from the dump lines and, with fail_fast,
+    stops MCNP on the first error message instead of at its end.
+    """
+
+    def __init__(self, card, output_dir, tasks=1, executable='mcnp6',
+                 timeout=None, fail_fast=True, on_line=None,
+                 on_progress=None, input_name='input.i'):
+        """
+        Parameters
+        ----------
+        card : str
+            Complete MCNP input card
+        output_dir : str
+            Working directory of the run
+        tasks : int
+            Number of MCNP tasks
+        executable : str
+            MCNP executable
+        timeout : float, optional
+            Wall-clock seconds after which MCNP is stopped
+        fail_fast : bool
+            Stop MCNP as soon as it reports an error
+        on_line : callable, optional
+            Called with the process and each stdout line
+        on_progress : callable, optional
+            Called with the process after each rendezvous dump
+
+        Raises
+        ------
+        OSError
+            If the executable cannot be started
+        """
+        self.output_dir = output_dir
+        self.fail_fast = fail_fast
+        self.on_line = on_line
+        self.on_progress = on_progress
+        self.nps = 0
+        self.dumps = 0
+        self.error = None
+        self.timed_out = False
+        self.cancelled = False
+        self._done = threading.Event()
+
+        with open(os.path.join(output_dir, input_name), 'w') as f:
+            f.write(card)
+        args = [executable, 'tasks', str(tasks), 'i=' + input_name]
+        self.process = subprocess.Popen(args, cwd=output_dir,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT)
+
+        self._timer = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._timeout)
+            self._timer.daemon = True
+            self._timer.start()
+        self._reader = threading.Thread(target=self._read)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  output_dir: ' + self.output_dir
+        printstr += '\n  done: %s' % self.done
+        printstr += '\n  nps: %d' % self.nps
+        printstr += '\n  dumps: %d' % self.dumps
+        if self.error:
+            printstr += '\n  error: ' + self.error
+
+        return printstr
+
+    def _read(self):
+        with open(os.path.join(self.output_dir, STDOUT_FILE), 'w') as log:
+            for line in iter(self.process.stdout.readline, ''):
+                log.write(line)
+                self._parse(line)
+        self.process.wait()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._done.set()
+
+    def _parse(self, line):
+        if self.on_line is not None:
+            self.on_line(self, line)
+
+        if self.error is None and has_errors(line):
+            self.error = line.strip()
+            if self.fail_fast:
+                self.terminate()
+
+        dump = DUMP_LINE.search(line)
+        if dump is not None:
+            self.dumps, self.nps = int(dump.group(1)), int(dump.group(2))
+            if self.on_progress is not None:
+                self.on_progress(self)
+
+    def _timeout(self):
+        self.timed_out = True
+        self.terminate()
+
+    def terminate(self):
+        """ Stop MCNP, the run then finishes as failed """
+        try:
+            self.process.terminate()
+        except OSError:
+            # already exited
+            pass
+
+    def cancel(self):
+        """ Stop MCNP on request of the caller """
+        self.cancelled = True
+        self.terminate()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def returncode(self):
+        return self.process.returncode if self.done else None
+
+    @property
+    def status(self):
+        """ True if MCNP finished without errors, None while running """
+        if not self.done:
+            return None
+        return self.process.returncode == 0 and self.error is None and \
+            not self.timed_out and not self.cancelled
+
+    def wait(self, timeout=None):
+        """ Wait for the run to finish
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait at most
+
+        Returns
+        -------
+        status : bool or None
+            See status
+        """
+        self._done.wait(timeout)
+        return self.status
+
+
+def as_completed(processes, poll_interval=0.05):
+    """ Yield McnpProcess objects as they finish
+
+    Parameters
+    ----------
+    processes : list
+        McnpProcess objects, all watched from the calling thread
+    poll_interval : float
+        Seconds between checks
+
+    Returns
+    -------
+    processes : generator
+    """
+    remaining = list(processes)
+    while remaining:
+        for process in [p for p in remaining if p.done]:
+            remaining.remove(process)
+            yield process
+        if remaining:
+            time.sleep(poll_interval)
+
+
+def run_sweep(card, grid, cores=1, tasks=None, retries=0, executable='mcnp6',
+              output_root=None, poll_interval=0.1, callback=None,
+              timeout=None, cache=None, data_files=()):
+    """ Run MCNP for every point of a parameter grid concurrently
+
+    Runs are started in grid order while their tasks fit in the core budget.
+    A run fails if MCNP exits with an error code, reports an error (which
+    stops it at once) or times out. Failed runs are restarted in a new
+    directory up to retries times.
+
+    Parameters
+    ----------
+    card : str
+        MCNP input card, formatted with str.format(**params) for every run
+    grid : dict or list
+        See parameter_grid
+    cores : int
+        Total number of cores of all concurrent runs
+    tasks : int, optional
+        Tasks of each run, by default the cores are split evenly over the
+        runs that can start at once
+    retries : int
+        Number of restarts of a failed run
+    executable : str
+        MCNP executable
+    output_root : str, optional
+        Directory of the run directories, by default the temp directory
+    poll_interval : float
+        Seconds between checks of the running processes
+    callback : callable, optional
+        Called with the sweep_result of each run as it finishes
+    timeout : float, optional
+        Wall-clock seconds after which a run is stopped as failed
+    cache : McnpResultCache, optional
+        Runs found in the cache are not run again, their results have zero
+        attempts and a copy of the cache entry in output_root, successful
+        runs are stored
+    data_files : list
+        Files read by MCNP that are part of the cache key
+
+    Returns
+    -------
+    results : list
+        sweep_result of each run in grid order
+    """
+    runs = parameter_grid(grid)
+    if tasks is None:
+        tasks = max(1, cores // max(1, min(len(runs), cores)))
+    tasks = min(tasks, cores)
+
+    pending = []
+    running = {}
+    results = [None] * len(runs)
+    keys = [None] * len(runs)
+    for i in xrange(len(runs) - 1, -1, -1):
+        if cache is not None:
+            keys[i] = cache.key(card.format(**runs[i]), data_files,
+                                executable)
+            cached_dir = cache.get(keys[i])
+            # later runs of the sweep may evict the entry
+            output_dir = None if cached_dir is None else \
+                copy_directory(cached_dir, 'run%04d_' % i, output_root)
+            if output_dir is not None:
+                results[i] = sweep_result(params=runs[i], status=True,
+                                          output_dir=output_dir, attempts=0,
+                                          returncode=0)
+                continue
+        pending.append((i, 1))
+    if callback is not None:
+        for result in results:
+            if result is not None:
+                callback(result)
+
+    while pending or running:
+        while pending and (len(running) + 1) * tasks <= cores:
+            i, attempt = pending.pop()
+            output_dir = tempfile.mkdtemp(prefix='run%04d_' % i,
+                                          dir=output_root)
+            try:
+                process = McnpProcess(card.format(**runs[i]), output_dir,
+                                      tasks, executable, timeout)
+            except OSError:
+                process = None
+            running[i] = (process, output_dir, attempt)
+
+        time.sleep(poll_interval)
+        for i, (process, output_dir, attempt) in running.items():
+            if process is not None and not process.done:
+                continue
+            del running[i]
+
+            status = process is not None and process.status
+            if not status and attempt <= retries:
+                clean_directory(output_dir)
+                pending.append((i, attempt + 1))
+                continue
+
+            if status and cache is not None:
+                cache.store(keys[i], output_dir)
+            results[i] = sweep_result(
+                params=runs[i], status=status, output_dir=output_dir,
+                attempts=attempt,
+                returncode=process.returncode if process else None)
+            if callback is not None:
+                callback(results[i])
+
+    return results
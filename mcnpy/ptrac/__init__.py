@@ -1,2 +1,2 @@
 from reader import *
-from plotter import plot_events
+from plotter import plot_arrays, plot_events
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming group-by reductions and histograms of PTRAC events
+
+Notes:
+Aggregations are fed the events of parse_event one history at a time by
+aggregate, so only their accumulators stay in memory: one count and sum per
+distinct group for GroupBy, one row of bins per group for Histogram.
+
+Group keys are tuples of integer variables, such as ncl, ntyn or nter,
+converted with int. Events of a kind without one of the key, value or
+histogram variables are skipped by the aggregation.
+
+Accumulators only hold counts, sums and the number of histories, so
+aggregations of chunks of a file, parsed in any order or in other
+processes, are merged by addition. Counts merge exactly, float sums up to
+rounding.
+"""
+from bisect import bisect_right
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from parallel import _open_chunk, split_events
+from reader import (EVENT_KINDS, event_kind, parse_binary_events,
+                    parse_ptrac_events)
+
+
+class Aggregation(object):
+    """ Base of the mergeable reductions of PTRAC events
+
+    Subclasses such as GroupBy and Histogram provide the methods used by
+    aggregate and merge:
+
+    add(event)
+        Accumulate an event of one of event_types
+    empty()
+        New aggregation of the same query without results
+    is_compatible(other)
+        True if other has the same query
+    _merge(other)
+        Add the accumulators of a compatible aggregation
+    """
+
+    def __init__(self, event_types=None):
+        """
+        Parameters
+        ----------
+        event_types : list, optional
+            Event kinds ('src', 'bnk', 'sur', 'col', 'ter') to include, by
+            default all
+        """
+        self.event_types = tuple(event_types or EVENT_KINDS)
+        self.n_histories = 0
+
+    def accepts(self, kind):
+        return kind in self.event_types
+
+    def merge(self, other):
+        """ Add the results of an aggregation of the same query
+
+        Raises
+        ------
+        ValueError
+            If the queries differ
+        """
+        if type(self) is not type(other) or not self.is_compatible(other):
+            raise ValueError('aggregations have different queries')
+
+        self._merge(other)
+        self.n_histories += other.n_histories
+        return self
+
+    __iadd__ = merge
+
+
+def _key(event, names):
+    """ Tuple of integer variables of an event, None if one is missing """
+    try:
+        return tuple([int(getattr(event, name)) for name in names])
+    except AttributeError:
+        return None
+
+
+class GroupBy(Aggregation):
+    """ Event counts and sums of a variable by groups of integer variables
+
+    Examples
+    --------
+    Collisions by cell and reaction, weight of terminations by type
+
+    >>> GroupBy(('ncl', 'ntyn'), event_types=['col'])
+    >>> GroupBy(('nter',), value='wgt', event_types=['ter'])
+    """
+
+    def __init__(self, keys, value=None, event_types=None):
+        """
+        Parameters
+        ----------
+        keys : tuple
+            Integer variables of the group, empty for one group of all
+            events
+        value : str, optional
+            Variable to sum, such as 'wgt'
+        event_types : list, optional
+            See Aggregation
+        """
+        Aggregation.__init__(self, event_types)
+        self.keys = tuple(keys)
+        self.value = value
+        self.counts = {}
+        self.sums = {}
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  keys: %s' % (self.keys,)
+        printstr += '\n  value: %s' % self.value
+        printstr += '\n  histories: %d' % self.n_histories
+        printstr += '\n  groups: %d' % len(self.counts)
+        printstr += '\n  events: %d' % sum(self.counts.values())
+
+        return printstr
+
+    def add(self, event):
+        key = _key(event, self.keys)
+        if key is None:
+            return
+        if self.value is not None:
+            value = getattr(event, self.value, None)
+            if value is None:
+                return
+            self.sums[key] = self.sums.get(key, 0.) + value
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def empty(self):
+        return GroupBy(self.keys, self.value, self.event_types)
+
+    def is_compatible(self, other):
+        return (self.keys, self.value, self.event_types) == \
+            (other.keys, other.value, other.event_types)
+
+    def _merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for key, total in other.sums.items():
+            self.sums[key] = self.sums.get(key, 0.) + total
+
+    def to_array(self):
+        """ Groups as a record array sorted by key
+
+        Returns
+        -------
+        array : ndarray
+            A field per key variable, 'count' and 'sum' if value is set
+        """
+        dtype = [(name, np.int64) for name in self.keys] + \
+            [('count', np.int64)]
+        if self.value is not None:
+            dtype.append(('sum', np.float64))
+
+        groups = sorted(self.counts)
+        array = np.zeros(len(groups), dtype=dtype)
+        for i, name in enumerate(self.keys):
+            array[name] = [key[i] for key in groups]
+        array['count'] = [self.counts[key] for key in groups]
+        if self.value is not None:
+            array['sum'] = [self.sums[key] for key in groups]
+        return array
+
+
+class Histogram(Aggregation):
+    """ Histograms of a variable, optionally weighted and by groups
+
+    Bins include their lower edge, the last bin its upper edge as well, like
+    numpy.histogram. Values outside of the edges are counted in outside.
+
+    Examples
+    --------
+    Collision energy spectrum of every cell
+
+    >>> Histogram('erg', np.logspace(-9, 2, 111), by=('ncl',),
+    ...           event_types=['col'])
+    """
+
+    def __init__(self, variable, edges, by=(), weight=None,
+                 event_types=None):
+        """
+        Parameters
+        ----------
+        variable : str
+            Histogrammed variable, such as 'erg'
+        edges : ndarray
+            Increasing bin edges
+        by : tuple
+            Integer variables of the group of each histogram
+        weight : str, optional
+            Variable weighting each event, such as 'wgt'
+        event_types : list, optional
+            See Aggregation
+        """
+        Aggregation.__init__(self, event_types)
+        self.variable = variable
+        self.edges = [float(e) for e in edges]
+        self.by = tuple(by)
+        self.weight = weight
+        self.bins = {}
+        self.outside = 0
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  variable: %s' % self.variable
+        printstr += '\n  bins: %d' % (len(self.edges) - 1)
+        printstr += '\n  by: %s' % (self.by,)
+        printstr += '\n  weight: %s' % self.weight
+        printstr += '\n  histories: %d' % self.n_histories
+        printstr += '\n  groups: %d' % len(self.bins)
+        printstr += '\n  outside: %d' % self.outside
+
+        return printstr
+
+    def add(self, event):
+        key = _key(event, self.by)
+        value = getattr(event, self.variable, None)
+        weight = 1. if self.weight is None else \
+            getattr(event, self.weight, None)
+        if key is None or value is None or weight is None:
+            return
+
+        i = bisect_right(self.edges, value) - 1
+        n_bins = len(self.edges) - 1
+        if i == n_bins and value == self.edges[-1]:
+            i -= 1
+        if i < 0 or i >= n_bins:
+            self.outside += 1
+            return
+
+        bins = self.bins.get(key)
+        if bins is None:
+            bins = self.bins[key] = [0.] * n_bins
+        bins[i] += weight
+
+    def empty(self):
+        return Histogram(self.variable, self.edges, self.by, self.weight,
+                         self.event_types)
+
+    def is_compatible(self, other):
+        return (self.variable, self.edges, self.by, self.weight,
+                self.event_types) == \
+            (other.variable, other.edges, other.by, other.weight,
+             other.event_types)
+
+    def _merge(self, other):
+        for key, bins in other.bins.items():
+            own = self.bins.setdefault(key, [0.] * len(bins))
+            for i, value in enumerate(bins):
+                own[i] += value
+        self.outside += other.outside
+
+    def histogram(self, key=()):
+        """ Bin contents of a group, zeros if it has no events
+
+        Parameters
+        ----------
+        key : tuple
+            Values of the by variables, such as (ncl,)
+
+        Returns
+        -------
+        bins : ndarray
+        """
+        return np.array(self.bins.get(tuple(key), [0.] *
+                                      (len(self.edges) - 1)))
+
+    def to_array(self):
+        """ Histograms of all groups sorted by key, (n_groups, n_bins)
+
+        Returns
+        -------
+        keys : list
+        bins : ndarray
+        """
+        keys = sorted(self.bins)
+        bins = np.array([self.bins[key] for key in keys]).reshape(
+            len(keys), len(self.edges) - 1)
+        return keys, bins
+
+
+def aggregate(histories, aggregations):
+    """ Feed the events of histories to aggregations in one pass
+
+    Parameters
+    ----------
+    histories : iterable
+        Of PtracHistory, such as PtracReader.parse_event()
+    aggregations : list
+        Of Aggregation
+
+    Returns
+    -------
+    aggregations : list
+    """
+    # add methods of the aggregations accepting each event type
+    dispatch = {}
+    for history in histories:
+        for aggregation in aggregations:
+            aggregation.n_histories += 1
+        for event in history.events:
+            adds = dispatch.get(event.type)
+            if adds is None:
+                kind = event_kind(event.type)
+                adds = dispatch[event.type] = [
+                    a.add for a in aggregations if a.accepts(kind)]
+            for add in adds:
+                add(event)
+
+    return aggregations
+
+
+def _aggregate_chunk(args):
+    aggregations = args[0]
+    filename, is_binary, start, end, event_format = args[1:]
+    chunk = _open_chunk(filename, is_binary, start, end)
+    try:
+        if is_binary:
+            histories = parse_binary_events(chunk, event_format)
+        else:
+            histories = parse_ptrac_events(chunk, event_format)
+        return aggregate(histories, aggregations)
+    finally:
+        chunk.close()
+
+
+def aggregate_parallel(ptrac, aggregations, workers=None, n_chunks=None):
+    """ Aggregate a PTRAC file in a process pool, merging chunk results
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+        Reader with parsed header
+    aggregations : list
+        Of Aggregation the results are merged into
+    workers : int, optional
+        Number of processes, defaults to the CPU count
+    n_chunks : int, optional
+        Number of byte ranges, defaults to four per worker
+
+    Returns
+    -------
+    aggregations : list
+    """
+    workers = workers or cpu_count()
+    ranges = split_events(ptrac, n_chunks or 4 * workers)
+    tasks = [([a.empty() for a in aggregations], ptrac.filename,
+              ptrac.is_binary, start, end, ptrac.event_format)
+             for start, end in ranges]
+
+    pool = Pool(workers)
+    try:
+        for partials in pool.imap_unordered(_aggregate_chunk, tasks):
+            for aggregation, partial in zip(aggregations, partials):
+                aggregation.merge(partial)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return aggregations
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped access to binary (file=bin) PTRAC output
+
+Notes:
+Binary PTRAC files are Fortran unformatted sequential files, every record is
+surrounded by 4 byte little-endian length markers. The records mirror the
+lines of the ASCII output:
+
+    -1                          int32
+    kod ver loddat idtm aid     char*8, char*5, char*8, char*19, char*80
+    input format                float64
+    event format counts         int32
+    event format variable ids   int32
+    per history:
+        nps line                int (output_byte_size bytes wide)
+        per event:
+            integer line        int (output_byte_size bytes wide)
+            float line          float64
+"""
+import mmap
+import struct
+from StringIO import StringIO
+
+import numpy as np
+
+MARKER = struct.Struct('<i')
+HEADER_WIDTHS = [8, 5, 8, 19, 80]
+
+
+def is_binary_ptrac(filename):
+    """ Check if a PTRAC file starts with the Fortran record of -1 """
+    with open(filename, 'rb') as f:
+        start = f.read(12)
+    if len(start) < 12:
+        return False
+
+    return struct.unpack('<iii', start) == (4, -1, 4)
+
+
+def int_dtype(event_format):
+    """ NumPy integer type of the nps and event integer records """
+    if event_format.output_byte_size == 8:
+        return np.dtype('<i8')
+    return np.dtype('<i4')
+
+
+class FortranRecordFile(object):
+    """ Sequential reader of memory-mapped Fortran unformatted records """
+
+    def __init__(self, filename, end=None):
+        """
+        Parameters
+        ----------
+        filename : str
+        end : int, optional
+            Byte offset treated as the end of file, at a record boundary
+        """
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = np.frombuffer(self._mmap, dtype=np.uint8)
+        self.size = len(self.data) if end is None else end
+        self.pos = 0
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.data = None
+        self._mmap.close()
+
+    def unpack(self, fmt, offset):
+        """ Unpack a struct format at a byte offset of the file """
+        return struct.unpack_from(fmt, self._mmap, offset)
+
+    def next_record(self):
+        """ Advance over the next record
+
+        Returns
+        -------
+        record : tuple or None
+            (byte offset, byte size) of the record data, None at end of file
+        """
+        if self.pos + MARKER.size > self.size:
+            return None
+
+        size, = MARKER.unpack_from(self._mmap, self.pos)
+        start = self.pos + MARKER.size
+        end = start + size
+        if size < 0 or end + MARKER.size > self.size or \
+                MARKER.unpack_from(self._mmap, end)[0] != size:
+            raise IOError('corrupt fortran record at byte %d' % self.pos)
+
+        self.pos = end + MARKER.size
+        return start, size
+
+    def read_record(self, dtype=np.uint8):
+        """ Zero-copy view of the next record, None at end of file """
+        record = self.next_record()
+        if record is None:
+            return None
+
+        start, size = record
+        return self.data[start:start+size].view(dtype)
+
+    def gather(self, offsets, count, dtype, batch=65536):
+        """ Copy equally sized records starting at offsets into a 2D array
+
+        Parameters
+        ----------
+        offsets : ndarray
+            Byte offsets of the record data
+        count : int
+            Number of values in each record
+        dtype : dtype
+            Type of the record values
+
+        Returns
+        -------
+        values : ndarray
+            (len(offsets), count) array of record values
+        """
+        dtype = np.dtype(dtype)
+        nbytes = np.arange(count * dtype.itemsize)
+        values = np.empty((len(offsets), count), dtype=dtype)
+        for i in xrange(0, len(offsets), batch):
+            index = offsets[i:i+batch, None] + nbytes
+            values[i:i+batch] = self.data[index].view(dtype)
+
+        return values
+
+
+def write_record(f, values):
+    """ Write an array or string as a Fortran unformatted record """
+    if isinstance(values, np.ndarray):
+        values = values.tostring()
+    f.write(MARKER.pack(len(values)))
+    f.write(values)
+    f.write(MARKER.pack(len(values)))
+
+
+def binary_format_lines(records):
+    """ Convert the header and format records into their ASCII lines
+
+    The ASCII parsers PtracHeader, PtracInputFormat and PtracEventFormat can
+    then be applied to the returned file-like object.
+
+    Parameters
+    ----------
+    records : FortranRecordFile
+        Positioned at the start of the file
+
+    Returns
+    -------
+    lines : StringIO
+    """
+    lines = [str(records.read_record(np.int32)[0])]
+
+    header = records.read_record().tostring()
+    fields = []
+    position = 0
+    for width in HEADER_WIDTHS:
+        fields.append(header[position:position+width].strip())
+        position += width
+    lines.append(' '.join(fields[:-1]))
+    lines.append(fields[-1])
+
+    lines.append(' '.join(repr(v) for v in
+                          records.read_record(np.float64).tolist()))
+    for i in xrange(2):
+        lines.append(' '.join(str(v) for v in
+                              records.read_record(np.int32).tolist()))
+
+    return StringIO('\n'.join(lines) + '\n')
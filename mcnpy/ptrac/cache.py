@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent columnar cache of parsed PTRAC files
+
+Notes:
+A cache is a directory holding one '.npy' file per record array of
+parse_ptrac_columnar, loaded back as memory maps, and 'meta.pkl' with the
+header, input format and event format. The metadata keeps the path, size and
+modification time of the PTRAC file, the cache is only used while they match.
+"""
+import os
+import shutil
+import hashlib
+import cPickle as pickle
+
+import numpy as np
+
+from mcnpy.utils import source_signature
+from reader import EVENT_KINDS
+
+
+class PtracCache(object):
+    """ Columnar cache directory of one PTRAC file """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_file(cls, filename, cache_dir=None):
+        """ Cache of a PTRAC file
+
+        Parameters
+        ----------
+        filename : str
+            PTRAC file
+        cache_dir : str, optional
+            Directory holding caches keyed by the absolute path of the file,
+            by default the cache is placed next to the file
+
+        Returns
+        -------
+        cache : PtracCache
+        """
+        if cache_dir is None:
+            return cls(filename + '.cache')
+
+        key = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+        return cls(os.path.join(cache_dir, key))
+
+    def _meta(self):
+        meta_file = os.path.join(self.path, 'meta.pkl')
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'rb') as f:
+            return pickle.load(f)
+
+    def is_valid(self, filename):
+        """ Check the cache was written from the current contents of file """
+        meta = self._meta()
+        if meta is None:
+            return False
+
+        return meta['source'] == os.path.abspath(filename) and \
+            np.array_equal(meta['signature'], source_signature(filename))
+
+    def load_formats(self):
+        """ Cached header, input format, event format and events offset """
+        meta = self._meta()
+        return (meta['header'], meta['input_format'], meta['event_format'],
+                meta['events_offset'])
+
+    def load_arrays(self, mmap_mode='r'):
+        """ Cached record arrays, memory-mapped by default """
+        return dict((k, np.load(os.path.join(self.path, k + '.npy'),
+                                mmap_mode=mmap_mode))
+                    for k in ('nps',) + EVENT_KINDS)
+
+    def save(self, ptrac, arrays):
+        """ Write the formats of a PtracReader and its parsed arrays
+
+        The cache is written to a temporary directory first, so a cache
+        directory is always complete.
+        """
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        for kind, array in arrays.items():
+            np.save(os.path.join(tmp_path, kind + '.npy'), array)
+
+        meta = {'source': os.path.abspath(ptrac.filename),
+                'signature': source_signature(ptrac.filename),
+                'header': ptrac.header,
+                'input_format': ptrac.input_format,
+                'event_format': ptrac.event_format,
+                'events_offset': ptrac.events_offset}
+        with open(os.path.join(tmp_path, 'meta.pkl'), 'wb') as f:
+            pickle.dump(meta, f, pickle.HIGHEST_PROTOCOL)
+
+        self.clear()
+        os.rename(tmp_path, self.path)
+
+    def clear(self):
+        """ Remove the cache directory """
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Follow ASCII PTRAC files while MCNP is still writing them
+
+Notes:
+MCNP flushes PTRAC output in blocks, so the end of a growing file usually
+holds a partial line. TailFile only hands complete lines to the parser and
+waits for the rest otherwise, which makes the parser yield a history as soon
+as its last event line, the one announcing the 9000 terminator, is written.
+Once the writer has stopped, a partial last line is discarded and a history
+missing any of its lines is dropped.
+
+Waiting defaults to polling the file every poll_interval seconds. A wait
+callable, for example one blocking on an inotify watch of the file, can be
+given instead to wake up as soon as the file changes.
+"""
+import time
+
+from reader import parse_ptrac_events
+
+
+class TailFile(object):
+    """ Line reader of a growing file returning only complete lines """
+
+    def __init__(self, filename, offset=0, poll_interval=0.5,
+                 idle_timeout=None, stop=None, wait=None):
+        """
+        Parameters
+        ----------
+        filename : str
+        offset : int
+            Byte offset to start reading at
+        poll_interval : float
+            Seconds between checks of the file for new lines
+        idle_timeout : float, optional
+            Stop after this many seconds without a new line
+        stop : callable, optional
+            Returns True once the writer has finished, for example
+            lambda: process.done for an McnpProcess, the remaining lines are
+            still read
+        wait : callable, optional
+            Called with poll_interval to wait for the file to change,
+            defaults to time.sleep
+        """
+        self.filename = filename
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.stop = stop
+        self.wait = wait or time.sleep
+        self.stopped = False
+        self.truncated = False
+
+        self._file = open(filename, 'r')
+        self._file.seek(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset):
+        self._file.seek(offset)
+
+    def close(self):
+        self._file.close()
+
+    def _is_stopping(self, idle_since):
+        if self.stop is not None and self.stop():
+            return True
+        return self.idle_timeout is not None and \
+            time.time() - idle_since > self.idle_timeout
+
+    def readline(self):
+        """ Next complete line, waiting for it to be written
+
+        Returns
+        -------
+        line : str
+            Ends with a newline, empty once stopped at the end of the file or
+            at a partial last line, which sets truncated
+        """
+        if self.stopped:
+            return self._remaining_line()
+
+        idle_since = time.time()
+        while True:
+            position = self._file.tell()
+            line = self._file.readline()
+            if line.endswith('\n'):
+                return line
+
+            # seeking back also clears the end of file state of the handle
+            self._file.seek(position)
+            if self._is_stopping(idle_since):
+                # lines written before the writer finished are still read
+                self.stopped = True
+                return self._remaining_line()
+
+            self.wait(self.poll_interval)
+
+    def _remaining_line(self):
+        line = self._file.readline()
+        if not line.endswith('\n'):
+            # a partial line, such as '  900' of 9000, parses as another value
+            self.truncated = True
+            return ''
+        return line
+
+
+def follow_ptrac_events(tail_file, event_format, event_filter=None,
+                        counter=None):
+    """ Parse histories of a TailFile as they are completed
+
+    A history cut short by the writer stopping is dropped.
+
+    Parameters
+    ----------
+    tail_file : TailFile
+        Positioned at the start of a history
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+    counter : mcnpy.stats.CountingFile, optional
+        Wrapping tail_file, the lines are read through it
+
+    Yields
+    ------
+    history : PtracHistory
+    """
+    histories = parse_ptrac_events(counter or tail_file, event_format,
+                                   event_filter)
+    try:
+        while True:
+            try:
+                history = next(histories)
+            except StopIteration:
+                return
+            except (IndexError, ValueError):
+                if tail_file.stopped:
+                    return
+                raise
+            if tail_file.truncated:
+                # the end of the file was reached within the history
+                return
+            yield history
+    finally:
+        (counter or tail_file).close()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Index of the history byte offsets of PTRAC files for random access
+
+Notes:
+The index is built in one pass over the events and can be persisted next to
+the PTRAC file as '<filename>.idx.npz'. A persisted index stores the size
+and modification time of its PTRAC file and is ignored once they change.
+"""
+import os
+
+import numpy as np
+
+from mcnpy.utils import source_signature
+from reader import EVENT_KINDS, event_kind
+from binary import int_dtype
+
+
+def index_filename(filename):
+    """ Default filename of the persisted index of a PTRAC file """
+    return filename + '.idx.npz'
+
+
+class PtracIndex(object):
+    """ Byte offset and event count of every history in a PTRAC file """
+
+    def __init__(self, nps, offsets, n_events):
+        self.nps = np.asarray(nps, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_events = np.asarray(n_events, dtype=np.int64)
+        self.__sorter = None
+
+    def __len__(self):
+        return len(self.nps)
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  histories: %d' % len(self)
+        printstr += '\n  events: %d' % self.n_events.sum()
+
+        return printstr
+
+    def locate(self, nps):
+        """ Position of the history with source particle number nps
+
+        Raises
+        ------
+        KeyError
+            If no history of the file has this nps
+        """
+        if self.__sorter is None:
+            self.__sorter = np.argsort(self.nps, kind='mergesort')
+        i = np.searchsorted(self.nps, nps, sorter=self.__sorter)
+        if i == len(self.nps) or self.nps[self.__sorter[i]] != nps:
+            raise KeyError('nps %d is not in the ptrac file' % nps)
+
+        return int(self.__sorter[i])
+
+    def save(self, filename, source):
+        """ Persist the index with the signature of its PTRAC file
+
+        Parameters
+        ----------
+        filename : str
+            Index file, should end with '.npz'
+        source : str
+            Filename of the indexed PTRAC file
+        """
+        np.savez(filename, nps=self.nps, offsets=self.offsets,
+                 n_events=self.n_events, signature=source_signature(source))
+
+    @classmethod
+    def load(cls, filename, source):
+        """ Load a persisted index, None if missing or out of date """
+        if not os.path.exists(filename):
+            return None
+
+        with np.load(filename) as data:
+            if not np.array_equal(data['signature'],
+                                  source_signature(source)):
+                return None
+            return cls(data['nps'], data['offsets'], data['n_events'])
+
+
+def index_ptrac_events(ptrac_file, event_format):
+    """ Index the histories of an ASCII PTRAC file
+
+    Parameters
+    ----------
+    ptrac_file : file
+        Positioned at the first NPS line
+    event_format : PtracEventFormat
+
+    Returns
+    -------
+    index : PtracIndex
+    """
+    nps_pos = event_format.id_nps.index(1)
+    type_pos = event_format.id_nps.index(2)
+    next_pos = dict((k, event_format.ids(k).index(7)) for k in EVENT_KINDS)
+
+    nps, offsets, n_events = [], [], []
+    while True:
+        offset = ptrac_file.tell()
+        nps_data = ptrac_file.readline().split()
+        if len(nps_data) == 0:
+            break
+
+        next_event_type = int(nps_data[type_pos])
+        count = 0
+        while next_event_type != 9000:
+            event_data = ptrac_file.readline().split()
+            ptrac_file.readline()
+            next_event_type = int(event_data[next_pos[
+                event_kind(next_event_type)]])
+            count += 1
+
+        nps.append(int(nps_data[nps_pos]))
+        offsets.append(offset)
+        n_events.append(count)
+
+    return PtracIndex(nps, offsets, n_events)
+
+
+def index_binary_events(records, event_format):
+    """ Index the histories of a binary PTRAC file, see index_ptrac_events
+
+    Parameters
+    ----------
+    records : FortranRecordFile
+        Positioned at the first NPS record
+    event_format : PtracEventFormat
+
+    Returns
+    -------
+    index : PtracIndex
+    """
+    dtype = int_dtype(event_format)
+    int_fmt = '<q' if dtype.itemsize == 8 else '<i'
+    nps_pos = event_format.id_nps.index(1) * dtype.itemsize
+    type_pos = event_format.id_nps.index(2) * dtype.itemsize
+    next_pos = dict((k, event_format.ids(k).index(7) * dtype.itemsize)
+                    for k in EVENT_KINDS)
+
+    nps, offsets, n_events = [], [], []
+    while True:
+        offset = records.tell()
+        record = records.next_record()
+        if record is None:
+            break
+
+        next_event_type = records.unpack(int_fmt, record[0] + type_pos)[0]
+        count = 0
+        while next_event_type != 9000:
+            int_start = records.next_record()[0]
+            records.next_record()
+            next_event_type = records.unpack(int_fmt, int_start + next_pos[
+                event_kind(next_event_type)])[0]
+            count += 1
+
+        nps.append(records.unpack(int_fmt, record[0] + nps_pos)[0])
+        offsets.append(offset)
+        n_events.append(count)
+
+    return PtracIndex(nps, offsets, n_events)
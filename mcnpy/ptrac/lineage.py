@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Particle lineage of PTRAC histories as parent-index arrays
+
+Notes:
+Every track starts with a source (1000) or bank (2000+L) event and ends
+with a termination event, whose nbranch numbers the tracks of a history.
+Bank events are written when the banked particle is started, after its
+parent track has ended, at the position where it was created. The parent
+of a banked track is the track holding the latest preceding source,
+surface or collision event of the same history at that position, such as
+the surface of a weight window split or the (n,Xn) or fission collision
+that created it. Banked tracks without such an event are attached to the
+source track of their history.
+
+Tracks are numbered in file order over the whole file. Parents always
+precede their children, and lineage queries walk the parent arrays by
+pointer jumping, taking log2 of the tree depth passes over all tracks.
+"""
+import numpy as np
+
+from tally import merge_events
+
+
+def _accumulate(parent, values, combine):
+    """ Combine values over the ancestors of every track
+
+    Parameters
+    ----------
+    parent : ndarray
+        Parent track of each track, -1 for roots
+    values : ndarray
+        Value of the edge from each track to its parent
+    combine : ufunc
+        Associative combination, such as np.add or np.logical_or
+
+    Returns
+    -------
+    values : ndarray
+        Combination of the edge values from each track to its root
+    """
+    values = values.copy()
+    jump = parent.copy()
+    active = np.flatnonzero(jump >= 0)
+    while len(active):
+        targets = jump[active]
+        values[active] = combine(values[active], values[targets])
+        jump[active] = jump[targets]
+        active = active[jump[active] >= 0]
+
+    return values
+
+
+class LineageTree(object):
+    """ Tracks of PTRAC histories linked to the tracks that created them
+
+    Attributes
+    ----------
+    event_track : ndarray
+        Track of every event in file order
+    track_start, track_end : ndarray
+        Position in file order of the first and last event of each track
+    track_nps, track_type : ndarray
+        History and type of the starting event of each track
+    branch : ndarray
+        nbranch of the termination event ending each track, -1 without
+    parent_event : ndarray
+        Position of the event creating each banked track, -1 for source
+        tracks and banked tracks without a matching event
+    parent : ndarray
+        Parent track of each track, -1 for source tracks
+    history_offsets : ndarray
+        First track of each history, followed by the number of tracks
+    """
+
+    def __init__(self, arrays):
+        """
+        Parameters
+        ----------
+        arrays : dict
+            Whole histories, see parse_ptrac_columnar, parse_parallel
+        """
+        self.arrays = arrays
+        names = ['nps', 'index', 'type', 'xxx', 'yyy', 'zzz']
+        events = merge_events(arrays, names)
+        self.index = events['index']
+        self.n_events = len(self.index)
+        types = events['type'].astype(np.int64)
+        kinds = np.abs(types) // 1000
+
+        starts = np.flatnonzero((kinds == 1) | (kinds == 2))
+        is_start = np.zeros(self.n_events, dtype=bool)
+        is_start[starts] = True
+        self.event_track = np.cumsum(is_start) - 1
+        self.track_start = starts
+        self.track_end = np.append(starts[1:], self.n_events) - 1
+        self.track_nps = events['nps'][starts].astype(np.int64)
+        self.track_type = types[starts]
+
+        self.branch = -np.ones(len(starts), dtype=np.int64)
+        ter = arrays.get('ter')
+        if ter is not None and 'nbranch' in ter.dtype.names:
+            positions = self.positions('ter')
+            self.branch[self.event_track[positions]] = ter['nbranch']
+
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = self.track_nps[1:] != self.track_nps[:-1]
+        self.history_offsets = np.append(np.flatnonzero(first), len(starts))
+        self.history_nps = self.track_nps[first]
+
+        points = np.column_stack([events['nps'].astype(np.float64)] +
+                                 [events[n].astype(np.float64)
+                                  for n in ('xxx', 'yyy', 'zzz')])
+        self.parent_event = -np.ones(len(starts), dtype=np.int64)
+        self.parent = -np.ones(len(starts), dtype=np.int64)
+        self._link_banks(points, kinds)
+        self.depth = _accumulate(self.parent,
+                                 (self.parent >= 0).astype(np.int64), np.add)
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  histories: %d' % len(self.history_nps)
+        printstr += '\n  tracks: %d' % len(self.track_start)
+        printstr += '\n  banked: %d' % (self.parent >= 0).sum()
+        printstr += '\n  max depth: %d' % (self.depth.max()
+                                           if len(self.depth) else 0)
+
+        return printstr
+
+    def _link_banks(self, points, kinds):
+        """ Set the parents of banked tracks, see module notes """
+        banks = np.flatnonzero(kinds[self.track_start] == 2)
+        candidates = np.flatnonzero((kinds == 1) | (kinds == 3) |
+                                    (kinds == 4))
+        bank_events = self.track_start[banks]
+
+        # same history and position share a group, searched by event order
+        keys = np.concatenate((points[candidates], points[bank_events]))
+        if len(keys):
+            groups = np.unique(keys, axis=0, return_inverse=True)[1]
+        else:
+            groups = np.zeros(0, dtype=np.int64)
+        stride = self.n_events + 1
+        ordered = np.sort(groups[:len(candidates)] * stride + candidates)
+        queries = groups[len(candidates):] * stride + bank_events
+        found = np.searchsorted(ordered, queries) - 1
+        matched = found >= 0
+        matched[matched] = ordered[found[matched]] // stride == \
+            queries[matched] // stride
+
+        parent_event = ordered[found[matched]] % stride
+        self.parent_event[banks[matched]] = parent_event
+        self.parent[banks[matched]] = self.event_track[parent_event]
+
+        history = np.repeat(np.arange(len(self.history_nps)),
+                            np.diff(self.history_offsets))
+        source = self.history_offsets[history]
+        orphans = banks[~matched]
+        orphans = orphans[source[orphans] != orphans]
+        self.parent[orphans] = source[orphans]
+
+    @property
+    def local_parent(self):
+        """ Parent of each track as an index into the tracks of its history """
+        history = np.repeat(np.arange(len(self.history_nps)),
+                            np.diff(self.history_offsets))
+        local = self.parent - self.history_offsets[history]
+        local[self.parent < 0] = -1
+        return local
+
+    def history_tracks(self, nps):
+        """ Slice of the tracks of a history """
+        i = np.flatnonzero(self.history_nps == nps)
+        if not len(i):
+            raise KeyError('history %d not in tree' % nps)
+        return slice(self.history_offsets[i[0]],
+                     self.history_offsets[i[0] + 1])
+
+    def positions(self, kind):
+        """ Position in file order of the events in arrays[kind] """
+        return np.searchsorted(self.index, self.arrays[kind]['index'])
+
+    def event_mask(self, kind, predicate=None):
+        """ Mask of events in file order of a kind matching a predicate
+
+        Parameters
+        ----------
+        kind : str
+            One of EVENT_KINDS
+        predicate : callable, optional
+            Called with arrays[kind], returning a boolean mask
+
+        Returns
+        -------
+        mask : ndarray
+        """
+        positions = self.positions(kind)
+        if predicate is not None:
+            positions = positions[predicate(self.arrays[kind])]
+        mask = np.zeros(self.n_events, dtype=bool)
+        mask[positions] = True
+        return mask
+
+    def created_by(self, kind, predicate=None):
+        """ Mask of the tracks banked by events matching a predicate
+
+        Examples
+        --------
+        Secondaries of (n,2n) collisions
+
+        >>> tree.created_by('col', lambda col: col['ntyn'] == 16)
+        """
+        events = self.event_mask(kind, predicate)
+        created = self.parent_event >= 0
+        created[created] = events[self.parent_event[created]]
+        return created
+
+    def descendants(self, tracks):
+        """ Mask of the tracks descending from tracks, excluding them
+
+        Parameters
+        ----------
+        tracks : ndarray
+            Boolean mask or indices of tracks
+        """
+        mask = np.zeros(len(self.parent), dtype=bool)
+        mask[tracks] = True
+        has_parent = self.parent >= 0
+        edges = np.zeros(len(self.parent), dtype=bool)
+        edges[has_parent] = mask[self.parent[has_parent]]
+        return _accumulate(self.parent, edges, np.logical_or)
+
+    def descendants_of(self, kind, predicate=None):
+        """ Mask of the tracks created by matching events, at any depth """
+        created = self.created_by(kind, predicate)
+        return created | self.descendants(created)
+
+    def track_events(self, tracks, kind):
+        """ Mask of arrays[kind] of the events of tracks
+
+        Parameters
+        ----------
+        tracks : ndarray
+            Boolean mask or indices of tracks
+        kind : str
+            One of EVENT_KINDS
+        """
+        mask = np.zeros(len(self.parent), dtype=bool)
+        mask[tracks] = True
+        return mask[self.event_track[self.positions(kind)]]
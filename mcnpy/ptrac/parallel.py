@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-process PTRAC parsing split on history boundaries
+
+Notes:
+Histories are independent, so the event section is cut into byte ranges
+that each start on an NPS line and are parsed in a process pool. ASCII
+ranges are moved onto NPS lines by scanning the text, binary ranges (and
+ASCII files with an index) are cut at the offsets of the history index.
+"""
+import os
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from reader import (EVENT_KINDS, parse_binary_columnar, parse_binary_events,
+                    parse_ptrac_columnar, parse_ptrac_events)
+from binary import FortranRecordFile
+
+
+class ChunkFile(object):
+    """ Read lines of a byte range of a file, as if the range was the file """
+
+    def __init__(self, filename, start, end):
+        self.__file = open(filename, 'r')
+        self.__file.seek(start)
+        self.end = end
+
+    def tell(self):
+        return self.__file.tell()
+
+    def readline(self):
+        if self.__file.tell() >= self.end:
+            return ''
+        return self.__file.readline()
+
+    def read(self, size=-1):
+        remaining = max(self.end - self.__file.tell(), 0)
+        if size < 0 or size > remaining:
+            size = remaining
+        return self.__file.read(size)
+
+    def close(self):
+        self.__file.close()
+
+
+def is_nps_line(line, event_format):
+    """ Check if a non-float line has the fixed number of NPS variables """
+    return '.' not in line and len(line.split()) == event_format.n_nps
+
+
+def find_history_start(ptrac_file, offset, event_format):
+    """ Find the first NPS line at or after a byte offset
+
+    An NPS line is the only integer line that is followed by another
+    integer line, event integer lines are always followed by a float line.
+
+    Parameters
+    ----------
+    ptrac_file : file
+    offset : int
+        Byte offset into the event section
+    event_format : PtracEventFormat
+
+    Returns
+    -------
+    offset : int
+        Byte offset of the NPS line, or end of file if there is none
+    """
+    if offset > 0:
+        ptrac_file.seek(offset - 1)
+        if ptrac_file.read(1) != '\n':
+            ptrac_file.readline()
+    else:
+        ptrac_file.seek(0)
+
+    candidate = None
+    while True:
+        position = ptrac_file.tell()
+        line = ptrac_file.readline()
+        if not line:
+            return position
+        if candidate is not None and '.' not in line:
+            return candidate
+        candidate = position if is_nps_line(line, event_format) else None
+
+
+def split_events(ptrac, n_chunks):
+    """ Cut the events of a PTRAC file into byte ranges on history starts
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+        Reader with parsed header, an existing history index is used
+    n_chunks : int
+        Number of byte ranges to aim for
+
+    Returns
+    -------
+    ranges : list
+        (start, end) byte offsets, empty ranges are dropped
+    """
+    end = os.path.getsize(ptrac.filename)
+
+    if ptrac.is_binary or ptrac.index is not None:
+        index = ptrac.index if ptrac.index is not None else ptrac.build_index()
+        cumulative = np.cumsum(index.n_events)
+        targets = np.linspace(0, cumulative[-1] if len(index) else 0,
+                              n_chunks + 1)[1:-1]
+        positions = np.searchsorted(cumulative, targets, side='right')
+        starts = [ptrac.events_offset] + \
+                 [int(index.offsets[p]) for p in positions if p < len(index)]
+    else:
+        starts = [ptrac.events_offset]
+        with open(ptrac.filename, 'r') as ptrac_file:
+            for offset in np.linspace(ptrac.events_offset, end,
+                                      n_chunks + 1)[1:-1]:
+                starts.append(find_history_start(ptrac_file, int(offset),
+                                                 ptrac.event_format))
+
+    starts = sorted(set(starts))
+    ranges = zip(starts, starts[1:] + [end])
+
+    return [(start, stop) for start, stop in ranges if start < stop]
+
+
+def _open_chunk(filename, is_binary, start, end):
+    if is_binary:
+        records = FortranRecordFile(filename, end)
+        records.seek(start)
+        return records
+    return ChunkFile(filename, start, end)
+
+
+def _parse_chunk_arrays(args):
+    filename, is_binary, start, end, event_format = args
+    chunk = _open_chunk(filename, is_binary, start, end)
+    try:
+        if is_binary:
+            return parse_binary_columnar(chunk, event_format)
+        return parse_ptrac_columnar(chunk, event_format)
+    finally:
+        chunk.close()
+
+
+def _parse_chunk_histories(args):
+    filename, is_binary, start, end, event_format = args
+    chunk = _open_chunk(filename, is_binary, start, end)
+    try:
+        if is_binary:
+            return list(parse_binary_events(chunk, event_format))
+        return list(parse_ptrac_events(chunk, event_format))
+    finally:
+        chunk.close()
+
+
+def merge_arrays(chunks):
+    """ Concatenate columnar arrays of consecutive chunks of a file
+
+    The 'index' columns of each chunk count from zero, they are shifted by
+    the number of events in the preceding chunks.
+
+    Parameters
+    ----------
+    chunks : list
+        Dicts of record arrays in file order, see parse_ptrac_columnar
+
+    Returns
+    -------
+    arrays : dict
+    """
+    shift = 0
+    shifted = []
+    for arrays in chunks:
+        arrays = dict((k, v.copy()) for k, v in arrays.items())
+        n_events = int(arrays['nps']['n_events'].sum())
+        for array in arrays.values():
+            array['index'] += shift
+        shift += n_events
+        shifted.append(arrays)
+
+    return dict((k, np.concatenate([arrays[k] for arrays in shifted]))
+                for k in ('nps',) + EVENT_KINDS)
+
+
+def parse_ptrac_parallel(ptrac, workers=None, histories=False,
+                         n_chunks=None):
+    """ Parse the events of a PTRAC file in a process pool
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+        Reader with parsed header
+    workers : int, optional
+        Number of processes, defaults to the CPU count
+    histories : bool
+        Yield PtracHistory objects in file order instead of returning arrays
+    n_chunks : int, optional
+        Number of byte ranges, defaults to four per worker
+
+    Returns
+    -------
+    arrays : dict or generator
+        Merged columnar arrays, see parse_ptrac_columnar, or a generator of
+        PtracHistory if histories is set
+    """
+    workers = workers or cpu_count()
+    ranges = split_events(ptrac, n_chunks or 4 * workers)
+    tasks = [(ptrac.filename, ptrac.is_binary, start, end, ptrac.event_format)
+             for start, end in ranges]
+
+    if histories:
+        return _imap_histories(workers, tasks)
+
+    pool = Pool(workers)
+    try:
+        chunks = pool.map(_parse_chunk_arrays, tasks)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if not chunks:
+        chunks = [_parse_chunk_arrays((ptrac.filename, False, 0, 0,
+                                       ptrac.event_format))]
+    return merge_arrays(chunks)
+
+
+def _imap_histories(workers, tasks):
+    pool = Pool(workers)
+    try:
+        for chunk in pool.imap(_parse_chunk_histories, tasks):
+            for history in chunk:
+                yield history
+    finally:
+        pool.terminate()
+        pool.join()
@@ -5,13 +5,20 @@ Created on Wed Feb 04 12:34:38 2015
 @author: Aaron
 """
 
-import matplotlib.pyplot as plt
 from reader import *
+from tally import merge_events, track_starts
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 from matplotlib.patches import FancyArrowPatch
 from mpl_toolkits.mplot3d import proj3d
 import numpy as np
 
+# marker color by event type // 1000
+EVENT_COLORS = {1: 'blue', 2: 'blue', 3: 'red', 4: 'purple', 5: 'orange'}
+
 
 class Arrow3D(FancyArrowPatch):
     def __init__(self, xs, ys, zs, *args, **kwargs):
@@ -26,9 +33,12 @@ class Arrow3D(FancyArrowPatch):
 
 
 def plot_events(events, ignore_termination=False, ignore_surface=False):
+    # pyplot needs a display backend, plot_arrays can render without it
+    import matplotlib.pyplot as plt
+
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
-    color_dict = {1: 'blue', 2: 'blue', 3: 'red', 4: 'purple', 5: 'orange'}
+    color_dict = EVENT_COLORS
     
     for ev in events:
         if ignore_termination:
@@ -51,6 +61,224 @@ def plot_events(events, ignore_termination=False, ignore_surface=False):
     plt.show()
 
 
+def event_points(arrays, event_types=None):
+    """ Positions of the events of columnar arrays merged in file order
+
+    Parameters
+    ----------
+    arrays : dict
+        See parse_ptrac_columnar
+    event_types : list, optional
+        Event kinds to include, by default all
+
+    Returns
+    -------
+    points : ndarray
+        (n, 3) event positions
+    types : ndarray
+        Event types
+    nps : ndarray
+        Source particle number of each event
+    """
+    events = merge_events(arrays, ['nps', 'type', 'xxx', 'yyy', 'zzz'],
+                          event_types)
+    points = np.column_stack([events[name].astype(np.float64)
+                              for name in ('xxx', 'yyy', 'zzz')])
+    return (points, events['type'].astype(np.int64),
+            events['nps'].astype(np.int64))
+
+
+def track_segments(points, types, nps):
+    """ Straight tracks between consecutive events of one particle
+
+    Tracks are broken after termination events, the following bank event
+    starts a new particle.
+
+    Parameters
+    ----------
+    points, types, nps : ndarray
+        See event_points, including every event of the histories
+
+    Returns
+    -------
+    segments : ndarray
+        (n, 2, 3) start and end positions
+    """
+    joined = track_starts(types, nps)
+    return np.stack([points[:-1][joined], points[1:][joined]], axis=1)
+
+
+def sample_histories(nps, max_events, seed=None):
+    """ Select random whole histories holding at most max_events events
+
+    Returns
+    -------
+    mask : ndarray
+        Boolean mask of the kept events
+    """
+    if len(nps) <= max_events:
+        return np.ones(len(nps), dtype=bool)
+
+    histories, inverse, counts = np.unique(nps, return_inverse=True,
+                                           return_counts=True)
+    order = np.random.RandomState(seed).permutation(len(histories))
+    kept = order[np.cumsum(counts[order]) <= max_events]
+    return np.in1d(inverse, kept)
+
+
+def _voxels(points, lower, width, n_bins):
+    cells = np.floor((points - lower) / width).astype(np.int64)
+    cells = np.clip(cells, 0, n_bins - 1)
+    return (cells[..., 0] * n_bins + cells[..., 1]) * n_bins + cells[..., 2]
+
+
+def bin_events(points, types, segments, max_artists, n_bins=64):
+    """ Merge events and tracks sharing voxels of a regular grid
+
+    The grid is coarsened until at most max_artists markers and segments
+    remain. Each marker or segment stands for all events of one type, or
+    tracks between the same voxels, and is drawn at their voxel centers.
+
+    Parameters
+    ----------
+    points, types : ndarray
+        See event_points
+    segments : ndarray
+        See track_segments
+    max_artists : int
+        Target number of markers and of segments
+    n_bins : int
+        Initial number of voxels along each axis
+
+    Returns
+    -------
+    points, types, counts : ndarray
+        Voxel center, event type and number of events of each marker
+    segments, segment_counts : ndarray
+        Voxel centers and number of tracks of each segment
+    """
+    lower = points.min(axis=0) if len(points) else np.zeros(3)
+    upper = points.max(axis=0) if len(points) else np.ones(3)
+    extent = np.where(upper > lower, upper - lower, 1.)
+
+    while True:
+        width = extent / n_bins
+        voxels = _voxels(points, lower, width, n_bins)
+        keys, first, counts = np.unique(
+            voxels * 10 + np.abs(types) // 1000, return_index=True,
+            return_counts=True)
+
+        ends = _voxels(segments, lower, width, n_bins)
+        pairs, segment_first, segment_counts = np.unique(
+            ends[:, 0] * n_bins ** 3 + ends[:, 1], return_index=True,
+            return_counts=True)
+
+        if n_bins == 1 or max(len(keys), len(pairs)) <= max_artists:
+            break
+        n_bins //= 2
+
+    def center(positions):
+        cells = np.clip(np.floor((positions - lower) / width), 0, n_bins - 1)
+        return lower + (cells + 0.5) * width
+
+    return (center(points[first]), types[first], counts,
+            center(segments[segment_first]), segment_counts)
+
+
+def plot_arrays(arrays, event_types=None, max_artists=100000,
+                thinning='sample', n_bins=64, tracks=True,
+                track_color='red', ax=None, filename=None, dpi=150,
+                seed=None):
+    """ Plot the events and tracks of columnar arrays with batched artists
+
+    All markers are drawn by one scatter call and all tracks by one
+    Line3DCollection, colored by event type. Dense data is thinned to
+    max_artists markers and segments. With a filename the figure is
+    rendered off screen by the Agg backend, without needing a display.
+
+    Parameters
+    ----------
+    arrays : dict
+        See parse_ptrac_columnar
+    event_types : list, optional
+        Event kinds to mark, by default all, tracks always join every event
+    max_artists : int
+        Target number of markers and of track segments
+    thinning : str
+        'sample' keeps random whole histories, 'bin' merges events in
+        voxels, see bin_events
+    n_bins : int
+        Initial voxels per axis of 'bin' thinning
+    tracks : bool
+        Draw the tracks between consecutive events of each particle
+    track_color : str
+    ax : Axes3D, optional
+        Axes to draw in, by default a new figure
+    filename : str, optional
+        Save the figure as an image
+    dpi : int
+        Resolution of the saved image
+    seed : int, optional
+        Random seed of 'sample' thinning
+
+    Returns
+    -------
+    ax : Axes3D
+    """
+    if thinning not in ('sample', 'bin'):
+        raise ValueError("thinning must be 'sample' or 'bin'")
+
+    points, types, nps = event_points(arrays)
+    if thinning == 'sample':
+        kept = sample_histories(nps, max_artists, seed)
+        points, types, nps = points[kept], types[kept], nps[kept]
+    segments = track_segments(points, types, nps) if tracks \
+        else np.zeros((0, 2, 3))
+
+    if event_types is not None:
+        marked = np.in1d(np.abs(types) // 1000, [EVENT_KINDS.index(k) + 1
+                                                 for k in event_types])
+        marked_points, marked_types = points[marked], types[marked]
+    else:
+        marked_points, marked_types = points, types
+
+    sizes = np.full(len(marked_points), 20.)
+    widths = np.ones(len(segments))
+    if thinning == 'bin':
+        (marked_points, marked_types, counts, segments,
+         segment_counts) = bin_events(marked_points, marked_types, segments,
+                                      max_artists, n_bins)
+        sizes = 20. * np.sqrt(counts)
+        widths = np.log2(1 + segment_counts)
+
+    if ax is None:
+        if filename is not None:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+        else:
+            import matplotlib.pyplot as plt
+            fig = plt.figure()
+        ax = fig.add_subplot(111, projection='3d')
+
+    if len(segments):
+        ax.add_collection3d(Line3DCollection(
+            segments, colors=track_color, linewidths=widths, alpha=0.4))
+    colors = to_rgba_array([EVENT_COLORS[abs(t) // 1000]
+                            for t in marked_types]) \
+        if len(marked_types) else np.zeros((0, 4))
+    ax.scatter(marked_points[:, 0], marked_points[:, 1], marked_points[:, 2],
+               c=colors, s=sizes, alpha=0.4, depthshade=False)
+
+    if len(points):
+        ax.auto_scale_xyz(points[:, 0], points[:, 1], points[:, 2])
+    ax.set_xlabel('X (cm)')
+    ax.set_ylabel('Y (cm)')
+    ax.set_zlabel('Z (cm)')
+
+    if filename is not None:
+        ax.figure.savefig(filename, dpi=dpi)
+    return ax
+
 if __name__ == '__main__':
     with open('example/ptrac', 'r') as ptrac:
         header = PtracHeader(ptrac)
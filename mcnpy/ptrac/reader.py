@@ -9,6 +9,219 @@ nbranch only seems to appear on termination event
 in n,Xn reactions bank events are created
 """
 from datetime import datetime
+import numpy as np
+
+from binary import (FortranRecordFile, binary_format_lines, int_dtype,
+                    is_binary_ptrac)
+
+
+EVENT_KINDS = ('src', 'bnk', 'sur', 'col', 'ter')
+
+# PTRAC variable names ordered by variable id, None marks the event type ids
+PTRAC_VARIABLES = ['nps', None, 'ncl', 'nsf', 'jptal', 'tal', None, 'node',
+                   'nsr', 'nxs', 'ntyn', 'nsf', 'angsrf', 'nter', 'nbranch',
+                   'ipt', 'ncl', 'mat', 'ncp', 'xxx', 'yyy', 'zzz', 'uuu',
+                   'vvv', 'www', 'erg', 'wgt', 'tme']
+
+
+def event_kind(event_type):
+    """ Convert PTRAC event type to event kind
+
+    Parameters
+    ----------
+    event_type : int
+        Event type, 1000 (src), 2000+L (bnk), 3000 (sur), 4000 (col)
+        or 5000 (ter)
+
+    Returns
+    -------
+    kind : str
+        One of EVENT_KINDS
+    """
+    i = abs(int(event_type)) // 1000 - 1
+    if i < 0 or i >= len(EVENT_KINDS):
+        raise ValueError('unknown ptrac event type %s' % event_type)
+
+    return EVENT_KINDS[i]
+
+
+class PtracFilter(object):
+    """ Selection of PTRAC events and histories applied while parsing
+
+    Events are checked against their raw record before any event object or
+    array row is created. A filtered variable that is not written for an
+    event kind rejects all events of that kind, except 'ipt' which then
+    falls back to the single transported particle type of the event format.
+
+    Parameters
+    ----------
+    event_types : list, optional
+        Event kinds ('src', 'bnk', 'sur', 'col', 'ter') and/or event types
+        (e.g. 4000, 2007) to keep
+    ncl : int or list, optional
+        Cell numbers to keep
+    mat : int or list, optional
+        Material numbers to keep
+    ipt : int or list, optional
+        Particle types to keep
+    erg : tuple, optional
+        (min, max) energy range to keep, either bound can be None
+    nps : tuple, optional
+        (min, max) source particle numbers to keep, either bound can be None
+    skip_empty : bool
+        Drop histories without any kept events
+    """
+
+    def __init__(self, event_types=None, ncl=None, mat=None, ipt=None,
+                 erg=None, nps=None, skip_empty=False):
+        self.kinds = None
+        self.types = None
+        if event_types is not None:
+            self.kinds = set(t for t in event_types if t in EVENT_KINDS)
+            self.types = set(int(t) for t in event_types
+                             if t not in EVENT_KINDS)
+        self.values = {}
+        for name, value in (('ncl', ncl), ('mat', mat), ('ipt', ipt)):
+            if value is not None:
+                self.values[name] = set(np.atleast_1d(value).tolist())
+        self.erg = erg
+        self.nps = nps
+        self.skip_empty = skip_empty
+        self.__checks = None
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        for item in sorted(vars(self).items()):
+            if not item[0].startswith('_'):
+                printstr += '\n  %s: %s' % item
+
+        return printstr
+
+    @staticmethod
+    def _in_range(value, bounds):
+        """ Check value (scalar or array) against (min, max) bounds """
+        if bounds is None:
+            return True
+        low, high = bounds
+        return (low is None or value >= low) & (high is None or value <= high)
+
+    def accepts_nps(self, nps):
+        """ Check if the history of a source particle number is kept """
+        return self._in_range(nps, self.nps)
+
+    def accepts_type(self, event_type):
+        """ Check if events of an event type are kept """
+        if self.kinds is None:
+            return True
+        return event_kind(event_type) in self.kinds or \
+            event_type in self.types
+
+    def bind(self, event_format):
+        """ Locate the filtered variables in the records of an event format
+
+        Must be called before accepts_record.
+        """
+        self.__checks = {}
+        for kind in EVENT_KINDS:
+            positions = dict((name, position) for name, position, _ in
+                             event_format.fields(kind))
+            checks = []
+            for name, allowed in self.values.items():
+                if name in positions:
+                    checks.append((positions[name], allowed))
+                elif name != 'ipt' or \
+                        event_format.ipt_single_transport not in allowed:
+                    checks = None
+                    break
+            if checks is not None and self.erg is not None:
+                if 'erg' in positions:
+                    checks.append((positions['erg'], None))
+                else:
+                    checks = None
+            self.__checks[kind] = checks
+
+        return self
+
+    def accepts_record(self, kind, event_type, event_data):
+        """ Check if an event is kept from its raw values
+
+        Parameters
+        ----------
+        kind : str
+            Event kind of event_type
+        event_type : int
+        event_data : list
+            Values (or value strings) of the integer line followed by the
+            float line of the event
+        """
+        if not self.accepts_type(event_type):
+            return False
+
+        checks = self.__checks[kind]
+        if checks is None:
+            return False
+        for position, allowed in checks:
+            if allowed is None:
+                if not self._in_range(float(event_data[position]), self.erg):
+                    return False
+            elif int(float(event_data[position])) not in allowed:
+                return False
+
+        return True
+
+    def mask(self, kind, array, event_format):
+        """ Vectorized selection of the rows of a columnar event array
+
+        Parameters
+        ----------
+        kind : str
+            Event kind of the array
+        array : ndarray
+            Record array, see parse_ptrac_columnar
+        event_format : PtracEventFormat
+
+        Returns
+        -------
+        mask : ndarray
+            Boolean mask of the kept rows
+        """
+        mask = np.ones(len(array), dtype=bool)
+        if self.kinds is not None and kind not in self.kinds:
+            mask = np.in1d(array['type'], list(self.types))
+
+        for name, allowed in self.values.items():
+            if name in array.dtype.names:
+                mask &= np.in1d(array[name], list(allowed))
+            elif name != 'ipt' or \
+                    event_format.ipt_single_transport not in allowed:
+                mask[:] = False
+        if self.erg is not None:
+            if 'erg' in array.dtype.names:
+                mask &= self._in_range(array['erg'], self.erg)
+            else:
+                mask[:] = False
+        mask &= self._in_range(array['nps'], self.nps)
+
+        return mask
+
+    def apply(self, arrays, event_format):
+        """ Select the rows of columnar arrays, see parse_ptrac_columnar """
+        filtered = dict((kind, arrays[kind][self.mask(kind, arrays[kind],
+                                                     event_format)])
+                        for kind in EVENT_KINDS)
+        return self.apply_nps(filtered, arrays['nps'])
+
+    def apply_nps(self, arrays, nps_array):
+        """ Add the selected histories of an NPS array to filtered arrays """
+        arrays = dict(arrays)
+        mask = np.ones(len(nps_array), dtype=bool)
+        mask &= self._in_range(nps_array['nps'], self.nps)
+        if self.skip_empty:
+            kept = np.concatenate([arrays[k]['nps'] for k in EVENT_KINDS])
+            mask &= np.in1d(nps_array['nps'], kept)
+        arrays['nps'] = nps_array[mask]
+
+        return arrays
 
 
 class PtracHeader(object):
@@ -71,13 +284,23 @@ class PtracInputFormat(object):
 
 
 class PtracHistory(object):
+    """ Events of one source particle history and its NPS line variables """
+
+    __slots__ = ('events', 'nps', 'ncl', 'nsf', 'jptal', 'tal')
     
     def __init__(self):
         self.events = []
+
+    def __getstate__(self):
+        return dict(_set_slots(self))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
     
     def __str__(self):
         printstr = self.__class__.__name__
-        for item in sorted(vars(self).items()):
+        for item in sorted(_set_slots(self)):
             if item[0] == 'events':
                 printstr += '\n  %s : [' % item[0]
                 for ev in item[1]:
@@ -90,27 +313,85 @@ class PtracHistory(object):
 
 
 class PtracEvent(object):
+    """ PTRAC event decoded lazily from its raw record
+
+    The raw record is either the text of the integer and float lines or a
+    sequence of values, and is decoded into float attributes named by
+    PTRAC_VARIABLES the first time any of them is read.
+
+    Parameters
+    ----------
+    event_type : int, optional
+    fields : list, optional
+        (name, position, ...) of the variables in the raw record, see
+        PtracEventFormat.fields
+    raw : str or sequence, optional
+    """
+
+    __slots__ = ('type', '_fields', '_raw') + tuple(
+        sorted(set(PTRAC_VARIABLES[6:]) - set([None])))
     
     __ntyn_rxn = {}
     
-    def __init__(self):
-        pass
+    def __init__(self, event_type=None, fields=None, raw=None):
+        if event_type is not None:
+            self.type = event_type
+        self._fields = fields
+        self._raw = raw
+
+    def __getattr__(self, name):
+        # only called for unset slots, decode them if the record has them
+        if name.startswith('_') or self._raw is None:
+            raise AttributeError(name)
+        self._decode()
+
+        return object.__getattribute__(self, name)
+
+    def _decode(self):
+        raw, self._raw = self._raw, None
+        if isinstance(raw, basestring):
+            raw = raw.split()
+        for field in self._fields:
+            setattr(self, field[0], float(raw[field[1]]))
+
+    def __getstate__(self):
+        return dict(_set_slots(self))
+
+    def __setstate__(self, state):
+        self._raw = None
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __str__(self):
         printstr = self.__class__.__name__
-        for item in sorted(vars(self).items()):
+        for item in sorted(_set_slots(self)):
             printstr += '\n  %s: %s' % item
         
         return printstr
 
 
-def parse_ptrac_events(ptrac_file, event_format):
+def _set_slots(obj):
+    """ (name, value) of the public slots set on an object, like vars """
+    if getattr(obj, '_raw', None) is not None:
+        obj._decode()
+
+    items = []
+    for name in obj.__slots__:
+        if not name.startswith('_') and hasattr(obj, name):
+            items.append((name, getattr(obj, name)))
+
+    return items
+
+
+def parse_ptrac_events(ptrac_file, event_format, event_filter=None):
     """ Read and parse PTRAC events corresponding to the read format.
 
     Parameters
     ----------
     ptrac_file : file
     event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+        Events and histories to keep, rejected events are never created
 
     Yields
     ------
@@ -160,13 +441,13 @@ def parse_ptrac_events(ptrac_file, event_format):
     5000   = TERMINATION
     """
 
-    format_ = ['nps', None, 'ncl', 'nsf', 'jptal', 'tal', None, 'node', 'nsr',
-               'nxs', 'ntyn', 'nsf', 'angsrf', 'nter', 'nbranch', 'ipt', 'ncl',
-               'mat', 'ncp', 'xxx', 'yyy', 'zzz', 'uuu', 'vvv', 'www', 'erg',
-               'wgt', 'tme']
+    format_ = PTRAC_VARIABLES
     
     int_list = lambda l: [int(a) for a in l]
-    float_list = lambda l: [float(a) for a in l]
+    fields = dict((k, event_format.fields(k)) for k in EVENT_KINDS)
+
+    if event_filter is not None:
+        event_filter.bind(event_format)
     
     while True:
         line = ptrac_file.readline().strip()
@@ -176,6 +457,13 @@ def parse_ptrac_events(ptrac_file, event_format):
             return
         
         next_event_type = nps_data[event_format.id_nps.index(2)]
+
+        if event_filter is not None and not event_filter.accepts_nps(
+                nps_data[event_format.id_nps.index(1)]):
+            while next_event_type != 9000:
+                next_event_type = int(ptrac_file.readline().split()[0])
+                ptrac_file.readline()
+            continue
         
         history = PtracHistory()
         for i, nps_var in enumerate(nps_data):
@@ -185,36 +473,287 @@ def parse_ptrac_events(ptrac_file, event_format):
             history.__setattr__(nps_id, nps_var)
         
         while next_event_type != 9000:
-            event_data = float_list(ptrac_file.readline().strip().split()) + \
-                         float_list(ptrac_file.readline().strip().split())
-    
-            event = PtracEvent()
-            (event.type, next_event_type) = (next_event_type, event_data[0])
-    
-            if event.type / 1000 == 1: #src
-                flags = event_format.id_src_ev
-            elif abs(event.type / 1000) == 2: #bnk
-                flags = event_format.id_bnk_ev
-            elif event.type / 1000 == 3: #sur
-                flags = event_format.id_sur_ev
-            elif event.type / 1000 == 4: #col
-                flags = event_format.id_col_ev
-            elif event.type / 1000 == 5: #ter
-                flags = event_format.id_ter_ev
-            else:
-                pass
-            
-            for i, ev_var in enumerate(event_data):
-                ev_id = format_[flags[i]-1]
-                if ev_id is None:
-                    continue
-                event.__setattr__(ev_id, ev_var)
-        
-            history.events.append(event)
+            # events keep the raw lines and decode them on first access
+            raw = ptrac_file.readline() + ptrac_file.readline()
+
+            event_type = next_event_type
+            next_event_type = int(raw.split(None, 1)[0])
+            kind = event_kind(event_type)
+            if event_filter is not None and not \
+                    event_filter.accepts_record(kind, event_type, raw.split()):
+                continue
+
+            history.events.append(PtracEvent(event_type, fields[kind], raw))
+
+        if event_filter is not None and event_filter.skip_empty and \
+                not history.events:
+            continue
         
         yield history
 
 
+def parse_ptrac_columnar(ptrac_file, event_format, event_filter=None):
+    """ Read and parse PTRAC events into one record array per event kind.
+
+    Events are read in large blocks and tokenized with NumPy, see
+    mcnpy.ptrac.tokenizer, falling back to parse_ptrac_lines for text that
+    does not follow the fixed field layout.
+
+    Parameters
+    ----------
+    ptrac_file : file
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+        Events and histories to keep
+
+    Returns
+    -------
+    arrays : dict
+        NumPy record arrays keyed by 'nps' (one record per history) and
+        each of EVENT_KINDS, with dtypes from PtracEventFormat.dtype
+
+    Notes
+    -----
+    Events keep the 'nps' of their history and their 'index' in file order,
+    so the original event sequence can be rebuilt by sorting on 'index'.
+    """
+    from tokenizer import parse_ptrac_blocks
+
+    return parse_ptrac_blocks(ptrac_file, event_format, event_filter)
+
+
+def parse_ptrac_lines(ptrac_file, event_format, event_filter=None):
+    """ Parse PTRAC events line by line into one record array per event kind.
+
+    Parameters
+    ----------
+    ptrac_file : file
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+        Events and histories to keep, rejected events are never stored
+
+    Returns
+    -------
+    arrays : dict
+        NumPy record arrays keyed by 'nps' (one record per history) and
+        each of EVENT_KINDS, with dtypes from PtracEventFormat.dtype
+
+    Notes
+    -----
+    Events keep the 'nps' of their history and their 'index' in file order,
+    so the original event sequence can be rebuilt by sorting on 'index'.
+    """
+    kinds = ('nps',) + EVENT_KINDS
+    fields = dict((k, event_format.fields(k)) for k in kinds)
+    rows = dict((k, []) for k in kinds)
+
+    nps_pos = event_format.id_nps.index(1)
+    type_pos = event_format.id_nps.index(2)
+    next_pos = dict((k, event_format.ids(k).index(7)) for k in EVENT_KINDS)
+
+    if event_filter is not None:
+        event_filter.bind(event_format)
+
+    index = 0
+    while True:
+        nps_data = ptrac_file.readline().split()
+        if len(nps_data) == 0:
+            break
+
+        nps = int(nps_data[nps_pos])
+        next_event_type = int(nps_data[type_pos])
+        first_index = index
+        keep_history = event_filter is None or event_filter.accepts_nps(nps)
+
+        while next_event_type != 9000:
+            event_data = ptrac_file.readline().split()
+            if keep_history:
+                event_data += ptrac_file.readline().split()
+            else:
+                ptrac_file.readline()
+
+            event_type = next_event_type
+            kind = event_kind(event_type)
+            next_event_type = int(event_data[next_pos[kind]])
+            index += 1
+
+            if not keep_history or (event_filter is not None and not
+                                    event_filter.accepts_record(
+                                        kind, event_type, event_data)):
+                continue
+
+            row = [nps, index - 1, event_type]
+            for name, position, dtype in fields[kind]:
+                row.append(dtype(float(event_data[position])))
+            rows[kind].append(tuple(row))
+
+        row = [nps, first_index, index - first_index]
+        for name, position, dtype in fields['nps']:
+            if name != 'nps':
+                row.append(int(nps_data[position]))
+        rows['nps'].append(tuple(row))
+
+    arrays = dict((k, np.array(rows[k], dtype=event_format.dtype(k)))
+                  for k in kinds)
+    if event_filter is not None:
+        arrays = event_filter.apply_nps(arrays, arrays['nps'])
+
+    return arrays
+
+
+def parse_binary_events(records, event_format, event_filter=None):
+    """ Read and parse binary PTRAC events, see parse_ptrac_events
+
+    Parameters
+    ----------
+    records : FortranRecordFile
+        Positioned at the first NPS record
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+
+    Yields
+    ------
+    history : PtracHistory
+    """
+    format_ = PTRAC_VARIABLES
+    dtype = int_dtype(event_format)
+    fields = dict((k, event_format.fields(k)) for k in EVENT_KINDS)
+
+    if event_filter is not None:
+        event_filter.bind(event_format)
+
+    while True:
+        nps_data = records.read_record(dtype)
+        if nps_data is None:
+            return
+        nps_data = nps_data.tolist()
+
+        next_event_type = nps_data[event_format.id_nps.index(2)]
+
+        if event_filter is not None and not event_filter.accepts_nps(
+                nps_data[event_format.id_nps.index(1)]):
+            while next_event_type != 9000:
+                next_event_type = int(records.read_record(dtype)[0])
+                records.next_record()
+            continue
+
+        history = PtracHistory()
+        for i, nps_var in enumerate(nps_data):
+            nps_id = format_[event_format.id_nps[i]-1]
+            if nps_id is None:
+                continue
+            history.__setattr__(nps_id, nps_var)
+
+        while next_event_type != 9000:
+            # values are floats on both lines, as in the ASCII events
+            raw = np.concatenate((records.read_record(dtype),
+                                  records.read_record(np.float64)))
+
+            event_type = next_event_type
+            next_event_type = int(raw[0])
+            kind = event_kind(event_type)
+            if event_filter is not None and not \
+                    event_filter.accepts_record(kind, event_type, raw):
+                continue
+
+            history.events.append(PtracEvent(event_type, fields[kind], raw))
+
+        if event_filter is not None and event_filter.skip_empty and \
+                not history.events:
+            continue
+
+        yield history
+
+
+def parse_binary_columnar(records, event_format, event_filter=None):
+    """ Read binary PTRAC events into record arrays, see parse_ptrac_columnar
+
+    Only the record markers and event types are visited one at a time, the
+    event values are copied out of the memory map per event kind in bulk.
+    Histories outside the filtered nps range are never copied, the other
+    selections are applied to the copied arrays.
+
+    Parameters
+    ----------
+    records : FortranRecordFile
+        Positioned at the first NPS record
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+
+    Returns
+    -------
+    arrays : dict
+    """
+    dtype = int_dtype(event_format)
+    int_fmt = '<q' if dtype.itemsize == 8 else '<i'
+    nps_pos = event_format.id_nps.index(1)
+    type_pos = event_format.id_nps.index(2)
+    next_pos = dict((k, event_format.ids(k).index(7) * dtype.itemsize)
+                    for k in EVENT_KINDS)
+
+    # nps, index, type, integer record offset, float record offset
+    locations = dict((k, []) for k in EVENT_KINDS)
+    nps_rows = []
+    index = 0
+    while True:
+        record = records.next_record()
+        if record is None:
+            break
+        nps_data = records.data[record[0]:sum(record)].view(dtype)
+
+        nps = int(nps_data[nps_pos])
+        next_event_type = int(nps_data[type_pos])
+        first_index = index
+        keep_history = event_filter is None or event_filter.accepts_nps(nps)
+
+        while next_event_type != 9000:
+            int_start = records.next_record()[0]
+            float_start = records.next_record()[0]
+
+            event_type = next_event_type
+            kind = event_kind(event_type)
+            next_event_type = records.unpack(int_fmt,
+                                             int_start + next_pos[kind])[0]
+            if keep_history:
+                locations[kind].append((nps, index, event_type, int_start,
+                                        float_start))
+            index += 1
+
+        nps_rows.append((nps, first_index, index - first_index) +
+                        tuple(nps_data.tolist()))
+
+    arrays = {}
+    nps_array = np.array(nps_rows, dtype=np.int64).reshape(-1, 3 +
+                                                          event_format.n_nps)
+    arrays['nps'] = np.zeros(len(nps_array), dtype=event_format.dtype('nps'))
+    for i, name in enumerate(('nps', 'index', 'n_events')):
+        arrays['nps'][name] = nps_array[:, i]
+    for name, position, _ in event_format.fields('nps'):
+        if name != 'nps':
+            arrays['nps'][name] = nps_array[:, 3 + position]
+
+    for kind in EVENT_KINDS:
+        location = np.array(locations[kind], dtype=np.int64).reshape(-1, 5)
+        n_int = getattr(event_format, 'n_%s_ev_int' % kind)
+        n_float = getattr(event_format, 'n_%s_ev' % kind) - n_int
+        ints = records.gather(location[:, 3], n_int, dtype)
+        floats = records.gather(location[:, 4], n_float, np.float64)
+
+        array = np.zeros(len(location), dtype=event_format.dtype(kind))
+        for i, name in enumerate(('nps', 'index', 'type')):
+            array[name] = location[:, i]
+        for name, position, _ in event_format.fields(kind):
+            if position < n_int:
+                array[name] = ints[:, position]
+            else:
+                array[name] = floats[:, position - n_int]
+        arrays[kind] = array
+
+    if event_filter is not None:
+        arrays = event_filter.apply(arrays, event_format)
+    return arrays
+
+
 class PtracEventFormat(object):
     """ Parser and Python Representation of PTRAC Event Format """
     
@@ -230,6 +769,12 @@ class PtracEventFormat(object):
         self.n_sur_ev = sum(n_ev_data[5:7])
         self.n_col_ev = sum(n_ev_data[7:9])
         self.n_ter_ev = sum(n_ev_data[9:11])
+        # number of variables on the integer line of each event
+        self.n_src_ev_int = n_ev_data[1]
+        self.n_bnk_ev_int = n_ev_data[3]
+        self.n_sur_ev_int = n_ev_data[5]
+        self.n_col_ev_int = n_ev_data[7]
+        self.n_ter_ev_int = n_ev_data[9]
         self.ipt_single_transport = n_ev_data[11]
         self.output_byte_size = n_ev_data[12]
         
@@ -251,6 +796,61 @@ class PtracEventFormat(object):
         self.id_col_ev = int_list(id_ev_data[i:i+self.n_col_ev])
         i += self.n_col_ev
         self.id_ter_ev = int_list(id_ev_data[i:i+self.n_ter_ev])
+
+    def ids(self, kind):
+        """ Variable ids of the NPS line ('nps') or an event kind """
+        if kind == 'nps':
+            return self.id_nps
+        return getattr(self, 'id_%s_ev' % kind)
+
+    def fields(self, kind):
+        """ Named variables of the NPS line ('nps') or an event kind
+
+        Parameters
+        ----------
+        kind : str
+            'nps' or one of EVENT_KINDS
+
+        Returns
+        -------
+        fields : list
+            (name, position, dtype) of each variable in the record, where
+            position indexes the integer line followed by the float line
+        """
+        ids = self.ids(kind)
+        if kind == 'nps':
+            n_int = len(ids)
+        else:
+            n_int = getattr(self, 'n_%s_ev_int' % kind)
+
+        fields = []
+        for position, id_ in enumerate(ids):
+            name = PTRAC_VARIABLES[id_-1]
+            if name is None or name in [f[0] for f in fields]:
+                continue
+            dtype = np.int32 if position < n_int else np.float64
+            fields.append((name, position, dtype))
+
+        return fields
+
+    def dtype(self, kind):
+        """ NumPy record dtype of the NPS line ('nps') or an event kind
+
+        Event records lead with the nps of their history, the index of the
+        event within the file and the event type. NPS records lead with the
+        nps, the index of the first event and the number of events.
+        """
+        if kind == 'nps':
+            descr = [('nps', np.int64), ('index', np.int64),
+                     ('n_events', np.int32)]
+        else:
+            descr = [('nps', np.int64), ('index', np.int64),
+                     ('type', np.int32)]
+        for name, position, dtype in self.fields(kind):
+            if name not in [d[0] for d in descr]:
+                descr.append((name, dtype))
+
+        return np.dtype(descr)
         
     def __str__(self):
         printstr = self.__class__.__name__
@@ -261,13 +861,39 @@ class PtracEventFormat(object):
 
 
 class PtracReader(object):
-    def __init__(self, filename, parse_on_init=True):
-        self.__ptrac_file = open(filename, 'r')
+    """ Reader of ASCII or binary (file=bin) PTRAC files
+
+    The file type is detected from the leading -1 record, binary files are
+    memory-mapped and yield the same histories and arrays as ASCII files.
+
+    With cache enabled, the formats and columnar arrays are written to an
+    on-disk cache on the first full to_arrays or parse_parallel, and loaded
+    from it (memory-mapped) on later opens while the file is unchanged.
+
+    With a mcnpy.stats.ParseStats as stats, the bytes, lines, histories and
+    events parsed and the time of the header, formats and events phases are
+    counted, and its progress callback is called during parses.
+    """
+
+    def __init__(self, filename, parse_on_init=True, cache=False,
+                 cache_dir=None, stats=None):
+        from cache import PtracCache
+
+        self.filename = filename
+        self.stats = stats
+        self.cache = PtracCache.for_file(filename, cache_dir) if cache \
+            else None
+        self.is_binary = is_binary_ptrac(filename)
+        if self.is_binary:
+            self.__ptrac_file = FortranRecordFile(filename)
+        else:
+            self.__ptrac_file = open(filename, 'r')
         self.header = None
         self.input_format = None
         self.event_format = None
+        self.index = None
         self.__is_parsed = False
-        self.__is_parsed = False
+        self.events_offset = None
 
         if parse_on_init:
             self.parse()
@@ -277,19 +903,338 @@ class PtracReader(object):
     #     if self.header
 
     def parse(self):
+        from mcnpy.stats import phase
+
         if self.__is_parsed:
             raise RuntimeError('ptrac header has already been parsed!')
-            
-        self.header = PtracHeader(self.__ptrac_file)
-        self.input_format = PtracInputFormat(self.__ptrac_file)
-        self.event_format = PtracEventFormat(self.__ptrac_file)
+
+        if self.cache is not None and self.cache.is_valid(self.filename):
+            (self.header, self.input_format, self.event_format,
+             self.events_offset) = self.cache.load_formats()
+            self.__ptrac_file.seek(self.events_offset)
+            self.__is_parsed = True
+            return
+
+        counter = self._counter(self.__ptrac_file)
+        if self.is_binary:
+            format_file = binary_format_lines(self.__ptrac_file)
+        else:
+            format_file = counter or self.__ptrac_file
+        with phase(self.stats, 'header'):
+            self.header = PtracHeader(format_file)
+        with phase(self.stats, 'formats'):
+            self.input_format = PtracInputFormat(format_file)
+            self.event_format = PtracEventFormat(format_file)
+        self.events_offset = self.__ptrac_file.tell()
         self.__is_parsed = True
+        if counter is not None:
+            counter.sync()
+
+    def _counter(self, ptrac_file):
+        """ Counter of what is read from a file into stats, None without
+
+        Returns
+        -------
+        counter : mcnpy.stats.CountingFile or PositionCounter
+            CountingFile wrapping ASCII files
+        """
+        from mcnpy.stats import CountingFile, PositionCounter
+
+        if self.stats is None:
+            return None
+        if self.is_binary:
+            return PositionCounter(ptrac_file, self.stats)
+        return CountingFile(ptrac_file, self.stats)
+
+    def _instrument(self, histories, counter=None):
+        """ Count and time histories parsed from a file into stats """
+        from mcnpy.stats import instrument_histories
+
+        if self.stats is None:
+            return histories
+        return instrument_histories(histories, self.stats, event_kind,
+                                    counter)
+
+    def _count_arrays(self, arrays):
+        """ Count the histories and events of columnar arrays into stats """
+        if self.stats is None:
+            return
+        self.stats.count('histories', len(arrays['nps']))
+        for kind in EVENT_KINDS:
+            self.stats.count('events', len(arrays[kind]))
+            self.stats.count('events_' + kind, len(arrays[kind]))
+        self.stats.report(force=True)
+
+    def parse_event(self, event_types=None, ncl=None, mat=None, ipt=None,
+                    erg=None, nps=None, skip_empty=False):
+        """ Parse the remaining events into histories
+
+        The optional selections are applied while decoding, see PtracFilter.
+
+        Parameters
+        ----------
+        event_types : list, optional
+            Event kinds ('src', 'bnk', 'sur', 'col', 'ter') or types to keep
+        ncl, mat, ipt : int or list, optional
+            Cell, material and particle type numbers to keep
+        erg, nps : tuple, optional
+            (min, max) ranges of energy and source particle number to keep
+        skip_empty : bool
+            Drop histories without any kept events
+
+        Returns
+        -------
+        histories : generator
+            See parse_ptrac_events
+        """
+        if not self.__is_parsed:
+            raise RuntimeError('ptrac header has not been parsed!')
+
+        event_filter = self._event_filter(event_types, ncl, mat, ipt, erg,
+                                          nps, skip_empty)
+        counter = self._counter(self.__ptrac_file)
+        if self.is_binary:
+            histories = parse_binary_events(self.__ptrac_file,
+                                            self.event_format, event_filter)
+        else:
+            histories = parse_ptrac_events(counter or self.__ptrac_file,
+                                           self.event_format, event_filter)
+        return self._instrument(histories, counter)
+
+    @staticmethod
+    def _event_filter(event_types, ncl, mat, ipt, erg, nps, skip_empty):
+        if event_types is None and ncl is None and mat is None and \
+                ipt is None and erg is None and nps is None and \
+                not skip_empty:
+            return None
+        return PtracFilter(event_types, ncl, mat, ipt, erg, nps, skip_empty)
+
+    def to_arrays(self, event_types=None, ncl=None, mat=None, ipt=None,
+                  erg=None, nps=None, skip_empty=False):
+        """ Parse the remaining events into columnar record arrays
+
+        Takes the same selections as parse_event. Cached arrays are
+        filtered with vectorized masks, only unfiltered parses are cached.
+
+        Returns
+        -------
+        arrays : dict
+            See parse_ptrac_columnar
+        """
+        from mcnpy.stats import phase
 
-    def parse_event(self):
         if not self.__is_parsed:
             raise RuntimeError('ptrac header has not been parsed!')
 
-        return parse_ptrac_events(self.__ptrac_file, self.event_format)
+        event_filter = self._event_filter(event_types, ncl, mat, ipt, erg,
+                                          nps, skip_empty)
+        is_complete = self.__ptrac_file.tell() == self.events_offset
+        if is_complete and self.cache is not None and \
+                self.cache.is_valid(self.filename):
+            arrays = self.cache.load_arrays()
+            if event_filter is not None:
+                arrays = event_filter.apply(arrays, self.event_format)
+            self._count_arrays(arrays)
+            return arrays
+
+        counter = self._counter(self.__ptrac_file)
+        with phase(self.stats, 'events'):
+            if self.is_binary:
+                arrays = parse_binary_columnar(self.__ptrac_file,
+                                               self.event_format, event_filter)
+            else:
+                arrays = parse_ptrac_columnar(counter or self.__ptrac_file,
+                                              self.event_format, event_filter)
+        if counter is not None:
+            counter.sync()
+        self._count_arrays(arrays)
+
+        if is_complete and self.cache is not None and event_filter is None:
+            self.cache.save(self, arrays)
+        return arrays
+
+    read_columnar = to_arrays
+
+    def parse_parallel(self, workers=None, histories=False):
+        """ Parse all events in a process pool, split on history boundaries
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of processes, defaults to the CPU count
+        histories : bool
+            Return an ordered generator of PtracHistory instead of arrays
+
+        Returns
+        -------
+        arrays : dict or generator
+            See parse_ptrac_columnar and parse_ptrac_events
+        """
+        from mcnpy.stats import phase
+        from parallel import parse_ptrac_parallel
+
+        if not self.__is_parsed:
+            raise RuntimeError('ptrac header has not been parsed!')
+
+        if histories:
+            return parse_ptrac_parallel(self, workers, histories)
+
+        if self.cache is not None and self.cache.is_valid(self.filename):
+            arrays = self.cache.load_arrays()
+            self._count_arrays(arrays)
+            return arrays
+
+        with phase(self.stats, 'events'):
+            arrays = parse_ptrac_parallel(self, workers)
+        self._count_arrays(arrays)
+        if self.cache is not None:
+            self.cache.save(self, arrays)
+        return arrays
+
+    def follow(self, poll_interval=0.5, idle_timeout=None, stop=None,
+               wait=None, event_types=None, ncl=None, mat=None, ipt=None,
+               erg=None, nps=None, skip_empty=False):
+        """ Parse the histories of an ASCII file still written by MCNP
+
+        Each history is yielded once its terminating event is written.
+        Without idle_timeout or stop the generator waits for new histories
+        until it is closed. The header is parsed first, waiting for it, if
+        the reader was created with parse_on_init=False.
+
+        Parameters
+        ----------
+        poll_interval : float
+            Seconds between checks of the file for new lines
+        idle_timeout : float, optional
+            Stop after this many seconds without a new line
+        stop : callable, optional
+            Returns True once MCNP has finished, such as
+            lambda: process.done for an McnpProcess
+        wait : callable, optional
+            Called with poll_interval to wait for the file to change,
+            defaults to time.sleep
+        event_types, ncl, mat, ipt, erg, nps, skip_empty
+            Selections, see parse_event
+
+        Returns
+        -------
+        histories : generator
+            See parse_ptrac_events
+        """
+        from follow import TailFile, follow_ptrac_events
+
+        if self.is_binary:
+            raise ValueError('follow supports ASCII ptrac files only')
+
+        if self.__is_parsed:
+            offset = self.__ptrac_file.tell()
+        else:
+            offset = 0
+        tail_file = TailFile(self.filename, offset, poll_interval,
+                             idle_timeout, stop, wait)
+
+        if not self.__is_parsed:
+            self.header = PtracHeader(tail_file)
+            self.input_format = PtracInputFormat(tail_file)
+            self.event_format = PtracEventFormat(tail_file)
+            self.events_offset = tail_file.tell()
+            self.__ptrac_file.seek(self.events_offset)
+            self.__is_parsed = True
+
+        event_filter = self._event_filter(event_types, ncl, mat, ipt, erg,
+                                          nps, skip_empty)
+        counter = self._counter(tail_file)
+        return self._instrument(follow_ptrac_events(
+            tail_file, self.event_format, event_filter, counter), counter)
+
+    def _open_events(self, offset=None):
+        """ Open a new handle on the file, positioned at the first event """
+        if self.is_binary:
+            events_file = FortranRecordFile(self.filename)
+        else:
+            events_file = open(self.filename, 'r')
+        events_file.seek(self.events_offset if offset is None else offset)
+
+        return events_file
+
+    def build_index(self, persist=True):
+        """ Index the byte offset of every history for random access
+
+        A persisted index next to the file is loaded instead of scanning the
+        events, unless the file has changed since.
+
+        Parameters
+        ----------
+        persist : bool
+            Save a newly built index next to the file
+
+        Returns
+        -------
+        index : PtracIndex
+        """
+        from index import (PtracIndex, index_binary_events, index_filename,
+                           index_ptrac_events)
+
+        if not self.__is_parsed:
+            raise RuntimeError('ptrac header has not been parsed!')
+
+        filename = index_filename(self.filename)
+        self.index = PtracIndex.load(filename, self.filename)
+        if self.index is None:
+            if self.is_binary:
+                index_events = index_binary_events
+            else:
+                index_events = index_ptrac_events
+            with self._open_events() as events_file:
+                self.index = index_events(events_file, self.event_format)
+            if persist:
+                try:
+                    self.index.save(filename, self.filename)
+                except (IOError, OSError):
+                    pass
+
+        return self.index
+
+    def histories(self, positions=slice(None)):
+        """ Seek to and parse histories by their position in the file
+
+        Parameters
+        ----------
+        positions : slice or sequence of int
+            Positions of the histories in file order
+
+        Yields
+        ------
+        history : PtracHistory
+        """
+        if self.index is None:
+            self.build_index()
+
+        parse = parse_binary_events if self.is_binary else parse_ptrac_events
+        events_file = self._open_events()
+        histories = None
+        previous = None
+        try:
+            for position in np.arange(len(self.index))[positions]:
+                if previous is None or position != previous + 1:
+                    events_file.seek(int(self.index.offsets[position]))
+                    histories = parse(events_file, self.event_format)
+                yield next(histories)
+                previous = position
+        finally:
+            events_file.close()
+
+    def get_history(self, nps):
+        """ Seek to and parse the history of source particle number nps """
+        if self.index is None:
+            self.build_index()
+
+        position = self.index.locate(nps)
+        histories = self.histories([position])
+        try:
+            return next(histories)
+        finally:
+            histories.close()
 
 
 if __name__ == '__main__':
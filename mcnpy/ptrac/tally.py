@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Track-length and collision mesh tallies from PTRAC events
+
+Notes:
+A particle moves in a straight line between consecutive events of its
+history, with the energy and weight of the event it leaves. Termination
+events end a particle, the bank event following them starts the next one,
+so no track joins them.
+
+Tracks are cut by the planes of a rectilinear mesh in batches: the crossing
+parameters of every segment with the x, y and z planes between its ends are
+gathered into one flat array, sorted per segment, and the pieces between
+consecutive crossings are scored in the voxel holding their midpoint.
+Collisions are scored with the energy and weight of the track entering
+them.
+
+Tallies only hold sums and the number of histories, so tallies of chunks of
+a file, parsed in any order or in other processes, are merged by addition.
+"""
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from parallel import _parse_chunk_arrays, split_events
+from reader import EVENT_KINDS
+
+
+def merge_events(arrays, names, event_types=None):
+    """ Columns of the events of columnar arrays merged in file order
+
+    Parameters
+    ----------
+    arrays : dict
+        See parse_ptrac_columnar
+    names : list
+        Fields present in every included event kind
+    event_types : list, optional
+        Event kinds to include, by default all
+
+    Returns
+    -------
+    columns : dict
+        Array of each field
+    """
+    kinds = [k for k in EVENT_KINDS if k in arrays and
+             (event_types is None or k in event_types)]
+    index = np.concatenate([arrays[k]['index'] for k in kinds] +
+                           [np.zeros(0, dtype=np.int64)])
+    order = np.argsort(index, kind='mergesort')
+
+    columns = {}
+    for name in names:
+        values = [arrays[k][name] for k in kinds]
+        dtype = values[0].dtype if values else np.float64
+        columns[name] = np.concatenate(values + [np.zeros(0, dtype)])[order]
+    return columns
+
+
+def track_starts(types, nps):
+    """ Events starting a track to the next event, see merge_events
+
+    Returns
+    -------
+    mask : ndarray
+        Boolean mask of all events but the last one
+    """
+    return (nps[1:] == nps[:-1]) & (types[:-1] // 1000 != 5)
+
+
+class MeshTally(object):
+    """ Track-length and collision tallies on a rectilinear mesh """
+
+    def __init__(self, x_edges, y_edges, z_edges, energy_edges=None,
+                 batch_size=1 << 16):
+        """
+        Parameters
+        ----------
+        x_edges, y_edges, z_edges : ndarray
+            Increasing voxel boundaries in cm
+        energy_edges : ndarray, optional
+            Increasing energy bin boundaries in MeV, by default one bin
+        batch_size : int
+            Tracks cut at a time, bounding temporary arrays
+        """
+        self.edges = [np.asarray(e, dtype=np.float64)
+                      for e in (x_edges, y_edges, z_edges)]
+        if energy_edges is None:
+            energy_edges = [0., np.inf]
+        self.energy_edges = np.asarray(energy_edges, dtype=np.float64)
+        self.batch_size = batch_size
+
+        self.shape = tuple(len(e) - 1 for e in self.edges) + \
+            (len(self.energy_edges) - 1,)
+        self.track_length = np.zeros(self.shape)
+        self.collisions = np.zeros(self.shape)
+        self.n_histories = 0
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  shape: %s' % (self.shape,)
+        printstr += '\n  histories: %d' % self.n_histories
+        printstr += '\n  track length: %g' % self.track_length.sum()
+        printstr += '\n  collisions: %g' % self.collisions.sum()
+
+        return printstr
+
+    def empty(self):
+        """ Tally on the same mesh without scores """
+        return MeshTally(self.edges[0], self.edges[1], self.edges[2],
+                         self.energy_edges, self.batch_size)
+
+    def is_compatible(self, other):
+        return all(np.array_equal(a, b) for a, b in
+                   zip(self.edges + [self.energy_edges],
+                       other.edges + [other.energy_edges]))
+
+    def merge(self, other):
+        """ Add the scores of a tally on the same mesh
+
+        Raises
+        ------
+        ValueError
+            If the meshes or energy bins differ
+        """
+        if not self.is_compatible(other):
+            raise ValueError('tallies have different meshes')
+
+        self.track_length += other.track_length
+        self.collisions += other.collisions
+        self.n_histories += other.n_histories
+        return self
+
+    __iadd__ = merge
+
+    @property
+    def volumes(self):
+        """ Voxel volumes in cm^3, (nx, ny, nz, 1) """
+        dx, dy, dz = [np.diff(e) for e in self.edges]
+        return (dx[:, None, None] * dy[None, :, None] *
+                dz[None, None, :])[..., None]
+
+    @property
+    def flux(self):
+        """ Track-length flux per source particle in 1/cm^2 """
+        return self.track_length / self.volumes / max(self.n_histories, 1)
+
+    @property
+    def collision_density(self):
+        """ Collisions per cm^3 and source particle """
+        return self.collisions / self.volumes / max(self.n_histories, 1)
+
+    def _bins(self, points, energies):
+        """ Flat bin of each point and energy, -1 outside of the mesh """
+        bins = np.zeros(len(points), dtype=np.int64)
+        outside = np.zeros(len(points), dtype=bool)
+        for axis, edges in enumerate(self.edges + [self.energy_edges]):
+            values = points[:, axis] if axis < 3 else energies
+            i = np.searchsorted(edges, values, side='right') - 1
+            outside |= (i < 0) | (i >= len(edges) - 1)
+            bins = bins * (len(edges) - 1) + i
+        bins[outside] = -1
+        return bins
+
+    def _add(self, scores, bins, weights):
+        inside = bins >= 0
+        scores += np.bincount(bins[inside], weights[inside],
+                              minlength=scores.size).reshape(self.shape)
+
+    def score_tracks(self, start, end, energy, weight):
+        """ Add the weighted length of straight tracks in each voxel
+
+        Parameters
+        ----------
+        start, end : ndarray
+            (n, 3) track ends in cm
+        energy, weight : ndarray
+            Energy and weight along each track
+        """
+        for first in xrange(0, len(start), self.batch_size):
+            batch = slice(first, first + self.batch_size)
+            self._score_batch(start[batch], end[batch], energy[batch],
+                              weight[batch])
+
+    def _score_batch(self, start, end, energy, weight):
+        n = len(start)
+        delta = end - start
+
+        # crossing parameters of the planes between the ends of each track
+        segments = [np.arange(n), np.arange(n)]
+        crossings = [np.zeros(n), np.ones(n)]
+        for axis, edges in enumerate(self.edges):
+            low = np.minimum(start[:, axis], end[:, axis])
+            high = np.maximum(start[:, axis], end[:, axis])
+            first = np.searchsorted(edges, low, side='right')
+            counts = np.searchsorted(edges, high, side='left') - first
+            counts = np.maximum(counts, 0)
+            if not counts.sum():
+                continue
+
+            segment = np.repeat(np.arange(n), counts)
+            offsets = np.arange(len(segment)) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            planes = edges[first[segment] + offsets]
+            segments.append(segment)
+            crossings.append((planes - start[segment, axis]) /
+                             delta[segment, axis])
+
+        segment = np.concatenate(segments)
+        t = np.concatenate(crossings)
+        order = np.lexsort((t, segment))
+        segment, t = segment[order], t[order]
+
+        # pieces between consecutive crossings of the same track
+        piece = segment[1:] == segment[:-1]
+        segment = segment[:-1][piece]
+        t0, t1 = t[:-1][piece], t[1:][piece]
+        middle = start[segment] + ((t0 + t1) / 2)[:, None] * delta[segment]
+        lengths = (t1 - t0) * np.sqrt((delta[segment] ** 2).sum(axis=1))
+
+        bins = self._bins(middle, energy[segment])
+        self._add(self.track_length, bins, lengths * weight[segment])
+
+    def score_collisions(self, points, energy, weight):
+        """ Add weighted collisions at points in cm """
+        self._add(self.collisions, self._bins(points, energy), weight)
+
+    def score_arrays(self, arrays):
+        """ Score the tracks and collisions of columnar arrays
+
+        Parameters
+        ----------
+        arrays : dict
+            Whole histories, see parse_ptrac_columnar
+        """
+        names = ['nps', 'type', 'xxx', 'yyy', 'zzz', 'erg', 'wgt']
+        events = merge_events(arrays, names)
+        points = np.column_stack([events[name].astype(np.float64)
+                                  for name in ('xxx', 'yyy', 'zzz')])
+        energy = events['erg'].astype(np.float64)
+        weight = events['wgt'].astype(np.float64)
+
+        starts = np.flatnonzero(track_starts(events['type'], events['nps']))
+        self.score_tracks(points[starts], points[starts + 1], energy[starts],
+                          weight[starts])
+
+        # collisions ending a track take its energy and weight
+        collisions = starts[events['type'][starts + 1] // 1000 == 4]
+        self.score_collisions(points[collisions + 1], energy[collisions],
+                              weight[collisions])
+        self.n_histories += len(arrays['nps'])
+
+        return self
+
+
+def _tally_chunk(args):
+    tally = args[0]
+    return tally.score_arrays(_parse_chunk_arrays(args[1:]))
+
+
+def tally_parallel(ptrac, tally, workers=None, n_chunks=None):
+    """ Score a PTRAC file in a process pool, one partial tally per chunk
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+        Reader with parsed header
+    tally : MeshTally
+        Tally the scores are added to
+    workers : int, optional
+        Number of processes, defaults to the CPU count
+    n_chunks : int, optional
+        Number of byte ranges, defaults to four per worker
+
+    Returns
+    -------
+    tally : MeshTally
+    """
+    workers = workers or cpu_count()
+    ranges = split_events(ptrac, n_chunks or 4 * workers)
+    tasks = [(tally.empty(), ptrac.filename, ptrac.is_binary, start, end,
+              ptrac.event_format) for start, end in ranges]
+
+    pool = Pool(workers)
+    try:
+        for partial in pool.imap_unordered(_tally_chunk, tasks):
+            tally.merge(partial)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return tally
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized block tokenizer for ASCII PTRAC events
+
+Notes:
+MCNP writes the event section with a fixed Fortran layout, a leading blank
+followed by 10 character fields on integer lines (the NPS line and the first
+line of each event) and 13 character fields on float lines (the second line
+of each event). Large blocks of text are split into lines and classified
+with NumPy:
+
+    float line  contains a '.'
+    NPS line    integer line followed by another integer line
+    event line  integer line followed by its float line
+
+The type of each event is the next event type of the integer line before it,
+so all event lines of one kind can be gathered into a character matrix whose
+fields are converted by digit arithmetic. Blocks that do not follow the fixed
+layout are parsed line by line up to their last NPS line, where tokenizing
+resumes.
+"""
+from StringIO import StringIO
+
+import numpy as np
+
+from reader import EVENT_KINDS, parse_ptrac_lines
+
+INT_WIDTH = 10
+FLOAT_WIDTH = 13
+BLOCK_SIZE = 1 << 22
+
+# correctly rounded powers of ten, exact up to 10**22
+POWERS_FLOAT = np.array([float(10 ** k) for k in range(309)])
+# value of each character as a decimal digit, zero for other characters
+DIGITS = np.zeros(256)
+DIGITS[ord('0'):ord('9') + 1] = np.arange(10)
+
+
+class LayoutError(ValueError):
+    """ Block does not follow the fixed Fortran layout of PTRAC events """
+
+
+def split_lines(buf):
+    """ Start and end offsets of the non-empty lines of a character array
+
+    Parameters
+    ----------
+    buf : ndarray
+        uint8 view of the text
+
+    Returns
+    -------
+    starts, ends : ndarray
+        Offsets of each line, ends exclude the newline (and carriage return)
+    """
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buf)]))
+    if len(buf):
+        ends -= buf[np.maximum(ends - 1, 0)] == ord('\r')
+    keep = ends > starts
+
+    return starts[keep], ends[keep]
+
+
+def classify_lines(buf, starts):
+    """ Flag float lines and NPS lines, see module notes """
+    is_float = np.zeros(len(starts), dtype=bool)
+    dots = np.flatnonzero(buf == ord('.'))
+    is_float[np.searchsorted(starts, dots, side='right') - 1] = True
+
+    is_nps = ~is_float
+    is_nps[:-1] &= ~is_float[1:]
+    is_nps[-1:] = False
+
+    return is_float, is_nps
+
+
+def fixed_fields(buf, starts, count, width, dtype):
+    """ Convert fixed-width fields following a leading blank of many lines
+
+    Parameters
+    ----------
+    buf : ndarray
+        uint8 view of the text
+    starts : ndarray
+        Offsets of the lines
+    count : int
+        Number of fields to convert
+    width : int
+        Characters per field
+    dtype : dtype
+        np.int64 for integer fields, np.float64 for Fortran E fields
+
+    Returns
+    -------
+    values : ndarray
+        (len(starts), count) array of field values
+    """
+    columns = np.arange(1, 1 + count * width)
+    chars = buf[starts[:, None] + columns].reshape(len(starts), count, width)
+    if np.dtype(dtype).kind == 'f':
+        return parse_floats(chars)
+    return parse_ints(chars)
+
+
+def _digit_sum(chars, places):
+    """ Sum of the decimal digits of chars times 10**places
+
+    places is either one exponent per column, computed as a single dot
+    product, or broadcast against chars. Sums are exact below 2**53.
+    """
+    digits = DIGITS[chars]
+    if places.ndim == 1:
+        return digits.dot(POWERS_FLOAT[places])
+    return (digits * POWERS_FLOAT[places]).sum(axis=-1)
+
+
+def parse_ints(chars):
+    """ Convert right aligned integer fields, the last axis of chars """
+    width = chars.shape[-1]
+    values = _digit_sum(chars, np.arange(width - 1, -1, -1))
+    values[(chars == ord('-')).any(axis=-1)] *= -1
+
+    return values.astype(np.int64)
+
+
+def parse_floats(chars):
+    """ Convert Fortran E fields ('-0.12345E+01'), the last axis of chars
+
+    The mantissa digits and the decimal exponent are converted to integers
+    first, so values are correctly rounded like float() for exponents up to
+    22 digits from the mantissa.
+    """
+    width = chars.shape[-1]
+    if not np.all(chars[..., width - 4] == ord('E')):
+        raise LayoutError('float field without E exponent')
+
+    mantissa = chars[..., :width - 4]
+    m_width = mantissa.shape[-1]
+    dot = np.argmax(mantissa == ord('.'), axis=-1)
+    columns = np.arange(m_width)
+    if dot.size and np.all(dot == dot.flat[0]):
+        # fixed decimal point, the usual Fortran layout
+        places = m_width - 1 - columns - (columns < dot.flat[0])
+    else:
+        places = m_width - 1 - columns - (columns < dot[..., None])
+    values = _digit_sum(mantissa, places)
+    values[(mantissa == ord('-')).any(axis=-1)] *= -1
+
+    exponent = _digit_sum(chars[..., width - 2:], np.array([1, 0]))
+    exponent = exponent.astype(np.int64)
+    exponent[chars[..., width - 3] == ord('-')] *= -1
+    shift = exponent - (m_width - 1 - dot)
+    scale = POWERS_FLOAT[np.minimum(np.abs(shift), len(POWERS_FLOAT) - 1)]
+
+    return np.where(shift >= 0, values * scale, values / scale)
+
+
+def tokenize_block(data, event_format, first_index=0, final=True):
+    """ Tokenize a block of complete PTRAC histories into record arrays
+
+    Parameters
+    ----------
+    data : str
+        Text starting on an NPS line
+    event_format : PtracEventFormat
+    first_index : int
+        File index of the first event in the block
+    final : bool
+        Parse all of data, otherwise stop before the last NPS line since the
+        history it starts may continue after the block
+
+    Returns
+    -------
+    arrays : dict or None
+        See parse_ptrac_columnar, None if no complete history was found
+    consumed : int
+        Number of characters of data that were parsed
+
+    Raises
+    ------
+    LayoutError
+        If the block does not follow the fixed field layout
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts, ends = split_lines(buf)
+    if not final:
+        # the last line may be incomplete
+        complete = ends < len(buf)
+        starts, ends = starts[complete], ends[complete]
+    if len(starts) == 0:
+        return None, 0
+
+    is_float, is_nps = classify_lines(buf, starts)
+    if not is_nps[0]:
+        raise LayoutError('block does not start on an nps line')
+
+    consumed = len(buf)
+    if not final:
+        nps_lines = np.flatnonzero(is_nps)
+        if len(nps_lines) < 2:
+            return None, 0
+        consumed = starts[nps_lines[-1]]
+        n_lines = nps_lines[-1]
+        starts, ends = starts[:n_lines], ends[:n_lines]
+        is_float, is_nps = is_float[:n_lines], is_nps[:n_lines]
+
+    lengths = ends - starts
+    int_lines = np.flatnonzero(~is_float & ~is_nps)
+    if len(int_lines) and (int_lines[-1] + 1 >= len(starts) or
+                           not is_float[int_lines + 1].all()):
+        raise LayoutError('event line without float line')
+    if np.count_nonzero(is_float) != len(int_lines):
+        raise LayoutError('float line without event line')
+
+    # NPS lines
+    nps_lines = np.flatnonzero(is_nps)
+    n_nps = event_format.n_nps
+    if np.any(lengths[nps_lines] != 1 + n_nps * INT_WIDTH):
+        raise LayoutError('nps line width')
+    nps_values = fixed_fields(buf, starts[nps_lines], n_nps, INT_WIDTH,
+                              np.int64)
+    nps = nps_values[:, event_format.id_nps.index(1)]
+
+    # type of each event is the next event type of the line before it
+    control = np.flatnonzero(~is_float)
+    next_types = np.empty(len(control), dtype=np.int64)
+    control_nps = is_nps[control]
+    next_types[control_nps] = nps_values[:, event_format.id_nps.index(2)]
+    if np.any(lengths[int_lines] < 1 + INT_WIDTH):
+        raise LayoutError('event line width')
+    next_types[~control_nps] = fixed_fields(buf, starts[int_lines], 1,
+                                            INT_WIDTH, np.int64)[:, 0]
+    event_types = next_types[np.flatnonzero(~control_nps) - 1]
+    kinds = np.abs(event_types) // 1000 - 1
+    if np.any((kinds < 0) | (kinds >= len(EVENT_KINDS))):
+        raise LayoutError('unknown event type')
+
+    history = np.cumsum(is_nps)[int_lines] - 1
+    n_events = np.bincount(history, minlength=len(nps_lines))
+    index = first_index + np.arange(len(int_lines))
+
+    arrays = {}
+    array = np.zeros(len(nps_lines), dtype=event_format.dtype('nps'))
+    array['nps'] = nps
+    array['index'] = first_index + np.cumsum(n_events) - n_events
+    array['n_events'] = n_events
+    for name, position, _ in event_format.fields('nps'):
+        if name != 'nps':
+            array[name] = nps_values[:, position]
+    arrays['nps'] = array
+
+    for i, kind in enumerate(EVENT_KINDS):
+        selected = np.flatnonzero(kinds == i)
+        lines = int_lines[selected]
+        n_int = getattr(event_format, 'n_%s_ev_int' % kind)
+        n_float = getattr(event_format, 'n_%s_ev' % kind) - n_int
+        if np.any(lengths[lines] != 1 + n_int * INT_WIDTH) or \
+                np.any(lengths[lines + 1] != 1 + n_float * FLOAT_WIDTH):
+            raise LayoutError('%s event line width' % kind)
+
+        array = np.zeros(len(lines), dtype=event_format.dtype(kind))
+        array['nps'] = nps[history[selected]]
+        array['index'] = index[selected]
+        array['type'] = event_types[selected]
+        if len(lines):
+            ints = fixed_fields(buf, starts[lines], n_int, INT_WIDTH,
+                                np.int64)
+            floats = fixed_fields(buf, starts[lines + 1], n_float,
+                                  FLOAT_WIDTH, np.float64)
+            for name, position, _ in event_format.fields(kind):
+                if position < n_int:
+                    array[name] = ints[:, position]
+                else:
+                    array[name] = floats[:, position - n_int]
+        arrays[kind] = array
+
+    return arrays, consumed
+
+
+def last_history_start(data):
+    """ Offset of the last NPS line after the first line of complete lines
+
+    Parameters
+    ----------
+    data : str
+        Text starting on an NPS line
+
+    Returns
+    -------
+    offset : int
+        Start of the last history that may continue after data, 0 if data
+        holds no other NPS line
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts, ends = split_lines(buf)
+    starts = starts[ends < len(buf)]
+    if len(starts) == 0:
+        return 0
+    nps_lines = np.flatnonzero(classify_lines(buf, starts)[1][1:]) + 1
+
+    return int(starts[nps_lines[-1]]) if len(nps_lines) else 0
+
+
+def parse_ptrac_blocks(ptrac_file, event_format, event_filter=None,
+                       block_size=BLOCK_SIZE):
+    """ Read and tokenize PTRAC events block by block into record arrays
+
+    Parameters
+    ----------
+    ptrac_file : file
+        Positioned at the first NPS line
+    event_format : PtracEventFormat
+    event_filter : PtracFilter, optional
+        Applied to the arrays of each block
+    block_size : int
+        Number of characters read at a time
+
+    Returns
+    -------
+    arrays : dict
+        See parse_ptrac_columnar
+    """
+    kinds = ('nps',) + EVENT_KINDS
+    chunks = dict((k, []) for k in kinds)
+    first_index = 0
+    data = ''
+    final = False
+
+    while not final:
+        block = ptrac_file.read(block_size)
+        final = len(block) < block_size
+        data += block
+
+        try:
+            arrays, consumed = tokenize_block(data, event_format,
+                                              first_index, final)
+        except LayoutError:
+            # parse the complete histories of the block line by line, the
+            # next block is tokenized again from the following NPS line
+            consumed = len(data) if final else last_history_start(data)
+            arrays = None
+            if consumed:
+                arrays = parse_ptrac_lines(StringIO(data[:consumed]),
+                                           event_format)
+                for array in arrays.values():
+                    array['index'] += first_index
+        if arrays is None:
+            continue
+
+        first_index += int(arrays['nps']['n_events'].sum())
+        if event_filter is not None:
+            arrays = event_filter.apply(arrays, event_format)
+        for kind in kinds:
+            chunks[kind].append(arrays[kind])
+        data = data[consumed:]
+
+    return dict((k, np.concatenate(chunks[k]) if chunks[k] else
+                 np.zeros(0, dtype=event_format.dtype(k))) for k in kinds)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Writer of PTRAC files holding selected histories or events of another
+
+Notes:
+The header, input format and event format of the source file are copied,
+so the written file is read by PtracReader like the source. ASCII output
+keeps the format lines of an ASCII source verbatim, binary output writes
+them as the Fortran records described in binary.py.
+
+Events are written from their variables in the layout of the event format,
+integers with '%10d' and floats with '%13.5E' in ASCII, as int and float64
+records in binary. Events that were not decoded are written from their raw
+record, and their ASCII lines are copied unchanged when the next event type
+is the same. The event type linking each event to the next is taken from the
+written events, so histories whose events were filtered stay readable.
+Histories without events are not written, an NPS line has to be followed by
+an event.
+"""
+import struct
+from operator import attrgetter
+
+import numpy as np
+
+from binary import (HEADER_WIDTHS, FortranRecordFile, binary_format_lines,
+                    int_dtype, write_record)
+from reader import (EVENT_KINDS, PTRAC_VARIABLES, PtracEventFormat,
+                    PtracHeader, PtracInputFormat, event_kind)
+
+
+class _LineRecorder(object):
+    """ Keep the lines read from a file """
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+        self.lines = []
+
+    def readline(self):
+        line = self.wrapped.readline()
+        self.lines.append(line)
+        return line
+
+
+def format_lines(ptrac):
+    """ Header, input format and event format lines of a PTRAC file
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+
+    Returns
+    -------
+    sections : tuple
+        Lists of the lines parsed by PtracHeader, PtracInputFormat and
+        PtracEventFormat, converted to ASCII for binary files
+    """
+    if ptrac.is_binary:
+        records = FortranRecordFile(ptrac.filename)
+        try:
+            recorder = _LineRecorder(binary_format_lines(records))
+        finally:
+            records.close()
+    else:
+        recorder = _LineRecorder(open(ptrac.filename, 'r'))
+
+    sections = []
+    try:
+        for parser in (PtracHeader, PtracInputFormat, PtracEventFormat):
+            start = len(recorder.lines)
+            parser(recorder)
+            sections.append(recorder.lines[start:])
+    finally:
+        if not ptrac.is_binary:
+            recorder.wrapped.close()
+
+    return tuple(sections)
+
+
+class _RecordLayout(object):
+    """ Values of the NPS line or of an event kind in record order """
+
+    def __init__(self, event_format, kind):
+        self.names = [PTRAC_VARIABLES[id_-1] for id_ in event_format.ids(kind)]
+        # positions of the next event type, the other variables in order
+        self.type_positions = [i for i, name in enumerate(self.names)
+                               if name is None]
+        names = [n for n in self.names if n is not None]
+        self.getter = attrgetter(*names)
+        if len(names) == 1:
+            self.getter = lambda obj, get=self.getter: (get(obj),)
+        if kind == 'nps':
+            self.n_int = len(self.names)
+        else:
+            self.n_int = getattr(event_format, 'n_%s_ev_int' % kind)
+        n_float = len(self.names) - self.n_int
+        self.int_line = ' ' + '%10d' * self.n_int + '\n'
+        self.float_line = ' ' + '%13.5E' * n_float + '\n'
+        code = 'q' if int_dtype(event_format).itemsize == 8 else 'i'
+        self.int_struct = struct.Struct('<%d%s' % (self.n_int, code))
+        self.float_struct = struct.Struct('<%dd' % n_float)
+
+    def values(self, obj, next_type):
+        raw = getattr(obj, '_raw', None)
+        if raw is not None:
+            # events not decoded yet hold their values in record order
+            if isinstance(raw, basestring):
+                values = [float(v) for v in raw.split()]
+            else:
+                values = raw.tolist()
+            if len(values) == len(self.names):
+                for position in self.type_positions:
+                    values[position] = next_type
+                return values
+
+        try:
+            values = list(self.getter(obj))
+        except AttributeError:
+            # variables missing from the object are written as zero
+            values = [getattr(obj, n, 0) for n in self.names if n is not None]
+        for position in self.type_positions:
+            values.insert(position, next_type)
+        return values
+
+
+class PtracWriter(object):
+    """ Sequential writer of PTRAC histories in the format of a source file
+
+    Examples
+    --------
+    >>> with PtracWriter('subset.ptrac', ptrac) as writer:
+    ...     for history in ptrac.parse_event(ncl=[10]):
+    ...         writer.write_history(history)
+    """
+
+    def __init__(self, filename, ptrac, binary=False):
+        """
+        Parameters
+        ----------
+        filename : str
+        ptrac : PtracReader
+            Source file providing the header and formats
+        binary : bool
+            Write Fortran unformatted records instead of ASCII lines
+        """
+        self.filename = filename
+        self.binary = binary
+        self.event_format = ptrac.event_format
+        self.n_histories = 0
+        self.n_events = 0
+
+        self._layouts = dict((k, _RecordLayout(self.event_format, k))
+                             for k in ('nps',) + EVENT_KINDS)
+
+        sections = format_lines(ptrac)
+        self.__file = open(filename, 'wb' if binary else 'w')
+        try:
+            if binary:
+                self._write_binary_header(ptrac.header, sections)
+            else:
+                self.__file.writelines(line for section in sections
+                                       for line in section)
+        except Exception:
+            self.__file.close()
+            raise
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  filename: %s' % self.filename
+        printstr += '\n  binary: %s' % self.binary
+        printstr += '\n  histories: %d' % self.n_histories
+        printstr += '\n  events: %d' % self.n_events
+
+        return printstr
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.__file.close()
+
+    def _write_binary_header(self, header, sections):
+        f = self.__file
+        write_record(f, np.array([-1], dtype=np.int32))
+        fields = [header.kod, str(header.ver),
+                  header.loddat.strftime('%m/%d/%y'),
+                  header.idtm.strftime('%m/%d/%y %H:%M:%S'), header.aid]
+        write_record(f, ''.join(v[:w].ljust(w) for v, w in
+                                zip(fields, HEADER_WIDTHS)))
+        write_record(f, np.array(''.join(sections[1]).split(),
+                                 dtype=np.float64))
+        event_lines = sections[2]
+        write_record(f, np.array(event_lines[0].split(), dtype=np.int32))
+        write_record(f, np.array(''.join(event_lines[1:]).split(),
+                                 dtype=np.int32))
+
+    def _write_record(self, layout, obj, next_type):
+        raw = getattr(obj, '_raw', None)
+        if not self.binary and isinstance(raw, basestring) and \
+                int(raw.split(None, 1)[0]) == next_type:
+            # ASCII events followed by the same event type are copied
+            self.__file.write(raw)
+            return
+
+        values = layout.values(obj, next_type)
+        n_int = layout.n_int
+        if self.binary:
+            write_record(self.__file, layout.int_struct.pack(
+                *[int(v) for v in values[:n_int]]))
+            if n_int < len(values):
+                write_record(self.__file,
+                             layout.float_struct.pack(*values[n_int:]))
+        else:
+            self.__file.write(layout.int_line % tuple(values[:n_int]))
+            if n_int < len(values):
+                self.__file.write(layout.float_line % tuple(values[n_int:]))
+
+    def write_history(self, history):
+        """ Write a history with its events
+
+        Parameters
+        ----------
+        history : PtracHistory
+            Histories without events are skipped
+
+        Returns
+        -------
+        written : bool
+        """
+        events = history.events
+        if not events:
+            return False
+
+        layouts = self._layouts
+        self._write_record(layouts['nps'], history, events[0].type)
+        next_types = [event.type for event in events[1:]] + [9000]
+        for event, next_type in zip(events, next_types):
+            self._write_record(layouts[event_kind(event.type)], event,
+                               next_type)
+
+        self.n_histories += 1
+        self.n_events += len(events)
+        return True
+
+    def write(self, histories):
+        """ Write histories, see write_history
+
+        Returns
+        -------
+        n_histories : int
+            Number of histories written
+        """
+        start = self.n_histories
+        for history in histories:
+            self.write_history(history)
+        return self.n_histories - start
+
+
+def compact(ptrac, filename, select=None, binary=False, **filters):
+    """ Write the selected histories and events of a PTRAC file
+
+    Parameters
+    ----------
+    ptrac : PtracReader
+        Reader with parsed header, its remaining events are read
+    filename : str
+    select : callable, optional
+        Called with each PtracHistory, the history is kept if it returns
+        True
+    binary : bool
+        Write a binary file, see PtracWriter
+    **filters
+        Event selections of PtracReader.parse_event
+
+    Returns
+    -------
+    writer : PtracWriter
+        Closed writer with the numbers of histories and events written
+    """
+    histories = ptrac.parse_event(**filters)
+    if select is not None:
+        histories = (h for h in histories if select(h))
+
+    with PtracWriter(filename, ptrac, binary) as writer:
+        writer.write(histories)
+    return writer
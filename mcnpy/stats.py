@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of the PTRAC and ACE readers
+
+Notes:
+Readers take a ParseStats through their stats argument. Without it the
+parsers run unchanged, with it the opened file is wrapped by a CountingFile
+and parsed histories by instrument_histories, so the cost of measuring is
+only paid by instrumented parses. Bytes are counted from the file position
+at history or block boundaries rather than per line.
+
+Counters are keyed by name, such as 'bytes', 'lines', 'histories', 'events'
+and 'events_col', and phase timers by phase, such as 'header', 'formats'
+and 'events'. The progress callback is called with the ParseStats at most
+once per interval seconds while parsing, and once at the end.
+"""
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+
+RATE_COUNTERS = ('bytes', 'lines', 'histories', 'events', 'tables', 'values')
+
+
+class ParseStats(object):
+    """ Counters, phase timers and progress reports of a parse """
+
+    def __init__(self, progress=None, interval=1.0):
+        """
+        Parameters
+        ----------
+        progress : callable, optional
+            Called with this ParseStats during the parse
+        interval : float
+            Minimum seconds between progress calls
+        """
+        self.progress = progress
+        self.interval = interval
+        self.counters = Counter()
+        self.timers = OrderedDict()
+        self.start = time.time()
+        self._last_report = self.start
+
+    def __str__(self):
+        printstr = self.__class__.__name__
+        printstr += '\n  elapsed: %.3f s' % self.elapsed
+        for item in sorted(self.counters.items()):
+            printstr += '\n  %s: %d' % item
+        for item in self.timers.items():
+            printstr += '\n  %s time: %.3f s' % item
+        for item in sorted(self.rates().items()):
+            printstr += '\n  %s: %.1f' % item
+
+        return printstr
+
+    @property
+    def elapsed(self):
+        """ Seconds since the stats were created """
+        return time.time() - self.start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, phase, seconds):
+        self.timers[phase] = self.timers.get(phase, 0.) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """ Add the time spent in a with block to the timer of a phase """
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.add_time(name, time.time() - start)
+
+    def rates(self):
+        """ Throughput of the counters per second of elapsed time
+
+        Returns
+        -------
+        rates : dict
+            Such as 'bytes_per_second', for the counters in RATE_COUNTERS
+        """
+        elapsed = max(self.elapsed, 1e-9)
+        return dict((name + '_per_second', self.counters[name] / elapsed)
+                    for name in RATE_COUNTERS if name in self.counters)
+
+    def report(self, force=False):
+        """ Call progress if interval seconds have passed since the last """
+        if self.progress is None:
+            return
+        now = time.time()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            self.progress(self)
+
+    def as_dict(self):
+        """ Counters, timers and rates as one dict for logging """
+        result = dict(self.counters)
+        result.update(('%s_seconds' % k, v) for k, v in self.timers.items())
+        result.update(self.rates())
+        result['elapsed_seconds'] = self.elapsed
+        return result
+
+
+@contextmanager
+def _no_phase():
+    yield None
+
+
+def phase(stats, name):
+    """ Timer of a phase of stats, doing nothing if stats is None """
+    if stats is None:
+        return _no_phase()
+    return stats.phase(name)
+
+
+class PositionCounter(object):
+    """ Counts the bytes a file position advances into a ParseStats """
+
+    def __init__(self, wrapped, stats):
+        self.wrapped = wrapped
+        self.stats = stats
+        self._synced = wrapped.tell()
+
+    def sync(self):
+        """ Add the bytes read since the last sync to stats """
+        position = self.wrapped.tell()
+        self.stats.counters['bytes'] += position - self._synced
+        self._synced = position
+
+
+class CountingFile(PositionCounter):
+    """ File wrapper counting the bytes and lines read into a ParseStats
+
+    Lines read one at a time are only added to the stats by sync, keeping
+    readline nearly as fast as the one of the wrapped file.
+    """
+
+    def __init__(self, wrapped, stats):
+        PositionCounter.__init__(self, wrapped, stats)
+        self.lines = 0
+        self.closed = False
+
+    def readline(self):
+        line = self.wrapped.readline()
+        if line:
+            self.lines += 1
+        return line
+
+    def read(self, size=-1):
+        data = self.wrapped.read(size)
+        self.lines += data.count('\n')
+        self.sync()
+        self.stats.report()
+        return data
+
+    def sync(self):
+        """ Add the bytes and lines read since the last sync to stats """
+        if self.closed:
+            return
+        PositionCounter.sync(self)
+        self.stats.counters['lines'] += self.lines
+        self.lines = 0
+
+    def tell(self):
+        return self.wrapped.tell()
+
+    def seek(self, offset):
+        self.sync()
+        self.wrapped.seek(offset)
+        self._synced = offset
+
+    def close(self):
+        # what was read is counted before the position is lost
+        self.sync()
+        self.closed = True
+        self.wrapped.close()
+
+
+def instrument_histories(histories, stats, kind_of, counter=None):
+    """ Count and time the histories of a parser generator
+
+    Parameters
+    ----------
+    histories : generator
+        Of PtracHistory
+    stats : ParseStats
+    kind_of : callable
+        Event kind of an event type
+    counter : PositionCounter, optional
+        Of the parsed file, synced after every history
+
+    Yields
+    ------
+    history : PtracHistory
+    """
+    counters = stats.counters
+    type_counts = defaultdict(int)
+    while True:
+        start = time.time()
+        try:
+            history = next(histories)
+        except StopIteration:
+            stats.add_time('events', time.time() - start)
+            if counter is not None:
+                counter.sync()
+            stats.report(force=True)
+            return
+        stats.add_time('events', time.time() - start)
+
+        counters['histories'] += 1
+        counters['events'] += len(history.events)
+        for event in history.events:
+            type_counts[event.type] += 1
+        for event_type, n in type_counts.items():
+            counters['events_' + kind_of(event_type)] += n
+        type_counts.clear()
+        if counter is not None:
+            counter.sync()
+        stats.report()
+        yield history
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the PTRAC and ACE readers
+"""
+import os
+
+import numpy as np
+
+
+def source_signature(filename):
+    """ Size and modification time identifying the contents of a file """
+    stat = os.stat(filename)
+    return np.array([stat.st_size, stat.st_mtime], dtype=np.float64)
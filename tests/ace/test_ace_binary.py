@@ -0,0 +1,85 @@
+import os
+import unittest
+import tempfile
+import shutil
+
+import numpy as np
+
+from mcnpy.ace import binary, reader, xsdir
+from test_ace_reader import make_table
+from test_xsdir import write_library
+
+zaids = ['92235.80c', '94239.80c', '1001.80c']
+
+
+class TestNpyTable(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        table = make_table()
+        xss_file = binary.write_npy_table(table,
+                                          os.path.join(self.tmp_dir, 'u235'))
+        self.assertTrue(xss_file.endswith('u235.npy'))
+
+        result = binary.open_npy_table(xss_file)
+        self.assertEqual(table.header, result.header)
+        self.assertIsInstance(result.xss, np.memmap)
+        np.testing.assert_array_equal(table.xss, result.xss)
+        np.testing.assert_array_equal(table.jxs, result.jxs)
+        self.assertEqual(table.cross_section(16)[0],
+                         result.cross_section(16)[0])
+
+    def test_convert_table(self):
+        source = os.path.join(self.tmp_dir, 'u235.ace')
+        table = make_table(zaid='92235.710nc')
+        table = table.__class__(
+            table.header._replace(fmtversion='2.0.0', source='ENDFB-VII.1'),
+            table.iz, table.aw, table.nxs, table.jxs, table.xss)
+        with open(source, 'w') as f:
+            reader.write_table(f, table)
+
+        target = os.path.join(self.tmp_dir, 'u235.npy')
+        binary.convert_table(source, target)
+        result = binary.open_npy_table(target, mmap_mode=None)
+        self.assertEqual('2.0.0', result.header.fmtversion)
+        self.assertEqual(table.header.comments, result.header.comments)
+        np.testing.assert_allclose(table.xss, result.xss, rtol=1e-11)
+
+
+class TestConvertXsdir(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xsdir_path, self.tables = write_library(self.tmp_dir, zaids)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_convert_xsdir(self):
+        target = os.path.join(self.tmp_dir, 'npy')
+        new_xsdir = binary.convert_xsdir(self.xsdir_path, target)
+
+        library = xsdir.open_xsdir(new_xsdir, persist=False)
+        self.assertEqual(zaids, [e.zaid for e in library.entries])
+        self.assertEqual(233.0248, library.awr[92235])
+        for expected in self.tables:
+            entry = library[expected.zaid]
+            self.assertEqual(binary.NPY_FILE_TYPE, entry.file_type)
+            self.assertTrue(entry.ptable)
+            table = library.open_table(expected.zaid)
+            self.assertIsInstance(table.xss, np.memmap)
+            np.testing.assert_allclose(expected.xss, table.xss, rtol=1e-11)
+
+    def test_subset(self):
+        target = os.path.join(self.tmp_dir, 'npy')
+        new_xsdir = binary.convert_xsdir(self.xsdir_path, target,
+                                         zaids=['1001.80c'])
+        library = xsdir.open_xsdir(new_xsdir, persist=False)
+        self.assertEqual(['1001.80c'], [e.zaid for e in library.entries])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import time
+import unittest
+import tempfile
+import shutil
+import cPickle as pickle
+from multiprocessing import Pool
+
+import numpy as np
+
+from mcnpy.ace import xsdir
+from mcnpy.ace.cache import AceTableCache
+from test_xsdir import write_library
+
+zaids = ['92235.80c', '94239.80c', '1001.80c']
+
+
+def _load_in_worker(args):
+    cache, zaid = args
+    table = cache.get(zaid)
+    return table.xss.sum(), isinstance(table.xss, np.memmap), cache.stats
+
+
+class TestAceTableCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        xsdir_path, self.tables = write_library(self.tmp_dir, zaids)
+        self.xsdir = xsdir.open_xsdir(xsdir_path, persist=False)
+        self.cache_dir = os.path.join(self.tmp_dir, 'scratch')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_hit_miss(self):
+        cache = AceTableCache(self.xsdir, self.cache_dir)
+        table = cache['92235.80c']
+        self.assertIsInstance(table.xss, np.memmap)
+        np.testing.assert_allclose(self.tables[0].xss, table.xss, rtol=1e-11)
+        self.assertIs(table, cache.get('92235.80c'))
+        self.assertEqual(dict(hits=1, attaches=0, misses=1, evictions=0),
+                         cache.stats)
+        self.assertIn('92235.80c', cache)
+        self.assertNotIn('1001.80c', cache)
+
+    def test_attach(self):
+        AceTableCache(self.xsdir, self.cache_dir).get('94239.80c')
+        other = AceTableCache(self.xsdir, self.cache_dir)
+        table = other.get('94239.80c')
+        self.assertEqual('94239.80c', table.zaid)
+        self.assertEqual(1, other.stats['attaches'])
+        self.assertEqual(0, other.stats['misses'])
+
+    def test_workers(self):
+        cache = AceTableCache(self.xsdir, self.cache_dir)
+        for zaid in zaids:
+            cache.get(zaid)
+
+        pool = Pool(2)
+        try:
+            results = pool.map(_load_in_worker, [(cache, z) for z in zaids])
+        finally:
+            pool.terminate()
+            pool.join()
+
+        for table, (total, mapped, stats) in zip(self.tables, results):
+            np.testing.assert_allclose(table.xss.sum(), total, rtol=1e-11)
+            self.assertTrue(mapped)
+            self.assertEqual(0, stats['misses'])
+
+    def test_lru_eviction(self):
+        cache = AceTableCache(self.xsdir, self.cache_dir)
+        cache.get('92235.80c')
+        cache.get('94239.80c')
+        # room for two tables, the last one is slightly larger
+        cache.max_bytes = cache.nbytes + 100
+        time.sleep(0.01)
+        cache.get('92235.80c')
+        time.sleep(0.01)
+        cache.get('1001.80c')
+
+        self.assertEqual(1, cache.stats['evictions'])
+        self.assertNotIn('94239.80c', cache)
+        self.assertIn('92235.80c', cache)
+        self.assertIn('1001.80c', cache)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+        cache.get('94239.80c')
+        self.assertEqual(4, cache.stats['misses'])
+
+    def test_clear(self):
+        cache = AceTableCache(self.xsdir, self.cache_dir)
+        cache.get('1001.80c')
+        self.assertTrue(os.path.isdir(cache.path))
+        cache.clear()
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_close(self):
+        with AceTableCache(self.xsdir) as cache:
+            cache.get('1001.80c')
+            self.assertTrue(os.path.isdir(cache.path))
+            # copies sent to workers leave the directory in place
+            worker = pickle.loads(pickle.dumps(cache))
+            worker.close()
+            self.assertTrue(os.path.isdir(cache.path))
+        self.assertFalse(os.path.exists(cache.path))
+
+        with AceTableCache(self.xsdir, self.cache_dir) as cache:
+            cache.get('1001.80c')
+        self.assertIn('1001.80c', cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,9 +9,12 @@ However for testing purposes there should be no difference
 """
 
 import unittest
+import tempfile
+import shutil
 from os import path
 import numpy as np
 
+from mcnpy import stats
 from mcnpy.ace import reader
 from tests import utils
 
@@ -19,6 +22,49 @@ ace_test_file = "../data_files/92235.710nc"
 ace_test_file_path = path.dirname(__file__) + '/' + ace_test_file
 
 
+def make_table(zaid='92235.80c', n_energies=8, awr=233.0248, temp=2.5301e-08):
+    """ Synthetic continuous-energy table with fission (18) and (n,2n) (16)
+
+    The XSS layout is ESZ, NU (polynomial), MTR, LQR, TYR, LSIG, SIG. The
+    (n,2n) cross section starts at the middle of the energy grid.
+    """
+    energy = np.logspace(-11, np.log10(20.), n_energies)
+    elastic = 10. + 1. / np.sqrt(energy)
+    fission = 1. + 5. / np.sqrt(energy)
+    n2n_start = n_energies // 2
+    n2n = np.linspace(0., 0.5, n_energies - n2n_start)
+    absorption = fission.copy()
+    total = elastic + absorption
+    total[n2n_start:] += n2n
+    heating = np.linspace(1., 2., n_energies)
+
+    esz = np.concatenate((energy, total, absorption, elastic, heating))
+    nu = np.array([1, 2, 2.4, 0.1])
+    mtr = np.array([16, 18])
+    lqr = np.array([-5.3, 193.7])
+    tyr = np.array([2, 19])
+    sig_16 = np.concatenate(([n2n_start + 1, len(n2n)], n2n))
+    sig_18 = np.concatenate(([1, n_energies], fission))
+    lsig = np.array([1, 1 + len(sig_16)])
+    blocks = [esz, nu, mtr, lqr, tyr, lsig, sig_16, sig_18]
+    xss = np.concatenate(blocks).astype(np.float64)
+
+    starts = np.cumsum([1] + [len(b) for b in blocks])
+    jxs = np.zeros(32, dtype=np.int64)
+    jxs[:7] = starts[:7]
+    jxs[21] = len(xss)
+    nxs = np.zeros(16, dtype=np.int64)
+    nxs[:5] = [len(xss), 92235, n_energies, 2, 1]
+
+    table_header = reader.header(fmtversion=None, szax=zaid, source=None,
+                                 atwgtr='%.6f' % awr, temp='%.4E' % temp,
+                                 date='12/19/12', n='1',
+                                 comments=['synthetic table%sm9228' %
+                                           (' ' * 55)])
+    return reader.AceTable(table_header, np.zeros(16, dtype=np.int64),
+                           np.zeros(16), nxs, jxs, xss)
+
+
 class TestAceReaderFilename(unittest.TestCase):
     def test_extract_substrings(self):
         string = '333444455555'
@@ -26,6 +72,12 @@ class TestAceReaderFilename(unittest.TestCase):
         result = reader.extract_substrings(string, [3, 4, 5])
         self.assertEqual(expected, result)
 
+    def test_extract_substrings_remainder(self):
+        string = '333444455555     1'
+        expected = ['333', '4444', '55555', '     1']
+        result = reader.extract_substrings(string, [3, 4, 5, -1])
+        self.assertEqual(expected, result)
+
     def test_sza_to_string(self):
         s, z, a = 1, 92, 235
         expected = '001092235'
@@ -44,6 +96,11 @@ class TestAceReaderFilename(unittest.TestCase):
         result = reader.ace_filename_to_szax(filename)
         self.assertEqual(expected, result)
 
+    def test_zaid_to_szax(self):
+        expected = (0, 92, 235, 80, 'c')
+        result = reader.ace_filename_to_szax('92235.80c')
+        self.assertEqual(expected, result)
+
 
 class TestAceReaderHeader(unittest.TestCase):
     def test_read_header(self):
@@ -63,6 +120,85 @@ class TestAceReaderHeader(unittest.TestCase):
         result = reader.read_header(test_file)
         self.assertDictEqual(expected._asdict(), result._asdict())
 
+    def test_read_legacy_header(self):
+        test_header = """\
+                       92235.80c  233.024800  2.5301E-08   12/19/12
+                      U235 ENDF71x (jlconlin)  Ref. see jlconlin (ref 09/10/2012  10:00:53)    mat9228"""
+        result = reader.read_header(utils.MockFile(test_header))
+        self.assertEqual(None, result.fmtversion)
+        self.assertEqual('92235.80c', result.szax)
+        self.assertEqual('233.024800', result.atwgtr)
+        self.assertEqual('2.5301E-08', result.temp)
+        self.assertEqual('12/19/12', result.date)
+        self.assertEqual(1, len(result.comments))
+
+
+class TestAceTable(unittest.TestCase):
+    def setUp(self):
+        self.table = make_table()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = path.join(self.tmp_dir, '92235.80c')
+        with open(self.filename, 'w') as f:
+            reader.write_table(f, self.table)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        result = reader.open_table(self.filename, lazy=False)
+        self.assertEqual(self.table.header, result.header)
+        np.testing.assert_array_equal(self.table.nxs, result.nxs)
+        np.testing.assert_array_equal(self.table.jxs, result.jxs)
+        np.testing.assert_allclose(self.table.xss, result.xss, rtol=1e-11)
+
+    def test_lazy_xss(self):
+        result = reader.open_table(self.filename)
+        self.assertFalse(result.is_loaded)
+        self.assertEqual(len(self.table.xss), len(result.xss))
+        self.assertTrue(result.is_loaded)
+
+    def test_stats(self):
+        for lazy in (False, True):
+            parse_stats = stats.ParseStats()
+            result = reader.open_table(self.filename, lazy=lazy,
+                                       stats=parse_stats)
+            self.assertEqual(lazy, 'xss' not in parse_stats.timers)
+            result.xss
+            counters = parse_stats.counters
+            self.assertEqual(1, counters['tables'])
+            self.assertEqual(len(self.table.xss), counters['values'])
+            self.assertEqual(path.getsize(self.filename), counters['bytes'])
+            self.assertEqual(['header', 'arrays', 'xss'],
+                             list(parse_stats.timers))
+
+    def test_address(self):
+        with open(self.filename, 'a') as f:
+            reader.write_table(f, make_table('94239.80c'))
+        n_lines = sum(1 for line in open(self.filename)) // 2
+        result = reader.open_table(self.filename, address=n_lines + 1)
+        self.assertEqual('94239.80c', result.zaid)
+        np.testing.assert_allclose(self.table.energy, result.energy)
+
+    def test_blocks(self):
+        table = self.table
+        self.assertEqual(8, len(table.energy))
+        self.assertTrue(np.shares_memory(table.energy, table.xss))
+        self.assertEqual([16, 18], table.mtr.tolist())
+        self.assertEqual([2, 4], [len(table.lsig), len(table.nu)])
+        self.assertEqual([1, 2, 101, 16, 18], table.reactions)
+        self.assertEqual(None, table.block('lunr'))
+
+    def test_cross_section(self):
+        start, xs = self.table.cross_section(16)
+        self.assertEqual(4, start)
+        np.testing.assert_allclose(np.linspace(0., 0.5, 4), xs)
+        start, xs = self.table.cross_section(18)
+        np.testing.assert_array_equal(self.table.absorption, xs)
+        start, xs = self.table.cross_section(2)
+        self.assertEqual(0, start)
+        np.testing.assert_array_equal(self.table.elastic, xs)
+        self.assertRaises(KeyError, self.table.cross_section, 102)
+
 #class TestAceReaderATWGTRTable(unittest.TestCase):
 #    def test_read_atwgtr_table(self):
 #        test_atwgtr_table = """\
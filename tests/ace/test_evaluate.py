@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+from mcnpy.ace import evaluate
+from test_ace_reader import make_table
+
+
+class TestGridIndex(unittest.TestCase):
+    def test_grid_index(self):
+        grid = np.array([1., 2., 4., 8.])
+        energies = np.array([0.5, 1., 1.5, 2., 7.9, 8., 9.])
+        expected = [0, 0, 0, 1, 2, 2, 2]
+        self.assertEqual(expected, evaluate.grid_index(grid, energies).tolist())
+
+    def test_hashed_grid(self):
+        grid = np.unique(np.random.RandomState(1).uniform(-11, 1.3, 5000))
+        grid = 10 ** grid
+        energies = np.concatenate((grid, 10 ** np.random.RandomState(2)
+                                   .uniform(-12, 2, 20000), [0.]))
+        hashed = evaluate.HashedGrid(grid, n_buckets=512)
+        np.testing.assert_array_equal(evaluate.grid_index(grid, energies),
+                                      hashed.index(energies))
+
+
+class TestXsEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.table = make_table(n_energies=50)
+        self.evaluator = evaluate.XsEvaluator(self.table)
+
+    def test_grid_points(self):
+        energy = self.table.energy
+        np.testing.assert_allclose(self.table.total,
+                                   self.evaluator(energy, 1))
+        np.testing.assert_allclose(self.table.elastic,
+                                   self.evaluator.evaluate(energy, 2))
+
+    def test_lin_lin(self):
+        energy = self.table.energy
+        middle = (energy[:-1] + energy[1:]) / 2
+        expected = (self.table.total[:-1] + self.table.total[1:]) / 2
+        np.testing.assert_allclose(expected, self.evaluator(middle))
+
+    def test_log_log(self):
+        evaluator = evaluate.XsEvaluator(self.table, 'log-log')
+        energy = self.table.energy
+        middle = np.sqrt(energy[:-1] * energy[1:])
+        fission = self.table.cross_section(18)[1]
+        expected = np.sqrt(fission[:-1] * fission[1:])
+        np.testing.assert_allclose(expected, evaluator(middle, 18))
+        self.assertRaises(ValueError, evaluate.XsEvaluator, self.table, 'lin')
+
+    def test_threshold(self):
+        start, n2n = self.table.cross_section(16)
+        energy = self.table.energy
+        xs = self.evaluator(energy, 16)
+        self.assertTrue(np.all(xs[:start] == 0))
+        np.testing.assert_allclose(n2n, xs[start:])
+
+    def test_out_of_range(self):
+        xs = self.evaluator(np.array([1e-13, 100.]))
+        np.testing.assert_allclose(self.table.total[[0, -1]], xs)
+
+    def test_evaluate_many(self):
+        energies = 10 ** np.random.RandomState(3).uniform(-11, 1.3, 1000)
+        hashed = evaluate.XsEvaluator(self.table, hashed=True, n_buckets=64)
+        result = hashed.evaluate_many(energies)
+        self.assertEqual(sorted(self.table.reactions), sorted(result))
+        for mt, xs in result.items():
+            np.testing.assert_allclose(self.evaluator(energies, mt), xs)
+        np.testing.assert_allclose(result[1], result[2] + result[101] +
+                                   result[16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import tempfile
+import shutil
+
+import numpy as np
+
+from mcnpy.ace import evaluate, xsdir
+from mcnpy.ace.material import Material
+from test_xsdir import write_library
+
+zaids = ['92235.80c', '94239.80c', '1001.80c']
+densities = [0.02, 0.001, 0.05]
+
+
+class TestMaterial(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        xsdir_path, self.tables = write_library(self.tmp_dir, zaids)
+        self.xsdir = xsdir.open_xsdir(xsdir_path, persist=False)
+        self.energies = 10 ** np.random.RandomState(4).uniform(-12, 1.5, 5000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def expected(self, mt):
+        xs = np.zeros(len(self.energies))
+        for table, density in zip(self.tables, densities):
+            if mt in table.reactions:
+                xs += density * evaluate.XsEvaluator(table)(self.energies, mt)
+        return xs
+
+    def test_union_grid(self):
+        material = Material(self.tables, densities)
+        grid = np.unique(np.concatenate([t.energy for t in self.tables]))
+        np.testing.assert_array_equal(grid, material.grid)
+        self.assertEqual((3, len(grid)), material.index_map.shape)
+
+    def test_macroscopic(self):
+        material = Material.from_xsdir(self.xsdir, zip(zaids, densities),
+                                       batch_size=1000)
+        result = material.macroscopic_many(self.energies, [1, 2, 16])
+        for mt in (1, 2, 16):
+            np.testing.assert_allclose(self.expected(mt), result[mt])
+        np.testing.assert_allclose(self.expected(18),
+                                   material.macroscopic(self.energies, 18))
+
+    def test_microscopic(self):
+        material = Material(self.tables, densities)
+        xs = material.microscopic(self.energies, 2)
+        for i, table in enumerate(self.tables):
+            np.testing.assert_allclose(
+                evaluate.XsEvaluator(table)(self.energies, 2), xs[i])
+
+    def test_double_indexing(self):
+        material = Material(self.tables, densities, hashed=True,
+                            double_indexing=True, stride=3)
+        self.assertEqual(3, material.stride)
+        np.testing.assert_allclose(self.expected(1),
+                                   material.macroscopic(self.energies))
+
+    def test_memory_limit(self):
+        full = Material(self.tables, densities)
+        self.assertRaises(MemoryError, Material, self.tables, densities,
+                          memory_limit=full.nbytes - 1)
+        material = Material(self.tables, densities, double_indexing=True,
+                            memory_limit=full.grid.nbytes + 24)
+        self.assertLessEqual(material.nbytes, full.grid.nbytes + 24)
+        self.assertEqual(16, material.stride)
+        np.testing.assert_allclose(self.expected(1),
+                                   material.macroscopic(self.energies))
+
+
+if __name__ == '__main__':
+    unittest.main()
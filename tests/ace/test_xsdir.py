@@ -0,0 +1,151 @@
+import unittest
+import tempfile
+import shutil
+from os import path
+from StringIO import StringIO
+
+import numpy as np
+
+from mcnpy.ace import reader, xsdir
+from tests import utils
+from test_ace_reader import make_table
+
+xsdir_test_file_path = path.dirname(__file__) + '/../data_files/xsdir'
+
+
+def write_library(directory, zaids, library='lib.ace'):
+    """ Concatenate synthetic tables into one library with its xsdir
+
+    Returns
+    -------
+    xsdir_path : str
+    tables : list
+        AceTable written for each zaid
+    """
+    tables = []
+    lines = ['atomic weight ratios',
+             '  92235  233.024800  94239  236.998600',
+             'directory']
+    address = 1
+    with open(path.join(directory, library), 'w') as f:
+        for i, zaid in enumerate(zaids):
+            table = make_table(zaid, n_energies=8 + i)
+            reader.write_table(f, table)
+            n_lines = 12 + (table.nxs[0] + 3) // 4
+            lines.append('%s %s %s 0 1 %d %d 0 0 %s +' %
+                         (zaid, table.header.atwgtr, library, address,
+                          table.nxs[0], table.header.temp))
+            lines.append('     ptable')
+            address += n_lines
+            tables.append(table)
+
+    xsdir_path = path.join(directory, 'xsdir')
+    with open(xsdir_path, 'w') as f:
+        f.write('datapath=%s\n' % directory)
+        f.write('\n'.join(lines) + '\n')
+    return xsdir_path, tables
+
+
+class TestXsdirParse(unittest.TestCase):
+    def setUp(self):
+        self.xsdir = xsdir.open_xsdir(xsdir_test_file_path, persist=False)
+
+    def test_entries(self):
+        self.assertEqual(423, len(self.xsdir))
+        entry = self.xsdir['11022.72c']
+        expected = xsdir.xsdir_entry(
+            zaid='11022.72c', awr=21.8055, filename='Na_022_300K.ace',
+            access=None, file_type=1, address=1, table_length=18551,
+            record_length=0, entries=0, temperature=2.585E-08, ptable=True)
+        self.assertEqual(expected, entry)
+        self.assertFalse(self.xsdir['1001.72c'].ptable)
+        self.assertNotIn('1001.80c', self.xsdir)
+
+    def test_find(self):
+        entry = self.xsdir.find(92, 235, 2.585e-08)
+        self.assertEqual('92235.72c', entry.zaid)
+        self.assertEqual(entry, self.xsdir.find(92, 235))
+        self.assertEqual([entry], self.xsdir.by_zat[(92, 235, 2.585e-08)])
+        self.assertRaises(KeyError, self.xsdir.find, 92, 235, lib_id='nc')
+        self.assertRaises(KeyError, self.xsdir.find, 1, 4)
+
+    def test_sections(self):
+        text = """\
+            datapath = /opt/data
+            atomic weight ratios
+              1001   0.999167   1002   1.996800
+              92235  233.024800
+            directory
+            1001.80c 0.999167 endf80/H1 0 1 5 8177 +
+                     0 0 2.5301E-08
+            """
+        datapath, awr, entries = xsdir.read_xsdir(utils.MockFile(text))
+        self.assertEqual('/opt/data', datapath)
+        self.assertEqual({1001: 0.999167, 1002: 1.9968, 92235: 233.0248}, awr)
+        self.assertEqual(1, len(entries))
+        self.assertEqual(5, entries[0].address)
+        self.assertEqual(2.5301e-08, entries[0].temperature)
+
+    def test_write_xsdir(self):
+        output = StringIO()
+        xsdir.write_xsdir(output, self.xsdir.entries, {1001: 0.999167},
+                          '/data')
+        output.seek(0)
+        self.assertEqual(('/data', {1001: 0.999167}, self.xsdir.entries),
+                         xsdir.read_xsdir(output))
+
+
+class TestXsdirTables(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xsdir_path, self.tables = write_library(
+            self.tmp_dir, ['92235.80c', '94239.80c', '1001.80c'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_open_table(self):
+        library = xsdir.open_xsdir(self.xsdir_path, persist=False)
+        for expected in self.tables:
+            table = library.open_table(expected.zaid)
+            self.assertEqual(expected.zaid, table.zaid)
+            np.testing.assert_allclose(expected.xss, table.xss, rtol=1e-11)
+        self.assertEqual(3, len(library.offsets))
+
+    def test_thermal_table(self):
+        xsdir_path, tables = write_library(self.tmp_dir,
+                                           ['lwtr.20t', '1001.80c'])
+        library = xsdir.open_xsdir(xsdir_path, persist=False)
+        self.assertEqual(2, len(library))
+        self.assertEqual('lwtr.20t', library.open_table('lwtr.20t').zaid)
+        self.assertEqual('1001.80c', library.find(1, 1).zaid)
+        self.assertEqual('1001.80c', library.find(1, 1, lib_id='c').zaid)
+        self.assertRaises(KeyError, library.find, 1, 1, lib_id='t')
+        self.assertEqual([(1, 1)], library._by_za.keys())
+
+    def test_persist(self):
+        library = xsdir.open_xsdir(self.xsdir_path)
+        self.assertTrue(path.exists(xsdir.index_filename(self.xsdir_path)))
+        library.open_table('94239.80c')
+
+        loaded = xsdir.open_xsdir(self.xsdir_path)
+        self.assertEqual(library.entries, loaded.entries)
+        self.assertEqual(library.offsets, loaded.offsets)
+        self.assertEqual(233.0248, loaded.awr[92235])
+
+        loaded.open_table('1001.80c')
+        self.assertEqual(2, len(xsdir.open_xsdir(self.xsdir_path).offsets))
+        self.assertEqual({}, xsdir.open_xsdir(self.xsdir_path,
+                                              persist=False).offsets)
+
+    def test_stale_index(self):
+        xsdir.open_xsdir(self.xsdir_path)
+        with open(self.xsdir_path, 'a') as f:
+            f.write('1002.80c 1.9968 H2 0 1 1 10 0 0 2.5301E-08\n')
+        self.assertIsNone(xsdir.Xsdir.load(
+            xsdir.index_filename(self.xsdir_path), self.xsdir_path))
+        self.assertIn('1002.80c', xsdir.open_xsdir(self.xsdir_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
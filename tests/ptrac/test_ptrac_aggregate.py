@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+
+from mcnpy.ptrac import aggregate, reader
+from test_ptrac_reader import ptrac_test_file_path
+
+EDGES = np.logspace(-3, 1.5, 10)
+
+
+def queries():
+    return [aggregate.GroupBy(('ncl', 'ntyn'), event_types=['col']),
+            aggregate.GroupBy(('nter',), value='wgt', event_types=['ter']),
+            aggregate.GroupBy((), value='wgt'),
+            aggregate.Histogram('erg', EDGES, by=('ncl',), weight='wgt',
+                                event_types=['col'])]
+
+
+class TestAggregate(unittest.TestCase):
+    def setUp(self):
+        self.ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+
+    def test_group_by(self):
+        by_cell, by_nter, total, spectra = aggregate.aggregate(
+            self.ptrac.parse_event(), queries())
+        self.assertEqual(88, by_cell.n_histories)
+
+        col = self.arrays['col']
+        groups = by_cell.to_array()
+        self.assertEqual(len(col), groups['count'].sum())
+        for group in groups:
+            mask = (col['ncl'] == group['ncl']) & \
+                (col['ntyn'] == group['ntyn'])
+            self.assertEqual(mask.sum(), group['count'])
+
+        ter = self.arrays['ter']
+        for nter in np.unique(ter['nter']):
+            mask = ter['nter'] == nter
+            self.assertEqual(mask.sum(), by_nter.counts[(nter,)])
+            self.assertAlmostEqual(ter['wgt'][mask].sum(),
+                                   by_nter.sums[(nter,)])
+        self.assertEqual(636, total.counts[()])
+
+        keys, bins = spectra.to_array()
+        for key, row in zip(keys, bins):
+            mask = col['ncl'] == key[0]
+            expected = np.histogram(col['erg'][mask], EDGES,
+                                    weights=col['wgt'][mask])[0]
+            np.testing.assert_allclose(expected, row)
+            np.testing.assert_allclose(expected, spectra.histogram(key))
+        inside = (col['erg'] >= EDGES[0]) & (col['erg'] <= EDGES[-1])
+        self.assertEqual((~inside).sum(), spectra.outside)
+        np.testing.assert_array_equal(np.zeros(9), spectra.histogram((-1,)))
+
+    def test_merge(self):
+        whole = aggregate.aggregate(self.ptrac.parse_event(), queries())
+
+        first, second = queries(), [q.empty() for q in queries()]
+        histories = list(reader.PtracReader(ptrac_test_file_path)
+                         .parse_event())
+        aggregate.aggregate(histories[:40], first)
+        aggregate.aggregate(histories[40:], second)
+        for merged, other, expected in zip(first, second, whole):
+            merged += other
+            self.assertEqual(88, merged.n_histories)
+            self.assertEqual(str(expected), str(merged))
+        self.assertEqual(whole[0].counts, first[0].counts)
+        np.testing.assert_allclose(whole[3].to_array()[1],
+                                   first[3].to_array()[1])
+
+        self.assertRaises(ValueError, first[0].merge, first[1])
+        self.assertRaises(ValueError, first[3].merge,
+                          aggregate.Histogram('erg', EDGES[:5]))
+
+    def test_aggregate_parallel(self):
+        whole = aggregate.aggregate(self.ptrac.parse_event(), queries())
+        parallel = aggregate.aggregate_parallel(
+            reader.PtracReader(ptrac_test_file_path), queries(), workers=2,
+            n_chunks=5)
+        for expected, result in zip(whole, parallel):
+            self.assertEqual(88, result.n_histories)
+            self.assertEqual(str(expected), str(result))
+        self.assertEqual(whole[0].counts, parallel[0].counts)
+        self.assertEqual(whole[1].counts, parallel[1].counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil
+import tempfile
+from os import path
+import numpy as np
+
+from mcnpy.ptrac import reader, cache
+from test_ptrac_reader import ptrac_test_file_path
+
+
+class TestPtracCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ptrac_path = path.join(self.tmp_dir, 'ptrac')
+        shutil.copy(ptrac_test_file_path, self.ptrac_path)
+        self.arrays = reader.PtracReader(self.ptrac_path).to_arrays()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_arrays(self, result):
+        for kind in self.arrays:
+            self.assertTrue(np.array_equal(self.arrays[kind], result[kind]))
+
+    def test_write_and_load(self):
+        ptrac_cache = cache.PtracCache.for_file(self.ptrac_path)
+        self.assertFalse(ptrac_cache.is_valid(self.ptrac_path))
+
+        self.check_arrays(reader.PtracReader(self.ptrac_path,
+                                             cache=True).to_arrays())
+        self.assertTrue(ptrac_cache.is_valid(self.ptrac_path))
+
+        ptrac = reader.PtracReader(self.ptrac_path, cache=True)
+        self.assertEqual(str(reader.PtracReader(self.ptrac_path).event_format),
+                         str(ptrac.event_format))
+        result = ptrac.to_arrays()
+        self.assertIsInstance(result['col'], np.memmap)
+        self.check_arrays(result)
+
+        histories = list(ptrac.parse_event())
+        self.assertEqual(88, len(histories))
+
+    def test_cache_dir(self):
+        cache_dir = path.join(self.tmp_dir, 'caches')
+        ptrac = reader.PtracReader(self.ptrac_path, cache=True,
+                                   cache_dir=cache_dir)
+        self.check_arrays(ptrac.parse_parallel(workers=2))
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+        self.assertTrue(ptrac.cache.is_valid(self.ptrac_path))
+
+    def test_invalidation(self):
+        reader.PtracReader(self.ptrac_path, cache=True).to_arrays()
+        ptrac_cache = cache.PtracCache.for_file(self.ptrac_path)
+
+        with open(self.ptrac_path, 'a') as f:
+            f.write('\n')
+        self.assertFalse(ptrac_cache.is_valid(self.ptrac_path))
+        ptrac = reader.PtracReader(self.ptrac_path, cache=True)
+        self.check_arrays(ptrac.to_arrays())
+        self.assertTrue(ptrac_cache.is_valid(self.ptrac_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import shutil
+import tempfile
+import threading
+from os import path
+
+from mcnpy.mcnp_wrapper import McnpProcess
+from mcnpy.ptrac import reader, follow
+from tests import utils
+from test_ptrac_reader import ptrac_test_file_path
+
+
+def history_tuples(histories):
+    return [(h.nps, [(e.type, e.erg) for e in h.events]) for h in histories]
+
+
+class TestPtracFollow(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ptrac_path = path.join(self.tmp_dir, 'ptrac')
+        with open(ptrac_test_file_path, 'r') as f:
+            self.text = f.read()
+        self.expected = history_tuples(
+            reader.PtracReader(ptrac_test_file_path).parse_event())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode='a'):
+        with open(self.ptrac_path, mode) as f:
+            f.write(text)
+
+    def test_tail_partial_lines(self):
+        self.write('first\nsec')
+        written = []
+
+        def wait(interval):
+            # complete the line on the first wait
+            if not written:
+                written.append(True)
+                self.write('ond\n')
+
+        tail = follow.TailFile(self.ptrac_path, idle_timeout=0.05, wait=wait)
+        self.assertEqual('first\n', tail.readline())
+        self.assertEqual('second\n', tail.readline())
+        self.assertEqual('', tail.readline())
+        self.assertTrue(tail.stopped)
+        tail.close()
+
+    def test_follow_growing_file(self):
+        self.write('', 'w')
+        chunks = [self.text[i:i+997] for i in xrange(0, len(self.text), 997)]
+        finished = threading.Event()
+
+        def writer():
+            for chunk in chunks:
+                self.write(chunk)
+            finished.set()
+
+        ptrac = reader.PtracReader(self.ptrac_path, parse_on_init=False)
+        thread = threading.Thread(target=writer)
+        thread.start()
+        histories = ptrac.follow(poll_interval=0.001, stop=finished.is_set)
+        followed = history_tuples(histories)
+        thread.join()
+
+        self.assertEqual(88, len(followed))
+        self.assertEqual(self.expected, followed)
+
+    def test_follow_mcnp_process(self):
+        # McnpProcess.done is a property, stop has to call it
+        self.write(self.text, 'w')
+        process = McnpProcess('ok\n', tempfile.mkdtemp(dir=self.tmp_dir),
+                              executable=utils.write_stub_mcnp(self.tmp_dir))
+        ptrac = reader.PtracReader(self.ptrac_path)
+        followed = history_tuples(ptrac.follow(poll_interval=0.01,
+                                               stop=lambda: process.done))
+        self.assertTrue(process.done)
+        self.assertEqual(self.expected, followed)
+
+    def test_yield_on_terminator(self):
+        # the second history is only written after the first is yielded
+        lines = self.text.splitlines(True)
+        first_end = 9 + 1 + 2 * len(self.expected[0][1])
+        self.write(''.join(lines[:first_end]) + lines[first_end][:5], 'w')
+
+        ptrac = reader.PtracReader(self.ptrac_path)
+        histories = ptrac.follow(poll_interval=0.001, idle_timeout=0.5)
+        self.assertEqual(self.expected[0], history_tuples([next(histories)])[0])
+
+        self.write(lines[first_end][5:] + ''.join(lines[first_end+1:]))
+        self.assertEqual(self.expected[1:], history_tuples(histories))
+
+    def test_truncated_history(self):
+        lines = self.text.splitlines(True)
+        self.write(''.join(lines[:9 + 2 * 20]), 'w')
+        ptrac = reader.PtracReader(self.ptrac_path)
+        followed = list(ptrac.follow(poll_interval=0.001, idle_timeout=0.01))
+        self.assertTrue(0 < len(followed) < 88)
+        self.assertEqual(self.expected[:len(followed)],
+                         history_tuples(followed))
+
+    def test_cut_lines(self):
+        lines = self.text.splitlines(True)
+        first_end = 9 + 1 + 2 * len(self.expected[0][1])
+        # cut in the 9000 of the last event line, before the float line of
+        # the last event and in the NPS line of the next history
+        for end, cut in ((first_end - 2, 5), (first_end - 1, None),
+                         (first_end, 5)):
+            text = ''.join(lines[:end])
+            if cut is not None:
+                text += lines[end][:cut]
+            self.write(text, 'w')
+            ptrac = reader.PtracReader(self.ptrac_path)
+            followed = list(ptrac.follow(poll_interval=0.001,
+                                         stop=lambda: True))
+            expected = self.expected[:1] if end == first_end else []
+            self.assertEqual(expected, history_tuples(followed))
+
+        tail = follow.TailFile(self.ptrac_path, stop=lambda: True)
+        self.assertEqual(lines[0], tail.readline())
+        tail.seek(len(text) - 5)
+        self.assertEqual('', tail.readline())
+        self.assertTrue(tail.truncated)
+        tail.close()
+
+    def test_follow_selection(self):
+        self.write(self.text, 'w')
+        ptrac = reader.PtracReader(self.ptrac_path)
+        followed = list(ptrac.follow(idle_timeout=0, event_types=['col'],
+                                     skip_empty=True))
+        self.assertEqual(81, sum(len(h.events) for h in followed))
+
+
+if __name__ == '__main__':
+    unittest.main()
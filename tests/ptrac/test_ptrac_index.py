@@ -0,0 +1,67 @@
+import unittest
+import shutil
+import tempfile
+from os import path
+
+from mcnpy.ptrac import reader, index
+from test_ptrac_reader import ptrac_test_file_path, ascii_to_binary
+
+
+class TestPtracIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ptrac_path = path.join(self.tmp_dir, 'ptrac')
+        shutil.copy(ptrac_test_file_path, self.ptrac_path)
+        self.histories = list(reader.PtracReader(self.ptrac_path).parse_event())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build_index(self):
+        ptrac = reader.PtracReader(self.ptrac_path)
+        ptrac_index = ptrac.build_index()
+        self.assertEqual(88, len(ptrac_index))
+        self.assertEqual([h.nps for h in self.histories],
+                         ptrac_index.nps.tolist())
+        self.assertEqual([len(h.events) for h in self.histories],
+                         ptrac_index.n_events.tolist())
+        self.assertTrue(path.exists(index.index_filename(self.ptrac_path)))
+
+    def test_load_index(self):
+        reader.PtracReader(self.ptrac_path).build_index()
+        filename = index.index_filename(self.ptrac_path)
+        loaded = index.PtracIndex.load(filename, self.ptrac_path)
+        self.assertEqual(88, len(loaded))
+
+        with open(self.ptrac_path, 'a') as f:
+            f.write('\n')
+        self.assertIsNone(index.PtracIndex.load(filename, self.ptrac_path))
+
+    def test_get_history(self):
+        ptrac = reader.PtracReader(self.ptrac_path)
+        for history in (self.histories[41], self.histories[0],
+                        self.histories[-1]):
+            self.assertEqual(str(history), str(ptrac.get_history(history.nps)))
+        self.assertRaises(KeyError, ptrac.get_history, -1)
+
+    def test_histories(self):
+        ptrac = reader.PtracReader(self.ptrac_path)
+        for positions, expected in ((slice(10, 20), range(10, 20)),
+                                    (slice(None, None, 7), range(0, 88, 7)),
+                                    ([3, 2, 50], [3, 2, 50])):
+            result = [str(h) for h in ptrac.histories(positions)]
+            self.assertEqual([str(self.histories[i]) for i in expected],
+                             result)
+
+    def test_binary_get_history(self):
+        binary_path = path.join(self.tmp_dir, 'ptrac.bin')
+        ascii_to_binary(self.ptrac_path, binary_path)
+        ptrac = reader.PtracReader(binary_path)
+        history = self.histories[17]
+        self.assertEqual(str(history), str(ptrac.get_history(history.nps)))
+        self.assertEqual([str(h) for h in self.histories[5:9]],
+                         [str(h) for h in ptrac.histories(slice(5, 9))])
+
+
+if __name__ == '__main__':
+    unittest.main()
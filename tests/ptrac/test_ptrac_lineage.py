@@ -0,0 +1,128 @@
+import unittest
+
+import numpy as np
+
+from mcnpy.ptrac import lineage, reader
+from test_ptrac_reader import ptrac_test_file_path
+
+
+def reference_parents(filename):
+    """ Parent track of every track from a loop over the histories """
+    parents = []
+    for history in reader.PtracReader(filename).parse_event():
+        first = len(parents)
+        track = first - 1
+        creators = []
+        for event in history.events:
+            kind = event.type // 1000
+            position = (event.xxx, event.yyy, event.zzz)
+            if kind in (1, 2):
+                track += 1
+                parent = -1
+                if kind == 2:
+                    matches = [t for p, t in creators if p == position]
+                    parent = matches[-1] if matches else first
+                parents.append(parent)
+            if kind in (1, 3, 4):
+                creators.append((position, track))
+    return np.array(parents)
+
+
+def event_arrays(events):
+    """ Columnar arrays of (kind, type, x) events of one history """
+    dtype = [('nps', np.int64), ('index', np.int64), ('type', np.int64),
+             ('xxx', np.float64), ('yyy', np.float64), ('zzz', np.float64)]
+    arrays = {}
+    for kind in reader.EVENT_KINDS:
+        rows = [(1, i, type_, x, 0., 0.) for i, (k, type_, x) in
+                enumerate(events) if k == kind]
+        arrays[kind] = np.array(rows, dtype=dtype)
+    return arrays
+
+
+class TestLineageTree(unittest.TestCase):
+    def setUp(self):
+        self.arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+        self.tree = lineage.LineageTree(self.arrays)
+
+    def test_tracks(self):
+        tree = self.tree
+        self.assertEqual(185, len(tree.parent))
+        self.assertEqual(88, len(tree.history_nps))
+        np.testing.assert_array_equal(reference_parents(ptrac_test_file_path),
+                                      tree.parent)
+        np.testing.assert_array_equal(tree.event_track[tree.track_end],
+                                      np.arange(185))
+        self.assertTrue((tree.parent < np.arange(185)).all())
+
+        # nbranch numbers the tracks of each history
+        local = np.arange(185) - np.repeat(tree.history_offsets[:-1],
+                                           np.diff(tree.history_offsets))
+        np.testing.assert_array_equal(local + 1, tree.branch)
+
+        tracks = tree.history_tracks(11)
+        np.testing.assert_array_equal([1000, 2000] + [2007] * 5,
+                                      tree.track_type[tracks])
+        np.testing.assert_array_equal([-1, 0, 1, 1, 1, 1, 1],
+                                      tree.local_parent[tracks])
+        np.testing.assert_array_equal([0, 1, 2, 2, 2, 2, 2],
+                                      tree.depth[tracks])
+        self.assertRaises(KeyError, tree.history_tracks, 1000)
+
+    def test_queries(self):
+        tree = self.tree
+        fission = tree.created_by('col', lambda col: col['ntyn'] == 18)
+        np.testing.assert_array_equal(tree.track_type == 2007, fission)
+        np.testing.assert_array_equal(fission, tree.descendants_of(
+            'col', lambda col: col['ntyn'] == 18))
+
+        sources = tree.track_type == 1000
+        np.testing.assert_array_equal(~sources, tree.descendants(sources))
+        np.testing.assert_array_equal(~sources, tree.descendants_of('src') |
+                                      tree.descendants_of('col'))
+        np.testing.assert_array_equal(tree.depth == 2,
+                                      tree.descendants(tree.depth == 1))
+
+        ter = tree.track_events(fission, 'ter')
+        self.assertEqual(14, ter.sum())
+        self.assertTrue((self.arrays['ter']['nbranch'][ter] > 1).all())
+
+    def test_surface_banks(self):
+        # weight window splits at two surfaces, the second one by the split
+        arrays = event_arrays([('src', 1000, 0.), ('sur', 3000, 1.),
+                               ('col', 4000, 2.), ('ter', 5000, 2.),
+                               ('bnk', 2003, 1.), ('sur', 3000, 3.),
+                               ('ter', 5000, 4.), ('bnk', 2003, 3.),
+                               ('ter', 5000, 5.)])
+        tree = lineage.LineageTree(arrays)
+        np.testing.assert_array_equal([-1, 0, 1], tree.parent)
+        np.testing.assert_array_equal([-1, 1, 5], tree.parent_event)
+        np.testing.assert_array_equal([0, 1, 2], tree.depth)
+        np.testing.assert_array_equal([False, False, True],
+                                      tree.descendants([1]))
+
+    def test_deep_tree(self):
+        # chain of 1000 tracks with a second child on every track
+        parent = np.concatenate(([-1], np.arange(999), np.arange(1000)))
+        depth = lineage._accumulate(parent, (parent >= 0).astype(int),
+                                    np.add)
+        expected = np.concatenate((np.arange(1000), np.arange(1000) + 1))
+        np.testing.assert_array_equal(expected, depth)
+
+        marked = np.zeros(2000, dtype=bool)
+        marked[[500, 1000 + 700]] = True
+        edges = np.zeros(2000, dtype=bool)
+        edges[1:] = marked[parent[1:]]
+        below = lineage._accumulate(parent, edges, np.logical_or)
+        np.testing.assert_array_equal(expected > 500, below)
+
+    def test_parallel(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        tree = lineage.LineageTree(ptrac.parse_parallel(workers=2))
+        np.testing.assert_array_equal(self.tree.parent, tree.parent)
+        np.testing.assert_array_equal(self.tree.parent_event,
+                                      tree.parent_event)
+
+
+if __name__ == '__main__':
+    unittest.main()
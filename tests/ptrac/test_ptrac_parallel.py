@@ -0,0 +1,64 @@
+import unittest
+import shutil
+import tempfile
+from os import path
+import numpy as np
+
+from mcnpy.ptrac import reader, parallel
+from test_ptrac_reader import ptrac_test_file_path, ascii_to_binary
+
+
+class TestPtracParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.binary_path = path.join(cls.tmp_dir, 'ptrac.bin')
+        ascii_to_binary(ptrac_test_file_path, cls.binary_path)
+        cls.arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_find_history_start(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        with open(ptrac_test_file_path) as f:
+            for offset in (ptrac.events_offset + 1, 5000, 20000, 60000):
+                start = parallel.find_history_start(f, offset,
+                                                    ptrac.event_format)
+                f.seek(start)
+                nps_line = f.readline()
+                self.assertTrue(parallel.is_nps_line(nps_line,
+                                                     ptrac.event_format))
+                self.assertIn(int(nps_line.split()[0]),
+                              self.arrays['nps']['nps'])
+
+    def test_split_events(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        ranges = parallel.split_events(ptrac, 7)
+        self.assertEqual(ptrac.events_offset, ranges[0][0])
+        self.assertEqual(path.getsize(ptrac_test_file_path), ranges[-1][1])
+        for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]):
+            self.assertEqual(end, start)
+
+    def check_arrays(self, result):
+        for kind in self.arrays:
+            self.assertTrue(np.array_equal(self.arrays[kind], result[kind]))
+
+    def test_parse_parallel(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.check_arrays(ptrac.parse_parallel(workers=3))
+
+    def test_parse_parallel_binary(self):
+        ptrac = reader.PtracReader(self.binary_path)
+        self.check_arrays(ptrac.parse_parallel(workers=2))
+
+    def test_parse_parallel_histories(self):
+        expected = reader.PtracReader(ptrac_test_file_path).parse_event()
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        result = ptrac.parse_parallel(workers=2, histories=True)
+        self.assertEqual([str(h) for h in expected], [str(h) for h in result])
+
+
+if __name__ == '__main__':
+    unittest.main()
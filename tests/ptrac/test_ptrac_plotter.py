@@ -0,0 +1,85 @@
+import unittest
+import shutil
+import tempfile
+from os import path
+
+import numpy as np
+
+from mcnpy.ptrac import reader, plotter
+from test_ptrac_reader import ptrac_test_file_path
+
+
+class TestPtracPlotter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+        self.points, self.types, self.nps = plotter.event_points(self.arrays)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_event_points(self):
+        self.assertEqual((636, 3), self.points.shape)
+        history = next(reader.PtracReader(ptrac_test_file_path).parse_event())
+        n = len(history.events)
+        self.assertEqual([e.type for e in history.events],
+                         self.types[:n].tolist())
+        self.assertEqual([[e.xxx, e.yyy, e.zzz] for e in history.events],
+                         self.points[:n].tolist())
+
+        points, types, nps = plotter.event_points(self.arrays, ['col'])
+        self.assertEqual(81, len(points))
+        self.assertTrue(np.all(types == 4000))
+
+    def test_track_segments(self):
+        segments = plotter.track_segments(self.points, self.types, self.nps)
+        # every event but the last of each history and the terminations
+        n_last = len(np.unique(self.nps))
+        terminated = (self.types // 1000 == 5) & \
+            np.append(self.nps[1:] == self.nps[:-1], False)
+        self.assertEqual(636 - n_last - terminated.sum(), len(segments))
+        np.testing.assert_array_equal(self.points[0], segments[0, 0])
+        np.testing.assert_array_equal(self.points[1], segments[0, 1])
+
+    def test_sample_histories(self):
+        kept = plotter.sample_histories(self.nps, 100, seed=1)
+        self.assertTrue(0 < kept.sum() <= 100)
+        for nps in np.unique(self.nps[kept]):
+            self.assertTrue(np.all(kept[self.nps == nps]))
+        self.assertTrue(plotter.sample_histories(self.nps, 1000).all())
+
+    def test_bin_events(self):
+        segments = plotter.track_segments(self.points, self.types, self.nps)
+        points, types, counts, binned, segment_counts = plotter.bin_events(
+            self.points, self.types, segments, 50)
+        self.assertTrue(len(points) <= 50)
+        self.assertTrue(len(binned) <= 50)
+        self.assertEqual(636, counts.sum())
+        self.assertEqual(len(segments), segment_counts.sum())
+        self.assertEqual(set(self.types // 1000), set(types // 1000))
+
+    def test_plot_arrays_headless(self):
+        for thinning in ('sample', 'bin'):
+            filename = path.join(self.tmp_dir, thinning + '.png')
+            ax = plotter.plot_arrays(self.arrays, max_artists=200,
+                                     thinning=thinning, filename=filename,
+                                     dpi=50, seed=0)
+            self.assertTrue(path.getsize(filename) > 0)
+            self.assertEqual(1, len(ax.collections[1:]))
+            self.assertTrue(len(ax.collections[1].get_offsets()) <= 200)
+
+        self.assertRaises(ValueError, plotter.plot_arrays, self.arrays,
+                          thinning='grid')
+
+    def test_negative_bank_types(self):
+        # MCNP writes negative types for banks of some particles
+        self.arrays['bnk']['type'] *= -1
+        filename = path.join(self.tmp_dir, 'bnk.png')
+        ax = plotter.plot_arrays(self.arrays, event_types=['bnk'],
+                                 filename=filename, dpi=50)
+        self.assertEqual(len(self.arrays['bnk']),
+                         len(ax.collections[1].get_offsets()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import unittest
+import pickle
+import shutil
+import tempfile
+from os import path
+import numpy as np
+
+from mcnpy.ptrac import reader, binary
+
+ptrac_test_file = "../data_files/ptrac"
+ptrac_test_file_path = path.dirname(__file__) + '/' + ptrac_test_file
+
+
+class TestPtracEventFormat(unittest.TestCase):
+    def setUp(self):
+        self.ptrac = reader.PtracReader(ptrac_test_file_path)
+
+    def test_event_kind(self):
+        self.assertEqual('src', reader.event_kind(1000))
+        self.assertEqual('bnk', reader.event_kind(2007))
+        self.assertEqual('ter', reader.event_kind(5000.0))
+        self.assertRaises(ValueError, reader.event_kind, 9000)
+
+    def test_dtype(self):
+        dtype = self.ptrac.event_format.dtype('sur')
+        expected = ('nps', 'index', 'type', 'node', 'nsf', 'angsrf', 'ncl',
+                    'mat', 'ncp', 'xxx', 'yyy', 'zzz', 'uuu', 'vvv', 'www',
+                    'erg', 'wgt', 'tme')
+        self.assertEqual(expected, dtype.names)
+        self.assertEqual(np.int32, dtype['ncl'].type)
+        self.assertEqual(np.float64, dtype['erg'].type)
+
+
+class TestPtracColumnar(unittest.TestCase):
+    def setUp(self):
+        self.arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+
+    def test_event_counts(self):
+        counts = dict((k, len(v)) for k, v in self.arrays.items())
+        expected = {'nps': 88, 'src': 88, 'bnk': 97, 'sur': 185, 'col': 81,
+                    'ter': 185}
+        self.assertDictEqual(expected, counts)
+        self.assertEqual(636, self.arrays['nps']['n_events'].sum())
+
+    def test_matches_event_objects(self):
+        histories = list(reader.PtracReader(ptrac_test_file_path).parse_event())
+        events = [(h.nps, ev) for h in histories for ev in h.events]
+        self.assertEqual([h.nps for h in histories],
+                         list(self.arrays['nps']['nps']))
+
+        for kind in reader.EVENT_KINDS:
+            for row in self.arrays[kind]:
+                nps, ev = events[row['index']]
+                self.assertEqual(nps, row['nps'])
+                self.assertEqual(ev.type, row['type'])
+                self.assertAlmostEqual(ev.erg, row['erg'])
+                self.assertAlmostEqual(ev.xxx, row['xxx'])
+                self.assertEqual(ev.ncl, row['ncl'])
+
+
+class TestPtracEvent(unittest.TestCase):
+    def setUp(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.history = next(ptrac.parse_event())
+
+    def test_slots(self):
+        event = self.history.events[0]
+        self.assertFalse(hasattr(event, '__dict__'))
+        self.assertFalse(hasattr(self.history, '__dict__'))
+        self.assertRaises(AttributeError, setattr, event, 'unknown', 1)
+
+    def test_lazy_decode(self):
+        event = self.history.events[0]
+        self.assertIsNotNone(event._raw)
+        self.assertEqual(1000, event.type)
+        self.assertIsNotNone(event._raw)
+        self.assertEqual(0.73657, event.erg)
+        self.assertIsNone(event._raw)
+        self.assertEqual(10.0, event.ncl)
+        self.assertRaises(AttributeError, getattr, event, 'angsrf')
+
+    def test_str(self):
+        event = reader.PtracEvent()
+        event.type = 4000
+        event.erg = 1.0
+        self.assertEqual('PtracEvent\n  erg: 1.0\n  type: 4000', str(event))
+        self.assertTrue(str(self.history).startswith(
+            'PtracHistory\n  events : [\nPtracEvent\n  erg: 0.73657'))
+
+    def test_pickle(self):
+        history = pickle.loads(pickle.dumps(self.history,
+                                            pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(str(self.history), str(history))
+
+
+class TestPtracFilter(unittest.TestCase):
+    def setUp(self):
+        self.histories = list(
+            reader.PtracReader(ptrac_test_file_path).parse_event())
+
+    def expected(self, keep_event, keep_nps=lambda nps: True,
+                 skip_empty=False):
+        expected = []
+        for history in self.histories:
+            if not keep_nps(history.nps):
+                continue
+            events = [ev for ev in history.events if keep_event(ev)]
+            if events or not skip_empty:
+                expected.append((history.nps, [str(ev) for ev in events]))
+        return expected
+
+    def check(self, expected, **filters):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        result = [(h.nps, [str(ev) for ev in h.events])
+                  for h in ptrac.parse_event(**filters)]
+        self.assertEqual(expected, result)
+
+        arrays = reader.PtracReader(ptrac_test_file_path).to_arrays(**filters)
+        self.assertEqual([nps for nps, _ in expected],
+                         arrays['nps']['nps'].tolist())
+        self.assertEqual(sum(len(events) for _, events in expected),
+                         sum(len(arrays[k]) for k in reader.EVENT_KINDS))
+
+        arrays = reader.PtracReader(ptrac_test_file_path).to_arrays()
+        arrays = reader.PtracFilter(**filters).apply(
+            arrays, ptrac.event_format)
+        self.assertEqual([nps for nps, _ in expected],
+                         arrays['nps']['nps'].tolist())
+
+    def test_event_types(self):
+        expected = self.expected(lambda ev: ev.type // 1000 == 4 or
+                                 ev.type == 2007, skip_empty=True)
+        self.check(expected, event_types=['col', 2007], skip_empty=True)
+
+    def test_ncl_erg(self):
+        expected = self.expected(lambda ev: ev.ncl in (10, 2) and
+                                 0.1 <= ev.erg <= 2.0)
+        self.check(expected, ncl=[10, 2], erg=(0.1, 2.0))
+
+    def test_nps(self):
+        expected = self.expected(lambda ev: ev.mat == 1,
+                                 lambda nps: 10 <= nps <= 20)
+        self.check(expected, mat=1, nps=(10, 20))
+
+    def test_ipt(self):
+        self.check(self.expected(lambda ev: True), ipt=1)
+        self.check([], ipt=2, skip_empty=True)
+
+
+def ascii_to_binary(ascii_path, binary_path):
+    """ Rewrite the records of an ASCII PTRAC file as Fortran records """
+    header = reader.PtracReader(ascii_path).header
+    with open(ascii_path) as f:
+        lines = f.read().splitlines()
+
+    with open(binary_path, 'wb') as f:
+        binary.write_record(f, np.array([-1], dtype=np.int32))
+        fields = [header.kod, str(header.ver),
+                  header.loddat.strftime('%m/%d/%y'),
+                  header.idtm.strftime('%m/%d/%y %H:%M:%S'), header.aid]
+        binary.write_record(f, ''.join(v.ljust(w) for v, w in
+                                       zip(fields, binary.HEADER_WIDTHS)))
+        binary.write_record(f, np.array(' '.join(lines[3:5]).split(),
+                                        dtype=np.float64))
+        binary.write_record(f, np.array(lines[5].split(), dtype=np.int32))
+        binary.write_record(f, np.array(' '.join(lines[6:9]).split(),
+                                        dtype=np.int32))
+        for line in lines[9:]:
+            dtype = np.float64 if '.' in line else np.int32
+            binary.write_record(f, np.array(line.split(), dtype=dtype))
+
+
+class TestPtracBinary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.binary_path = path.join(cls.tmp_dir, 'ptrac.bin')
+        ascii_to_binary(ptrac_test_file_path, cls.binary_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_is_binary(self):
+        self.assertTrue(binary.is_binary_ptrac(self.binary_path))
+        self.assertFalse(binary.is_binary_ptrac(ptrac_test_file_path))
+
+    def test_formats(self):
+        ascii_ptrac = reader.PtracReader(ptrac_test_file_path)
+        binary_ptrac = reader.PtracReader(self.binary_path)
+        self.assertTrue(binary_ptrac.is_binary)
+        for name in ('header', 'input_format', 'event_format'):
+            self.assertEqual(str(getattr(ascii_ptrac, name)),
+                             str(getattr(binary_ptrac, name)))
+
+    def test_histories(self):
+        expected = reader.PtracReader(ptrac_test_file_path).parse_event()
+        result = reader.PtracReader(self.binary_path).parse_event()
+        self.assertEqual([str(h) for h in expected], [str(h) for h in result])
+
+    def test_filtered(self):
+        filters = dict(event_types=['col', 'bnk'], erg=(None, 2.0),
+                       nps=(5, 50))
+        expected = reader.PtracReader(ptrac_test_file_path)
+        result = reader.PtracReader(self.binary_path)
+        self.assertEqual([str(h) for h in expected.parse_event(**filters)],
+                         [str(h) for h in result.parse_event(**filters)])
+
+        expected = reader.PtracReader(ptrac_test_file_path)
+        result = reader.PtracReader(self.binary_path)
+        expected = expected.to_arrays(**filters)
+        result = result.to_arrays(**filters)
+        for kind in expected:
+            self.assertTrue(np.array_equal(expected[kind], result[kind]))
+
+    def test_arrays(self):
+        expected = reader.PtracReader(ptrac_test_file_path).to_arrays()
+        result = reader.PtracReader(self.binary_path).to_arrays()
+        self.assertEqual(sorted(expected.keys()), sorted(result.keys()))
+        for kind in expected:
+            self.assertEqual(expected[kind].dtype, result[kind].dtype)
+            self.assertTrue(np.array_equal(expected[kind], result[kind]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import shutil
+import tempfile
+from os import path
+
+from mcnpy import stats
+from mcnpy.ptrac import reader
+from test_ptrac_reader import ptrac_test_file_path, ascii_to_binary
+
+EVENT_COUNTS = {'src': 88, 'bnk': 97, 'sur': 185, 'col': 81, 'ter': 185}
+
+
+class TestPtracStats(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.binary_path = path.join(self.tmp_dir, 'ptrac.bin')
+        ascii_to_binary(ptrac_test_file_path, self.binary_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_counts(self, parse_stats, filename):
+        counters = parse_stats.counters
+        self.assertEqual(88, counters['histories'])
+        self.assertEqual(636, counters['events'])
+        for kind, n in EVENT_COUNTS.items():
+            self.assertEqual(n, counters['events_' + kind])
+        self.assertEqual(path.getsize(filename), counters['bytes'])
+        self.assertEqual(['header', 'formats', 'events'],
+                         list(parse_stats.timers))
+
+    def test_parse_event(self):
+        reports = []
+        parse_stats = stats.ParseStats(reports.append)
+        ptrac = reader.PtracReader(ptrac_test_file_path, stats=parse_stats)
+        self.assertEqual(9, parse_stats.counters['lines'])
+        self.assertEqual(88, len(list(ptrac.parse_event())))
+
+        self.assert_counts(parse_stats, ptrac_test_file_path)
+        self.assertEqual(9 + 88 + 2 * 636, parse_stats.counters['lines'])
+        self.assertEqual([parse_stats], reports[-1:])
+
+    def test_follow(self):
+        parse_stats = stats.ParseStats()
+        ptrac = reader.PtracReader(ptrac_test_file_path, stats=parse_stats)
+        self.assertEqual(88, len(list(ptrac.follow(idle_timeout=0))))
+        self.assert_counts(parse_stats, ptrac_test_file_path)
+        self.assertEqual(9 + 88 + 2 * 636, parse_stats.counters['lines'])
+
+    def test_to_arrays(self):
+        for filename in (ptrac_test_file_path, self.binary_path):
+            parse_stats = stats.ParseStats()
+            reader.PtracReader(filename, stats=parse_stats).to_arrays()
+            self.assert_counts(parse_stats, filename)
+
+    def test_binary_parse_event(self):
+        parse_stats = stats.ParseStats()
+        ptrac = reader.PtracReader(self.binary_path, stats=parse_stats)
+        self.assertEqual(88, len(list(ptrac.parse_event())))
+        self.assert_counts(parse_stats, self.binary_path)
+
+    def test_disabled(self):
+        # without stats the parser generator is returned unwrapped
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.assertEqual('parse_ptrac_events',
+                         ptrac.parse_event().__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+
+from mcnpy.ptrac import reader, tally
+from test_ptrac_reader import ptrac_test_file_path
+
+
+def bounding_mesh(arrays, n_bins=4, energy_edges=None):
+    events = tally.merge_events(arrays, ['xxx', 'yyy', 'zzz'])
+    edges = [np.linspace(events[name].min() - 1, events[name].max() + 1,
+                         n_bins + 1) for name in ('xxx', 'yyy', 'zzz')]
+    return tally.MeshTally(edges[0], edges[1], edges[2], energy_edges)
+
+
+class TestMeshTally(unittest.TestCase):
+    def setUp(self):
+        self.ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.arrays = self.ptrac.to_arrays()
+
+    def test_straight_track(self):
+        mesh = tally.MeshTally([0, 1, 2, 3], [0, 1], [0, 1], [0, 1, 10])
+        mesh.score_tracks(np.array([[0.5, 0.5, 0.5], [3.5, 0.5, 0.5]]),
+                          np.array([[2.5, 0.5, 0.5], [-1, 0.5, 0.5]]),
+                          np.array([0.5, 2.]), np.array([1., 2.]))
+        np.testing.assert_allclose([0.5, 1, 0.5],
+                                   mesh.track_length[:, 0, 0, 0])
+        np.testing.assert_allclose([2, 2, 2], mesh.track_length[:, 0, 0, 1])
+
+    def test_diagonal_track(self):
+        mesh = tally.MeshTally(np.linspace(0, 1, 5), np.linspace(0, 1, 4),
+                               np.linspace(0, 1, 3))
+        start = np.array([[0.05, 0.1, 0.02]])
+        end = np.array([[0.9, 0.95, 0.97]])
+        mesh.score_tracks(start, end, np.ones(1), np.ones(1))
+
+        # midpoints of many small steps along the track
+        t = (np.arange(100000) + 0.5) / 100000
+        points = start + t[:, None] * (end - start)
+        counts = np.histogramdd(points, bins=mesh.edges)[0]
+        length = np.sqrt(((end - start) ** 2).sum())
+        np.testing.assert_allclose(counts / 1e5 * length,
+                                   mesh.track_length[..., 0], atol=1e-4)
+
+    def test_score_arrays(self):
+        mesh = bounding_mesh(self.arrays).score_arrays(self.arrays)
+        self.assertEqual(88, mesh.n_histories)
+
+        total = 0.
+        collisions = []
+        for history in reader.PtracReader(ptrac_test_file_path).parse_event():
+            events = history.events
+            for event, following in zip(events[:-1], events[1:]):
+                if event.type // 1000 == 5:
+                    continue
+                delta = np.subtract([following.xxx, following.yyy,
+                                     following.zzz],
+                                    [event.xxx, event.yyy, event.zzz])
+                total += event.wgt * np.sqrt((delta ** 2).sum())
+                if following.type // 1000 == 4:
+                    collisions.append(event.wgt)
+        self.assertAlmostEqual(total, mesh.track_length.sum())
+        self.assertEqual(81, len(collisions))
+        self.assertAlmostEqual(sum(collisions), mesh.collisions.sum())
+        np.testing.assert_allclose(mesh.flux * mesh.volumes * 88,
+                                   mesh.track_length)
+
+    def test_merge(self):
+        whole = bounding_mesh(self.arrays, 3, [0, 1, 20])
+        whole.score_arrays(self.arrays)
+
+        first, second = whole.empty(), whole.empty()
+        for mesh, half in ((first, slice(None, 40)), (second, slice(40, None))):
+            nps = self.arrays['nps']['nps'][half]
+            mesh.score_arrays(dict((k, v[np.in1d(v['nps'], nps)])
+                                   for k, v in self.arrays.items()))
+        first += second
+
+        self.assertEqual(88, first.n_histories)
+        np.testing.assert_allclose(whole.track_length, first.track_length)
+        np.testing.assert_allclose(whole.collisions, first.collisions)
+        self.assertRaises(ValueError, first.merge,
+                          bounding_mesh(self.arrays, 2))
+
+    def test_tally_parallel(self):
+        whole = bounding_mesh(self.arrays).score_arrays(self.arrays)
+        parallel = tally.tally_parallel(self.ptrac, bounding_mesh(self.arrays),
+                                        workers=2, n_chunks=5)
+        self.assertEqual(88, parallel.n_histories)
+        np.testing.assert_allclose(whole.track_length, parallel.track_length)
+        np.testing.assert_allclose(whole.collisions, parallel.collisions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from StringIO import StringIO
+import numpy as np
+
+from mcnpy.ptrac import reader, tokenizer
+from test_ptrac_reader import ptrac_test_file_path
+
+
+class TestPtracTokenizer(unittest.TestCase):
+    def setUp(self):
+        ptrac = reader.PtracReader(ptrac_test_file_path)
+        self.event_format = ptrac.event_format
+        with open(ptrac_test_file_path) as f:
+            self.events = ''.join(f.readlines()[9:])
+        self.expected = reader.parse_ptrac_lines(StringIO(self.events),
+                                                 self.event_format)
+
+    def check_arrays(self, result):
+        for kind in self.expected:
+            self.assertEqual(self.expected[kind].dtype, result[kind].dtype)
+            self.assertTrue(np.array_equal(self.expected[kind], result[kind]))
+
+    def test_classify_lines(self):
+        data = '          1      1000\n' \
+               '       9000         2\n' \
+               '   0.10000E+01 -0.20000E+01\n'
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, ends = tokenizer.split_lines(buf)
+        self.assertEqual([0, 22, 44], starts.tolist())
+        is_float, is_nps = tokenizer.classify_lines(buf, starts)
+        self.assertEqual([False, False, True], is_float.tolist())
+        self.assertEqual([True, False, False], is_nps.tolist())
+        self.assertEqual([[1.0, -2.0]], tokenizer.fixed_fields(
+            buf, starts[2:], 2, tokenizer.FLOAT_WIDTH, float).tolist())
+
+    def test_tokenize_block(self):
+        arrays, consumed = tokenizer.tokenize_block(self.events,
+                                                    self.event_format)
+        self.assertEqual(len(self.events), consumed)
+        self.check_arrays(arrays)
+
+    def test_partial_block(self):
+        arrays, consumed = tokenizer.tokenize_block(self.events[:5000],
+                                                    self.event_format,
+                                                    final=False)
+        self.assertLess(consumed, 5000)
+        self.assertEqual(self.expected['nps']['nps'][len(arrays['nps'])],
+                         int(self.events[consumed:].split()[0]))
+        rest, _ = tokenizer.tokenize_block(self.events[consumed:],
+                                           self.event_format,
+                                           arrays['nps']['n_events'].sum())
+        for kind in self.expected:
+            self.assertTrue(np.array_equal(
+                self.expected[kind],
+                np.concatenate((arrays[kind], rest[kind]))))
+
+    def test_small_blocks(self):
+        for block_size in (64, 1000, 4096):
+            result = tokenizer.parse_ptrac_blocks(StringIO(self.events),
+                                                  self.event_format,
+                                                  block_size=block_size)
+            self.check_arrays(result)
+
+    def test_crlf(self):
+        events = self.events.replace('\n', '\r\n')
+        self.check_arrays(tokenizer.parse_ptrac_blocks(StringIO(events),
+                                                       self.event_format))
+
+    def test_layout_fallback(self):
+        events = '\n'.join(' '.join(line.split())
+                           for line in self.events.splitlines())
+        self.assertRaises(tokenizer.LayoutError, tokenizer.tokenize_block,
+                          events, self.event_format)
+        self.check_arrays(tokenizer.parse_ptrac_blocks(StringIO(events),
+                                                       self.event_format,
+                                                       block_size=4096))
+
+    def test_malformed_block(self):
+        # one history in the middle written without the fixed field widths
+        lines = self.events.splitlines(True)
+        nps_lines = [i for i, line in enumerate(lines)
+                     if '.' not in line and '.' not in lines[i + 1]]
+        start, end = nps_lines[40], nps_lines[41]
+        lines[start:end] = [' '.join(line.split()) + '\n'
+                            for line in lines[start:end]]
+        events = ''.join(lines)
+
+        parsed = []
+        parse_ptrac_lines = tokenizer.parse_ptrac_lines
+
+        def record_lines(ptrac_file, event_format):
+            arrays = parse_ptrac_lines(ptrac_file, event_format)
+            parsed.append(len(arrays['nps']))
+            return arrays
+
+        tokenizer.parse_ptrac_lines = record_lines
+        try:
+            result = tokenizer.parse_ptrac_blocks(StringIO(events),
+                                                  self.event_format,
+                                                  block_size=4096)
+        finally:
+            tokenizer.parse_ptrac_lines = parse_ptrac_lines
+        self.check_arrays(result)
+        # only the histories of the failing block were parsed line by line
+        self.assertEqual(1, len(parsed))
+        self.assertLess(parsed[0], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import shutil
+import tempfile
+import unittest
+from os import path
+
+import numpy as np
+
+from mcnpy.ptrac import reader, writer
+from test_ptrac_reader import ptrac_test_file_path
+
+
+def history_strings(filename, **filters):
+    return [str(h) for h in reader.PtracReader(filename).parse_event(**filters)]
+
+
+class TestPtracWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ptrac = reader.PtracReader(ptrac_test_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        expected = history_strings(ptrac_test_file_path)
+        for binary in (False, True):
+            filename = path.join(self.tmp_dir, 'ptrac%d' % binary)
+            result = writer.compact(reader.PtracReader(ptrac_test_file_path),
+                                    filename, binary=binary)
+            self.assertEqual((88, 636), (result.n_histories, result.n_events))
+
+            written = reader.PtracReader(filename)
+            self.assertEqual(binary, written.is_binary)
+            for name in ('header', 'input_format', 'event_format'):
+                self.assertEqual(str(getattr(self.ptrac, name)),
+                                 str(getattr(written, name)))
+            self.assertEqual(expected, history_strings(filename))
+
+        # binary source converted back to ASCII
+        filename = path.join(self.tmp_dir, 'ptrac2')
+        writer.compact(reader.PtracReader(path.join(self.tmp_dir, 'ptrac1')),
+                       filename)
+        self.assertEqual(expected, history_strings(filename))
+
+    def test_subset(self):
+        cells = lambda history: any(getattr(e, 'ncl', 0) == 10 and
+                                    e.type == 4000 for e in history.events)
+        selected = [h for h in self.ptrac.parse_event() if cells(h)]
+        self.assertTrue(0 < len(selected) < 88)
+
+        for binary in (False, True):
+            filename = path.join(self.tmp_dir, 'subset%d' % binary)
+            with writer.PtracWriter(filename, self.ptrac, binary) as out:
+                self.assertEqual(len(selected), out.write(selected))
+            self.assertEqual([str(h) for h in selected],
+                             history_strings(filename))
+
+        # only the kept events of each history
+        filters = dict(event_types=['col', 'ter'], nps=(10, 60))
+        filename = path.join(self.tmp_dir, 'events')
+        writer.compact(reader.PtracReader(ptrac_test_file_path), filename,
+                       skip_empty=True, **filters)
+        self.assertEqual(history_strings(ptrac_test_file_path, **filters),
+                         history_strings(filename))
+
+        expected = reader.PtracReader(ptrac_test_file_path).to_arrays(
+            **filters)
+        result = reader.PtracReader(filename).to_arrays()
+        for kind in ('col', 'ter'):
+            for name in expected[kind].dtype.names:
+                if name != 'index':
+                    np.testing.assert_array_equal(expected[kind][name],
+                                                  result[kind][name])
+
+    def test_empty_history(self):
+        filename = path.join(self.tmp_dir, 'empty')
+        with writer.PtracWriter(filename, self.ptrac) as out:
+            self.assertFalse(out.write_history(reader.PtracHistory()))
+        self.assertEqual([], history_strings(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
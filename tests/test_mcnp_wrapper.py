@@ -0,0 +1,279 @@
+import os
+import time
+import unittest
+import tempfile
+import shutil
+
+from mcnpy import mcnp_wrapper
+from tests import utils
+
+
+class TestParameterGrid(unittest.TestCase):
+    def test_product(self):
+        result = mcnp_wrapper.parameter_grid({'b': [1, 2], 'a': ['x', 'y']})
+        expected = [{'a': 'x', 'b': 1}, {'a': 'x', 'b': 2},
+                    {'a': 'y', 'b': 1}, {'a': 'y', 'b': 2}]
+        self.assertEqual(expected, result)
+
+    def test_list(self):
+        grid = [{'a': 1}, {'a': 3}]
+        self.assertEqual(grid, mcnp_wrapper.parameter_grid(grid))
+
+
+class TestRunSweep(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mcnp = utils.write_stub_mcnp(self.tmp_dir)
+        self.output_root = os.path.join(self.tmp_dir, 'runs')
+        os.mkdir(self.output_root)
+
+    def tearDown(self):
+        os.environ.pop('STUB_MCNP_LOG', None)
+        shutil.rmtree(self.tmp_dir)
+
+    def sweep(self, card, grid, **kwargs):
+        kwargs.setdefault('poll_interval', 0.01)
+        return mcnp_wrapper.run_sweep(card, grid, executable=self.mcnp,
+                                      output_root=self.output_root, **kwargs)
+
+    def test_results(self):
+        finished = []
+        results = self.sweep('radius {r}\n', {'r': [1, 2, 3]}, cores=4,
+                             callback=finished.append)
+        self.assertEqual([1, 2, 3], [r.params['r'] for r in results])
+        self.assertEqual(3, len(finished))
+        for result in results:
+            self.assertTrue(result.status)
+            self.assertEqual(1, result.attempts)
+            with open(os.path.join(result.output_dir, 'outp')) as f:
+                self.assertEqual('tasks 1\nradius %d\n' % result.params['r'],
+                                 f.read())
+
+    def test_core_budget(self):
+        log = os.path.join(self.tmp_dir, 'log')
+        os.environ['STUB_MCNP_LOG'] = log
+        results = self.sweep('case {i}\n', {'i': range(6)}, cores=4, tasks=2)
+        self.assertTrue(all(r.status for r in results))
+
+        events = []
+        with open(log) as f:
+            for line in f:
+                t, kind = line.split()
+                events.append((float(t), 1 if kind == 'start' else -1))
+        running = peak = 0
+        for t, change in sorted(events):
+            running += change
+            peak = max(peak, running)
+        self.assertEqual(2, peak)
+
+    def test_tasks_split(self):
+        results = self.sweep('case {i}\n', {'i': [1, 2]}, cores=8)
+        with open(os.path.join(results[0].output_dir, 'outp')) as f:
+            self.assertEqual('tasks 4', f.readline().strip())
+
+    def test_failures(self):
+        results = self.sweep('{mode}\n', {'mode': ['FATAL', 'EXIT', 'ok']},
+                             cores=3, retries=1)
+        self.assertEqual([False, False, True], [r.status for r in results])
+        self.assertEqual([2, 2, 1], [r.attempts for r in results])
+        self.assertEqual(3, results[1].returncode)
+
+    def test_retry(self):
+        marker = os.path.join(self.tmp_dir, 'marker')
+        results = self.sweep('FLAKY %s\n' % marker, [{}], retries=2)
+        self.assertTrue(results[0].status)
+        self.assertEqual(2, results[0].attempts)
+        self.assertEqual(1, len(os.listdir(self.output_root)))
+
+    def test_missing_executable(self):
+        results = mcnp_wrapper.run_sweep('x\n', [{}], executable='no_mcnp',
+                                         output_root=self.output_root,
+                                         poll_interval=0.01)
+        self.assertFalse(results[0].status)
+        self.assertEqual(None, results[0].returncode)
+
+
+class TestMcnpProcess(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mcnp = utils.write_stub_mcnp(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def start(self, card, **kwargs):
+        output_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        return mcnp_wrapper.McnpProcess(card, output_dir,
+                                        executable=self.mcnp, **kwargs)
+
+    def test_progress(self):
+        progress = []
+        lines = []
+        process = self.start('ok\n', on_progress=lambda p: progress.append(
+            (p.dumps, p.nps)), on_line=lambda p, line: lines.append(line))
+        self.assertTrue(process.wait(10))
+        self.assertEqual([(1, 1000), (2, 2000), (3, 3000)], progress)
+        self.assertEqual(0, process.returncode)
+        with open(os.path.join(process.output_dir,
+                               mcnp_wrapper.STDOUT_FILE)) as f:
+            self.assertEqual(lines, f.readlines())
+
+    def test_fail_fast(self):
+        start = time.time()
+        process = self.start('FATAL HANG\n')
+        self.assertFalse(process.wait(10))
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual('fatal error.  stub failure', process.error)
+        self.assertEqual(1, process.dumps)
+
+    def test_timeout(self):
+        process = self.start('HANG\n', timeout=0.5)
+        self.assertFalse(process.wait(10))
+        self.assertTrue(process.timed_out)
+
+    def test_cancel(self):
+        process = self.start('HANG\n')
+        self.assertEqual(None, process.wait(0.1))
+        self.assertEqual(None, process.status)
+        process.cancel()
+        self.assertFalse(process.wait(10))
+        self.assertTrue(process.cancelled)
+
+    def test_as_completed(self):
+        processes = [self.start('HANG\n', timeout=1.)] + \
+                    [self.start('case %d\n' % i) for i in range(4)]
+        finished = list(mcnp_wrapper.as_completed(processes, 0.01))
+        self.assertEqual(processes[0], finished[-1])
+        self.assertEqual([True] * 4 + [False], [p.status for p in finished])
+
+
+class TestRunMcnp(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mcnp = utils.write_stub_mcnp(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_mcnp(self):
+        with mcnp_wrapper.run_mcnp('cell {c}\n', {'c': 7}, cores=2,
+                                   clean=False, executable=self.mcnp) as \
+                (status, output_dir):
+            self.assertTrue(status)
+            with open(os.path.join(output_dir, 'outp')) as f:
+                self.assertEqual('tasks 2\ncell 7\n', f.read())
+        shutil.rmtree(output_dir)
+
+
+class TestMcnpResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mcnp = utils.write_stub_mcnp(self.tmp_dir)
+        self.cache = mcnp_wrapper.McnpResultCache(
+            os.path.join(self.tmp_dir, 'cache'))
+        self.data_file = os.path.join(self.tmp_dir, 'xsdir')
+        with open(self.data_file, 'w') as f:
+            f.write('1001.80c 0.999167 H1 0 1 1 10 0 0 2.5301E-08\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_cached(self, card, cores=1, clean=True):
+        with mcnp_wrapper.run_mcnp(card, cores=cores, executable=self.mcnp,
+                                   cache=self.cache, clean=clean,
+                                   data_files=[self.data_file]) as result:
+            return result
+
+    def key(self, card):
+        return self.cache.key(card, [self.data_file], self.mcnp)
+
+    def test_key(self):
+        key = self.cache.key('a\n', [self.data_file])
+        self.assertEqual(key, self.cache.key('a\n', [self.data_file],
+                                             '/usr/bin/mcnp6'))
+        self.assertNotEqual(key, self.cache.key('b\n', [self.data_file]))
+        self.assertNotEqual(key, self.cache.key('a\n'))
+        with open(self.data_file, 'a') as f:
+            f.write('1002.80c 1.9968 H2 0 1 1 10 0 0 2.5301E-08\n')
+        self.assertNotEqual(key, self.cache.key('a\n', [self.data_file]))
+
+    def test_run_mcnp(self):
+        status, output_dir = self.run_cached('cell 1\n', cores=2)
+        self.assertTrue(status)
+        self.assertFalse(os.path.exists(output_dir))
+        entry = os.path.join(self.cache.path, self.key('cell 1\n'))
+        self.assertFalse(os.path.exists(os.path.join(entry, 'runtpe')))
+        with open(os.path.join(entry, 'outp')) as f:
+            self.assertEqual('tasks 2\ncell 1\n', f.read())
+
+        # hits hand out a copy of the entry, cleaned like any other run
+        os.remove(self.mcnp)
+        status, output_dir = self.run_cached('cell 1\n', cores=4, clean=False)
+        self.assertTrue(status)
+        self.assertFalse(output_dir.startswith(self.cache.path))
+        with open(os.path.join(output_dir, 'outp')) as f:
+            self.assertEqual('tasks 2\ncell 1\n', f.read())
+        shutil.rmtree(output_dir)
+        self.assertTrue(os.path.exists(os.path.join(entry, 'outp')))
+        self.assertEqual(dict(hits=1, misses=1, evictions=0),
+                         self.cache.stats)
+
+    def test_keep_run(self):
+        status, output_dir = self.run_cached('cell 1\n', clean=False)
+        self.assertTrue(status)
+        self.assertFalse(output_dir.startswith(self.cache.path))
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'runtpe')))
+        self.assertEqual([self.key('cell 1\n')], self.cache.keys())
+        shutil.rmtree(output_dir)
+
+    def test_failed_run(self):
+        status, output_dir = self.run_cached('FATAL\n')
+        self.assertFalse(status)
+        self.assertEqual([], self.cache.keys())
+
+    def test_invalidate(self):
+        self.run_cached('cell 1\n')
+        key = self.key('cell 1\n')
+        self.assertIn(key, self.cache)
+        self.assertTrue(self.cache.invalidate(key))
+        self.assertFalse(self.cache.invalidate(key))
+        self.run_cached('cell 1\n')
+        self.assertEqual(2, self.cache.stats['misses'])
+        self.cache.clear()
+        self.assertEqual([], self.cache.keys())
+
+    def test_eviction(self):
+        self.run_cached('cell 1\n')
+        self.cache.max_bytes = self.cache.nbytes + 10
+        time.sleep(0.01)
+        self.run_cached('cell 2\n')
+        self.assertEqual([self.key('cell 2\n')], self.cache.keys())
+        self.assertEqual(1, self.cache.stats['evictions'])
+        self.assertNotIn(self.key('cell 1\n'), self.cache)
+
+    def test_sweep(self):
+        self.run_cached('case 1\n')
+        results = mcnp_wrapper.run_sweep(
+            'case {i}\n', {'i': [1, 2]}, cores=2, executable=self.mcnp,
+            output_root=self.tmp_dir, poll_interval=0.01, cache=self.cache,
+            data_files=[self.data_file])
+        self.assertEqual([0, 1], [r.attempts for r in results])
+        self.assertEqual(2, len(self.cache.keys()))
+
+    def test_sweep_eviction(self):
+        self.run_cached('case 1\n')
+        self.cache.max_bytes = self.cache.nbytes + 10
+        results = mcnp_wrapper.run_sweep(
+            'case {i}\n', {'i': [1, 2]}, cores=2, executable=self.mcnp,
+            output_root=self.tmp_dir, poll_interval=0.01, cache=self.cache,
+            data_files=[self.data_file])
+        self.assertEqual(1, self.cache.stats['evictions'])
+        self.assertNotIn(self.key('case 1\n'), self.cache)
+        for result in results:
+            self.assertFalse(result.output_dir.startswith(self.cache.path))
+            with open(os.path.join(result.output_dir, 'outp')) as f:
+                self.assertIn('case %d\n' % result.params['i'], f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import time
+import unittest
+from StringIO import StringIO
+
+from mcnpy import stats
+
+
+class TestParseStats(unittest.TestCase):
+    def test_counters_and_phases(self):
+        parse_stats = stats.ParseStats()
+        with parse_stats.phase('header'):
+            time.sleep(0.01)
+        with stats.phase(parse_stats, 'header'):
+            pass
+        with stats.phase(None, 'header'):
+            pass
+        parse_stats.count('events', 10)
+        parse_stats.count('events_col', 4)
+
+        self.assertEqual(['header'], list(parse_stats.timers))
+        self.assertTrue(parse_stats.timers['header'] >= 0.01)
+        result = parse_stats.as_dict()
+        self.assertEqual(10, result['events'])
+        self.assertIn('events_per_second', result)
+        self.assertNotIn('events_col_per_second', result)
+        self.assertIn('header_seconds', result)
+
+    def test_progress_interval(self):
+        reports = []
+        parse_stats = stats.ParseStats(reports.append, interval=60)
+        parse_stats.report()
+        parse_stats.report(force=True)
+        self.assertEqual([parse_stats], reports)
+
+    def test_counting_file(self):
+        parse_stats = stats.ParseStats()
+        counting = stats.CountingFile(StringIO('ab\ncd\nef'), parse_stats)
+        self.assertEqual('ab\n', counting.readline())
+        self.assertEqual('cd\nef', counting.read())
+        self.assertEqual(8, parse_stats.counters['bytes'])
+        self.assertEqual(2, parse_stats.counters['lines'])
+        self.assertEqual(8, counting.tell())
+
+
+if __name__ == '__main__':
+    unittest.main()
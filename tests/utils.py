@@ -1,5 +1,55 @@
+import os
+import sys
+import stat
 from textwrap import dedent
 
+STUB_MCNP = """\
+#!{python}
+import os
+import sys
+import time
+
+# stub of mcnp6 'tasks N i=input.i' for tests, behaviour is set by keywords
+# of the input card
+tasks = sys.argv[sys.argv.index('tasks') + 1]
+card = open('input.i').read()
+log = os.environ.get('STUB_MCNP_LOG', 'runtpe')
+with open(log, 'a') as f:
+    f.write('%f start\\n' % time.time())
+print(' mcnp     version 6     ld=stub')
+sys.stdout.flush()
+
+for nps in range(1, int(os.environ.get('STUB_MCNP_STEPS', '3')) + 1):
+    time.sleep(float(os.environ.get('STUB_MCNP_SLEEP', '0.05')))
+    print(' ctm = 0.01   nrn = %d' % (1000 * nps))
+    print(' dump no.%d on file runtpe   nps = %d' % (nps, 1000 * nps))
+    sys.stdout.flush()
+    if 'FATAL' in card:
+        print(' fatal error.  stub failure')
+        sys.stdout.flush()
+        if 'HANG' in card:
+            time.sleep(60)
+        sys.exit(0)
+if 'HANG' in card:
+    time.sleep(60)
+
+if 'FLAKY' in card:
+    marker = card.split('FLAKY')[1].split()[0]
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        print(' bad trouble in subroutine stub')
+        sys.exit(0)
+if 'EXIT' in card:
+    sys.exit(3)
+
+with open('outp', 'w') as f:
+    f.write('tasks %s\\n' % tasks)
+    f.write(card)
+with open(log, 'a') as f:
+    f.write('%f end\\n' % time.time())
+print(' run terminated when 3000 particle histories were done.')
+"""
+
 
 class MockFile(object):
     def __init__(self, data):
@@ -13,3 +63,12 @@ class MockFile(object):
             return self.lines[self.curr_line-1]
         else:
             return ''
+
+
+def write_stub_mcnp(directory, name='mcnp6'):
+    """ Write an executable MCNP stand-in, see STUB_MCNP """
+    filename = os.path.join(directory, name)
+    with open(filename, 'w') as f:
+        f.write(STUB_MCNP.format(python=sys.executable))
+    os.chmod(filename, os.stat(filename).st_mode | stat.S_IEXEC)
+    return filename